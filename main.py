@@ -20,7 +20,7 @@ class PlexAutoLanguages():
         self.plex_alert_listener = None
 
         # Health-check server
-        self.healthcheck_server = HealthcheckServer("Plex-Auto-Languages", self.is_ready, self.is_healthy)
+        self.healthcheck_server = HealthcheckServer("Plex-Auto-Languages", self.is_ready, self.is_healthy, self.get_stats)
         self.healthcheck_server.start()
 
         # Configuration
@@ -50,6 +50,11 @@ class PlexAutoLanguages():
     def is_healthy(self):
         return self.alive and self.plex.is_alive
 
+    def get_stats(self):
+        if self.plex is None:
+            return {}
+        return self.plex.get_stats()
+
     def set_signal_handlers(self):
         signal.signal(signal.SIGINT, self.stop)
         signal.signal(signal.SIGTERM, self.stop)
@@ -3,3 +3,4 @@ from .activity import PlexActivity      # noqa: F401
 from .playing import PlexPlaying        # noqa: F401
 from .timeline import PlexTimeline      # noqa: F401
 from .status import PlexStatus          # noqa: F401
+from .scheduler import PlexScheduledTask  # noqa: F401
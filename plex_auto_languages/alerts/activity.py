@@ -1,6 +1,6 @@
 from __future__ import annotations
 from typing import TYPE_CHECKING
-from datetime import datetime, timedelta
+from datetime import datetime
 from plexapi.video import Episode
 
 from plex_auto_languages.alerts.base import PlexAlert
@@ -17,6 +17,7 @@ logger = get_logger()
 class PlexActivity(PlexAlert):
 
     TYPE = "activity"
+    PRIORITY = 1
 
     TYPE_LIBRARY_REFRESH_ITEM = "library.refresh.items"
     TYPE_LIBRARY_UPDATE_SECTION = "library.update.section"
@@ -38,16 +39,36 @@ class PlexActivity(PlexAlert):
     def item_key(self):
         return self._message.get("Activity", {}).get("Context", {}).get("key", None)
 
+    @property
+    def section_id(self):
+        return self._message.get("Activity", {}).get("Context", {}).get("librarySectionID", None)
+
     @property
     def user_id(self):
         return self._message.get("Activity", {}).get("userID", None)
 
+    @property
+    def shard_key(self):
+        return self._get_rating_key(self.item_key)
+
+    @property
+    def debounce_key(self):
+        return (self.TYPE, self.user_id, self.item_key), (self.type, self.event)
+
+    @property
+    def scanned_section_id(self):
+        return self.section_id
+
     def process(self, plex: PlexServer):
         if self.event != "ended":
             return
         if not self.is_type(self.TYPE_LIBRARY_REFRESH_ITEM):
             return
 
+        # Skip if the item is known not to be an Episode
+        if not plex.cache.is_episode_candidate(self.item_key, self.section_id):
+            return
+
         # Switch to the user's Plex instance
         user_plex = plex.get_plex_instance_of_user(self.user_id)
         if user_plex is None:
@@ -55,7 +76,10 @@ class PlexActivity(PlexAlert):
 
         # Skip if not an Episode
         item = user_plex.fetch_item(self.item_key)
-        if item is None or not isinstance(item, Episode):
+        if item is None:
+            return
+        if not isinstance(item, Episode):
+            plex.cache.set_item_type(self.item_key, item.type)
             return
 
         # Skip if the show should be ignored
@@ -65,8 +89,7 @@ class PlexActivity(PlexAlert):
 
         # Skip if this item has already been seen in the last 3 seconds
         activity_key = (self.user_id, self.item_key)
-        if activity_key in plex.cache.recent_activities and \
-                plex.cache.recent_activities[activity_key] > datetime.now() - timedelta(seconds=3):
+        if activity_key in plex.cache.recent_activities:
             return
         plex.cache.recent_activities[activity_key] = datetime.now()
 
@@ -76,4 +99,4 @@ class PlexActivity(PlexAlert):
         if user is None:
             return
         logger.debug(f"[Activity] User: {user.name} | Episode: {item}")
-        plex.change_tracks(user.name, item, EventType.PLAY_OR_ACTIVITY)
+        plex.change_tracks(user.name, item, EventType.PLAY_OR_ACTIVITY, user_plex)
@@ -1,5 +1,5 @@
 from __future__ import annotations
-from typing import TYPE_CHECKING
+from typing import TYPE_CHECKING, Union
 
 if TYPE_CHECKING:
     from plex_auto_languages.plex_server import PlexServer
@@ -8,6 +8,7 @@ if TYPE_CHECKING:
 class PlexAlert():
 
     TYPE = None
+    PRIORITY = 2  # Lower values are processed first
 
     def __init__(self, message: dict):
         self._message = message
@@ -16,5 +17,26 @@ class PlexAlert():
     def message(self):
         return self._message
 
+    @property
+    def shard_key(self):
+        # Alerts sharing the same shard key are processed sequentially, in order of arrival
+        return self.TYPE
+
+    @property
+    def debounce_key(self):
+        # (identity, state) of the alert, repeated alerts with the same identity and state can be collapsed
+        return None
+
+    @property
+    def scanned_section_id(self):
+        # Section reported as being scanned by the alert, recorded when the alert is received
+        return None
+
+    @staticmethod
+    def _get_rating_key(item_key: Union[str, int]):
+        if item_key is None:
+            return None
+        return str(item_key).rstrip("/").split("/")[-1]
+
     def process(self, plex: PlexServer):
         raise NotImplementedError
@@ -16,6 +16,7 @@ logger = get_logger()
 class PlexPlaying(PlexAlert):
 
     TYPE = "playing"
+    PRIORITY = 0
 
     @property
     def client_identifier(self):
@@ -33,23 +34,35 @@ class PlexPlaying(PlexAlert):
     def session_state(self):
         return self._message.get("state", None)
 
+    @property
+    def shard_key(self):
+        return self._get_rating_key(self.item_key)
+
+    @property
+    def debounce_key(self):
+        return (self.TYPE, self.session_key), self.session_state
+
     def process(self, plex: PlexServer):
         # Get User id and user's Plex instance
-        if self.client_identifier not in plex.cache.user_clients:
-            user_id, username = plex.get_user_from_client_identifier(self.client_identifier)
-            if user_id is None:
-                return
-            plex.cache.user_clients[self.client_identifier] = (user_id, username)
-        else:
-            user_id, username = plex.cache.user_clients[self.client_identifier]
+        user_id, username = plex.get_user_from_client_identifier(self.client_identifier, self.session_key)
+        if user_id is None:
+            return
+        plex.session_tracker.track(self.client_identifier, self.session_key, user_id, username, self.item_key)
+        # Skip if the item is known not to be an Episode
+        if not plex.cache.is_episode_candidate(self.item_key):
+            return
         user_plex = plex.get_plex_instance_of_user(user_id)
         if user_plex is None:
             return
 
         # Skip if not an Episode
         item = user_plex.fetch_item(self.item_key)
-        if item is None or not isinstance(item, Episode):
+        if item is None:
+            return
+        if not isinstance(item, Episode):
+            plex.cache.set_item_type(self.item_key, item.type)
             return
+        plex.cache.invalidate_reference_episode(user_id, item.grandparentRatingKey)
 
         # Skip if the show should be ignored
         if plex.should_ignore_show(item.show()):
@@ -67,7 +80,6 @@ class PlexPlaying(PlexAlert):
         if self.session_state == "stopped":
             logger.debug(f"[Play Session] End of session {self.session_key} for user {user_id}")
             del plex.cache.session_states[self.session_key]
-            del plex.cache.user_clients[self.client_identifier]
 
         # Skip if selected streams are unchanged
         item.reload()
@@ -81,4 +93,4 @@ class PlexPlaying(PlexAlert):
         plex.cache.default_streams.setdefault(item.key, pair_id)
 
         # Change tracks if needed
-        plex.change_tracks(username, item, EventType.PLAY_OR_ACTIVITY)
+        plex.change_tracks(username, item, EventType.PLAY_OR_ACTIVITY, user_plex)
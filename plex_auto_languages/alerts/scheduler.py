@@ -0,0 +1,28 @@
+from __future__ import annotations
+from typing import TYPE_CHECKING, Callable
+
+from plex_auto_languages.alerts.base import PlexAlert
+
+if TYPE_CHECKING:
+    from plex_auto_languages.plex_server import PlexServer
+
+
+class PlexScheduledTask(PlexAlert):
+
+    TYPE = "scheduler"
+    PRIORITY = 3
+
+    def __init__(self, item_key: str, callback: Callable[[], None]):
+        super().__init__({"key": item_key})
+        self._callback = callback
+
+    @property
+    def item_key(self):
+        return self._message.get("key", None)
+
+    @property
+    def shard_key(self):
+        return self._get_rating_key(self.item_key)
+
+    def process(self, plex: PlexServer):
+        self._callback()
@@ -1,5 +1,6 @@
 from __future__ import annotations
-from typing import TYPE_CHECKING
+from typing import TYPE_CHECKING, Callable, List
+from plexapi.video import Episode
 
 from plex_auto_languages.alerts.base import PlexAlert
 from plex_auto_languages.utils.logger import get_logger
@@ -15,6 +16,7 @@ logger = get_logger()
 class PlexStatus(PlexAlert):
 
     TYPE = "status"
+    PRIORITY = 2
 
     @property
     def title(self):
@@ -24,41 +26,43 @@ class PlexStatus(PlexAlert):
         if self.title != "Library scan complete":
             return
         logger.debug("[Status] The Plex server scanned the library")
-
-        if plex.config.get("refresh_library_on_scan"):
-            added, updated = plex.cache.refresh_library_cache()
-        else:
-            added = plex.get_recently_added_episodes(minutes=5)
-            updated = []
+        added, updated = self._get_scanned_episodes(plex)
 
         # Process recently added episodes
         if len(added) > 0:
             logger.debug(f"[Status] Found {len(added)} newly added episode(s)")
-            for item in added:
-                # Check if the item should be ignored
-                if plex.should_ignore_show(item.show()):
-                    continue
-
-                # Check if the item has already been processed
-                if not plex.cache.should_process_recently_added(item.key, item.addedAt):
-                    continue
-
-                # Change tracks for all users
-                logger.info(f"[Status] Processing newly added episode {plex.get_episode_short_name(item)}")
-                plex.process_new_or_updated_episode(item.key, EventType.NEW_EPISODE, True)
+            episodes = self._filter_episodes(plex, added, "newly added",
+                                             lambda item: plex.cache.should_process_recently_added(item.key, item.addedAt))
+            # Change tracks for all users
+            if len(episodes) > 0:
+                plex.process_new_or_updated_episodes(episodes, EventType.NEW_EPISODE, True)
 
         # Process updated episodes
         if len(updated) > 0:
             logger.debug(f"[Status] Found {len(updated)} updated episode(s)")
-            for item in updated:
-                # Check if the item should be ignored
-                if plex.should_ignore_show(item.show()):
-                    continue
-
+            episodes = self._filter_episodes(plex, updated, "updated",
+                                             lambda item: plex.cache.should_process_recently_updated(item.key))
+            # Change tracks for all users
+            if len(episodes) > 0:
+                plex.process_new_or_updated_episodes(episodes, EventType.UPDATED_EPISODE, False)
+
+    @staticmethod
+    def _get_scanned_episodes(plex: PlexServer):
+        if plex.config.get("refresh_library_on_scan"):
+            return plex.cache.refresh_library_cache(section_ids=plex.cache.pop_scanned_sections())
+        return plex.get_recently_added_episodes(minutes=5), []
+
+    @staticmethod
+    def _filter_episodes(plex: PlexServer, items: List[Episode], label: str, should_process: Callable[[Episode], bool]):
+        episodes = []
+        for show_items in plex.group_episodes_by_show(items).values():
+            # Check if the show should be ignored
+            if plex.should_ignore_show(show_items[0].show()):
+                continue
+            for item in show_items:
                 # Check if the item has already been processed
-                if not plex.cache.should_process_recently_updated(item.key):
+                if not should_process(item):
                     continue
-
-                # Change tracks for all users
-                logger.info(f"[Status] Processing updated episode {plex.get_episode_short_name(item)}")
-                plex.process_new_or_updated_episode(item.key, EventType.UPDATED_EPISODE, False)
+                logger.info(f"[Status] Processing {label} episode {plex.get_episode_short_name(item)}")
+                episodes.append(item.key)
+        return episodes
@@ -1,22 +1,18 @@
 from __future__ import annotations
 from typing import TYPE_CHECKING
-from datetime import datetime, timedelta
-from plexapi.video import Episode
 
 from plex_auto_languages.alerts.base import PlexAlert
-from plex_auto_languages.utils.logger import get_logger
-from plex_auto_languages.constants import EventType
 
 if TYPE_CHECKING:
     from plex_auto_languages.plex_server import PlexServer
 
 
-logger = get_logger()
-
-
 class PlexTimeline(PlexAlert):
 
     TYPE = "timeline"
+    PRIORITY = 2
+
+    TYPE_EPISODE = 4
 
     @property
     def has_metadata_state(self):
@@ -30,6 +26,14 @@ class PlexTimeline(PlexAlert):
     def item_id(self):
         return int(self._message.get("itemID", None))
 
+    @property
+    def item_key(self):
+        return f"/library/metadata/{self.item_id}"
+
+    @property
+    def section_id(self):
+        return self._message.get("sectionID", None)
+
     @property
     def identifier(self):
         return self._message.get("identifier", None)
@@ -42,30 +46,27 @@ class PlexTimeline(PlexAlert):
     def entry_type(self):
         return self._message.get("type", None)
 
-    def process(self, plex: PlexServer):
-        if self.has_metadata_state or self.has_media_state:
-            return
-        if self.identifier != "com.plexapp.plugins.library" or self.state != 5 or self.entry_type == -1:
-            return
+    @property
+    def shard_key(self):
+        return self._get_rating_key(self._message.get("itemID", None))
 
-        # Skip if not an Episode
-        item = plex.fetch_item(self.item_id)
-        if item is None or not isinstance(item, Episode):
-            return
+    @property
+    def debounce_key(self):
+        return (self.TYPE, self._message.get("itemID", None)), (self.state, self.entry_type)
 
-        # Skip if the show should be ignored
-        if plex.should_ignore_show(item.show()):
-            logger.debug(f"[Timeline] Ignoring episode {item} due to Plex show labels")
-            return
+    @property
+    def scanned_section_id(self):
+        return self.section_id if self.identifier == "com.plexapp.plugins.library" else None
 
-        # Check if the item has been added recently
-        if item.addedAt < datetime.now() - timedelta(minutes=5):
+    def process(self, plex: PlexServer):
+        if self.has_metadata_state or self.has_media_state:
+            return
+        if self.identifier != "com.plexapp.plugins.library" or self.state != 5 or self.entry_type != self.TYPE_EPISODE:
             return
 
-        # Check if the item has already been processed
-        if not plex.cache.should_process_recently_added(item.key, item.addedAt):
+        # Skip if the item is known not to be an Episode
+        if not plex.cache.is_episode_candidate(self.item_key, self.section_id):
             return
 
-        # Change tracks for all users
-        logger.info(f"[Timeline] Processing newly added episode {plex.get_episode_short_name(item)}")
-        plex.process_new_or_updated_episode(self.item_id, EventType.NEW_EPISODE, True)
+        # Newly added episodes are fetched and processed in batches
+        plex.queue_new_episode(self.item_id)
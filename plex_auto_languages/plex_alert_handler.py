@@ -1,12 +1,16 @@
 from __future__ import annotations
+import zlib
 from typing import TYPE_CHECKING
 from time import sleep
-from queue import Queue, Empty
+from queue import Empty
 from threading import Thread, Event
 from requests.exceptions import ReadTimeout
 from urllib3.exceptions import ReadTimeoutError
-from plex_auto_languages.alerts import PlexActivity, PlexTimeline, PlexPlaying, PlexStatus
+from plex_auto_languages.alerts import PlexActivity, PlexTimeline, PlexPlaying, PlexStatus, PlexScheduledTask
+from plex_auto_languages.alerts.base import PlexAlert
 from plex_auto_languages.utils.logger import get_logger
+from plex_auto_languages.utils.priority_queue import BoundedPriorityQueue
+from plex_auto_languages.utils.ttl_cache import TTLCache
 
 if TYPE_CHECKING:
     from plex_auto_languages.plex_server import PlexServer
@@ -17,20 +21,83 @@ logger = get_logger()
 
 class PlexAlertHandler():
 
-    def __init__(self, plex: PlexServer, trigger_on_play: bool, trigger_on_scan: bool, trigger_on_activity: bool):
+    def __init__(self, plex: PlexServer, trigger_on_play: bool, trigger_on_scan: bool, trigger_on_activity: bool,
+                 workers: int = 1, debounce_window: float = 0, queue_size: int = 10000,
+                 overflow_policy: str = BoundedPriorityQueue.DROP_LOWEST):
         self._plex = plex
         self._trigger_on_play = trigger_on_play
         self._trigger_on_scan = trigger_on_scan
         self._trigger_on_activity = trigger_on_activity
-        self._alerts_queue = Queue()
         self._stop_event = Event()
-        self._processor_thread = Thread(target=self._process_alerts)
-        self._processor_thread.daemon = True
-        self._processor_thread.start()
+        # Alerts repeating the state of an alert received during the debounce window are dropped before being queued
+        self._debounce_window = debounce_window
+        self._recent_alerts = TTLCache(max_size=10000, ttl=debounce_window)  # identity: state
+        self._received_count = {}
+        self._debounced_count = {}
+        # Each worker drains its own queue, alerts are dispatched to the workers based on their shard key
+        # and served by priority so that playback alerts are not delayed by the alerts of a library scan
+        # Scheduled tasks are never evicted, their episodes are already marked as processed when they are queued, they
+        # are rejected instead so that they are run by the caller
+        self._alerts_queues = [BoundedPriorityQueue(queue_size, overflow_policy, [PlexScheduledTask.PRIORITY])
+                               for _ in range(max(1, workers))]
+        self._processor_threads = []
+        for index, alerts_queue in enumerate(self._alerts_queues):
+            processor_thread = Thread(target=self._process_alerts, args=(alerts_queue,), name=f"AlertWorker-{index}")
+            processor_thread.daemon = True
+            processor_thread.start()
+            self._processor_threads.append(processor_thread)
+
+    @property
+    def workers(self):
+        return len(self._alerts_queues)
+
+    @property
+    def stats(self):
+        return {
+            "workers": self.workers,
+            "received": dict(self._received_count),
+            "debounced": dict(self._debounced_count),
+            "recent_alerts": self._recent_alerts.stats,
+            "queue": self._get_queue_stats()
+        }
+
+    def _get_queue_stats(self):
+        stats = {"size": 0, "max_size": 0, "priorities": {}}
+        for alerts_queue in self._alerts_queues:
+            queue_stats = alerts_queue.stats
+            stats["size"] += queue_stats["size"]
+            stats["max_size"] += queue_stats["max_size"]
+            for priority, priority_stats in queue_stats["priorities"].items():
+                aggregated = stats["priorities"].setdefault(priority, {"depth": 0, "oldest_age": 0, "dropped": 0})
+                aggregated["depth"] += priority_stats["depth"]
+                aggregated["oldest_age"] = max(aggregated["oldest_age"], priority_stats["oldest_age"])
+                aggregated["dropped"] += priority_stats["dropped"]
+        return stats
+
+    def get_notification_types(self):
+        notification_types = []
+        if self._trigger_on_play:
+            notification_types.append(PlexPlaying.TYPE)
+        if self._trigger_on_activity:
+            notification_types.append(PlexActivity.TYPE)
+        if self._trigger_on_scan:
+            notification_types.extend([PlexTimeline.TYPE, PlexStatus.TYPE])
+        return notification_types
 
     def stop(self):
         self._stop_event.set()
-        self._processor_thread.join()
+        for processor_thread in self._processor_threads:
+            processor_thread.join()
+
+    def _get_queue(self, alert: PlexAlert):
+        shard_key = alert.shard_key if alert.shard_key is not None else alert.TYPE
+        return self._alerts_queues[zlib.crc32(str(shard_key).encode("utf-8")) % len(self._alerts_queues)]
+
+    def put(self, alert: PlexAlert):
+        if not self._get_queue(alert).put(alert, alert.PRIORITY):
+            logger.debug(f"Dropping {alert.TYPE} alert, the alert queue is full")
+            return False
+        return True
 
     def __call__(self, message: dict):
         alert_class = None
@@ -53,15 +120,32 @@ class PlexAlertHandler():
 
         for alert_message in message[alert_field]:
             alert = alert_class(alert_message)
-            self._alerts_queue.put(alert)
+            self._received_count[alert.TYPE] = self._received_count.get(alert.TYPE, 0) + 1
+            # Scanned sections are recorded in order of arrival, before the status alert ending the scan can be
+            # processed by another worker
+            if alert.scanned_section_id is not None:
+                self._plex.cache.mark_section_scanned(alert.scanned_section_id)
+            if self._should_debounce(alert):
+                self._debounced_count[alert.TYPE] = self._debounced_count.get(alert.TYPE, 0) + 1
+                continue
+            self.put(alert)
+
+    def _should_debounce(self, alert: PlexAlert):
+        if self._debounce_window <= 0 or alert.debounce_key is None:
+            return False
+        identity, state = alert.debounce_key
+        if identity in self._recent_alerts and self._recent_alerts.get(identity) == state:
+            return True
+        self._recent_alerts[identity] = state
+        return False
 
-    def _process_alerts(self):
+    def _process_alerts(self, alerts_queue: BoundedPriorityQueue):
         logger.debug("Starting alert processing thread")
         retry_counter = 0
         while not self._stop_event.is_set():
             try:
                 if retry_counter == 0:
-                    alert = self._alerts_queue.get(True, 1)
+                    alert = alerts_queue.get(True, 1)
                 try:
                     alert.process(self._plex)
                     retry_counter = 0
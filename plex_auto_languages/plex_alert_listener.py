@@ -1,21 +1,112 @@
 from __future__ import annotations
-from typing import Callable
-from websocket import WebSocketApp
+import re
+import json
+from typing import Callable, List, Union
+from websocket import WebSocketApp, WebSocketBadStatusException
 from plexapi.alert import AlertListener
 from plexapi.server import PlexServer as BasePlexServer
 
 from plex_auto_languages.utils.logger import get_logger
 
+try:
+    import orjson
+    json_loads = orjson.loads
+except ImportError:
+    json_loads = json.loads
+
 
 logger = get_logger()
 
+# Plex always serializes the type of the notification first, right after the opening of the container
+NOTIFICATION_TYPE_REGEX = re.compile(r'^\s*\{\s*"NotificationContainer"\s*:\s*\{\s*"type"\s*:\s*"([^"]*)"')
+NOTIFICATION_TYPE_BYTES_REGEX = re.compile(NOTIFICATION_TYPE_REGEX.pattern.encode("utf-8"))
+
 
 class PlexAlertListener(AlertListener):
 
-    def __init__(self, server: BasePlexServer, callback: Callable = None, callbackError: Callable = None):
+    def __init__(self, server: BasePlexServer, callback: Callable = None, callbackError: Callable = None,
+                 filters: List[str] = None):
         super().__init__(server, callback, callbackError)
+        self._filters = filters if filters else None
+        self._use_filters = self._filters is not None
+        self._connected = False
+        self._filters_rejected = False
+        self._received_count = 0
+        self._ignored_count = 0
+
+    @property
+    def filters(self):
+        return self._filters if self._use_filters else None
+
+    @property
+    def stats(self):
+        return {
+            "filters": self.filters,
+            "received": self._received_count,
+            "ignored": self._ignored_count
+        }
+
+    def get_url(self):
+        key = self.key
+        if self.filters is not None:
+            key = f"{key}?filters={','.join(self.filters)}"
+        return self._server.url(key, includeToken=True).replace("http", "ws")
 
     def run(self):
-        url = self._server.url(self.key, includeToken=True).replace("http", "ws")
-        self._ws = WebSocketApp(url, on_message=self._onMessage, on_error=self._onError)
-        self._ws.run_forever(skip_utf8_validation=True)
+        while True:
+            self._connected = False
+            self._filters_rejected = False
+            self._ws = WebSocketApp(self.get_url(), on_open=self._onOpen, on_message=self._onMessage, on_error=self._onError)
+            self._ws.run_forever(skip_utf8_validation=True)
+            # Servers that do not support notification filters reject the handshake, subscribe to everything instead
+            if not self._filters_rejected:
+                break
+
+    def _onOpen(self, *_):
+        self._connected = True
+        if self.filters is not None:
+            logger.debug(f"[Listener] Subscribed to the notifications of type: {', '.join(self.filters)}")
+
+    @staticmethod
+    def peek_notification_type(message: Union[str, bytes]):
+        regex = NOTIFICATION_TYPE_BYTES_REGEX if isinstance(message, bytes) else NOTIFICATION_TYPE_REGEX
+        match = regex.match(message, 0, 256)
+        if match is None:
+            return None
+        notification_type = match.group(1)
+        return notification_type.decode("utf-8") if isinstance(notification_type, bytes) else notification_type
+
+    def _onMessage(self, *args):
+        message = args[-1]
+        # Unwanted notifications are dropped without decoding the whole frame when possible, faster decoders such as
+        # orjson decode the whole frame quicker than the peek
+        if self._filters is not None and json_loads is json.loads:
+            notification_type = self.peek_notification_type(message)
+            if notification_type is not None and notification_type not in self._filters:
+                self._ignore_message()
+                return
+        try:
+            data = json_loads(message)["NotificationContainer"]
+            # The server may ignore the filters, unwanted notifications are then dropped here
+            if self._filters is not None and data.get("type", None) not in self._filters:
+                self._ignore_message()
+                return
+            self._received_count += 1
+            if self._callback:
+                self._callback(data)
+        except Exception as e:
+            logger.error(f"[Listener] Unable to handle notification: {e}")
+
+    def _ignore_message(self):
+        if self._ignored_count == 0 and self._use_filters:
+            logger.debug("[Listener] The Plex server does not apply the notification filters")
+        self._ignored_count += 1
+
+    def _onError(self, *args):
+        error = args[-1]
+        if self.filters is not None and not self._connected and isinstance(error, WebSocketBadStatusException):
+            logger.warning("[Listener] The Plex server rejected the notification filters, subscribing to all notifications")
+            self._use_filters = False
+            self._filters_rejected = True
+            return
+        super()._onError(*args)
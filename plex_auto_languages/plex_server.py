@@ -1,22 +1,35 @@
 import time
 import requests
 import itertools
-from typing import Union, Callable
+from functools import partial
+from collections import deque
+from urllib.parse import urlencode
+from typing import List, Union, Callable
+from threading import Event, Lock
+from concurrent.futures import ThreadPoolExecutor, as_completed, TimeoutError as FuturesTimeoutError
 from datetime import datetime, timedelta
 from requests import ConnectionError as RequestsConnectionError
 from plexapi.media import MediaPart
+from plexapi import TIMEOUT
 from plexapi.library import ShowSection
 from plexapi.video import Episode, Show
 from plexapi.exceptions import NotFound, Unauthorized, BadRequest
 from plexapi.server import PlexServer as BasePlexServer
 
 from plex_auto_languages.utils.logger import get_logger
+from plex_auto_languages.utils.coalescer import Coalescer
+from plex_auto_languages.utils.rate_limiter import TokenBucket
+from plex_auto_languages.utils.episode_scanner import iter_episode_records
 from plex_auto_languages.utils.configuration import Configuration
 from plex_auto_languages.plex_alert_handler import PlexAlertHandler
 from plex_auto_languages.plex_alert_listener import PlexAlertListener
+from plex_auto_languages.alerts import PlexScheduledTask
 from plex_auto_languages.track_changes import TrackChanges, NewOrUpdatedTrackChanges
 from plex_auto_languages.utils.notifier import Notifier
+from plex_auto_languages.utils.user_registry import UserRegistry
 from plex_auto_languages.plex_server_cache import PlexServerCache
+from plex_auto_languages.plex_server_pool import PlexServerPool
+from plex_auto_languages.session_tracker import SessionTracker
 from plex_auto_languages.constants import EventType
 from plex_auto_languages.exceptions import UserNotFound
 
@@ -29,7 +42,12 @@ class UnprivilegedPlexServer():
     def __init__(self, url: str, token: str, session: requests.Session = requests.Session()):
         self._session = session
         self._plex_url = url
-        self._plex = self._get_server(url, token, self._session)
+        self._unauthorized = False
+        try:
+            self._plex = self._get_server(url, token, self._session)
+        except Unauthorized:
+            self._unauthorized = True
+            self._plex = None
 
     @property
     def connected(self):
@@ -38,9 +56,16 @@ class UnprivilegedPlexServer():
         try:
             _ = self._plex.library.sections()
             return True
+        except Unauthorized:
+            self._unauthorized = True
+            return False
         except (BadRequest, RequestsConnectionError):
             return False
 
+    @property
+    def unauthorized(self):
+        return self._unauthorized
+
     @property
     def unique_id(self):
         return self._plex.machineIdentifier
@@ -49,7 +74,7 @@ class UnprivilegedPlexServer():
     def _get_server(url: str, token: str, session: requests.Session):
         try:
             return BasePlexServer(url, token, session=session)
-        except (RequestsConnectionError, Unauthorized):
+        except RequestsConnectionError:
             return None
 
     def fetch_item(self, item_id: Union[str, int]):
@@ -57,10 +82,70 @@ class UnprivilegedPlexServer():
             return self._plex.fetchItem(item_id)
         except NotFound:
             return None
+        except Unauthorized:
+            self._unauthorized = True
+            return None
+
+    def fetch_items(self, item_ids: List[Union[str, int]], batch_size: int = 100):
+        rating_keys = [str(item_id).split("/")[-1] for item_id in item_ids]
+        items = []
+        for index in range(0, len(rating_keys), batch_size):
+            try:
+                items.extend(self._plex.fetchItems(f"/library/metadata/{','.join(rating_keys[index:index + batch_size])}"))
+            except NotFound:
+                continue
+        return items
 
     def episodes(self):
         return self._plex.library.all(libtype="episode", container_size=1000)
 
+    def scan_episodes(self, max_workers: int = 1, container_size: int = 1000, sections: List[ShowSection] = None):
+        pages = []
+        for section in (sections if sections is not None else self.get_show_sections()):
+            total_size = section.totalViewSize(libtype="episode")
+            pages.extend([(section.key, start) for start in range(0, total_size, container_size)])
+        with ThreadPoolExecutor(max_workers=max(max_workers, 1)) as executor:
+            # Only keep a few pages in flight so that memory does not depend on the size of the library
+            futures = deque()
+            for section_key, container_start in pages:
+                futures.append(executor.submit(
+                    self._scan_episode_records, f"/library/sections/{section_key}/all?type=4", container_start, container_size,
+                    section_key
+                ))
+                if len(futures) >= 2 * max_workers:
+                    yield from futures.popleft().result()
+            while len(futures) > 0:
+                yield from futures.popleft().result()
+
+    def get_episodes_changed_since(self, since: datetime, max_workers: int = 1, sections: List[ShowSection] = None):
+        timestamp = int(since.timestamp())
+        queries = []
+        for section in (sections if sections is not None else self.get_show_sections()):
+            for field in ["addedAt", "updatedAt"]:
+                query = urlencode({"type": 4, f"{field}>>": timestamp})
+                queries.append((f"/library/sections/{section.key}/all?{query}", section.key))
+        with ThreadPoolExecutor(max_workers=max(max_workers, 1)) as executor:
+            results = executor.map(lambda query: self._scan_episode_records(query[0], section_id=query[1]), queries)
+            records = {}
+            for record in itertools.chain.from_iterable(results):
+                records.setdefault(record.key, record)
+        return list(records.values())
+
+    def _scan_episode_records(self, key: str, container_start: int = None, container_size: int = None,
+                              section_id: Union[int, str] = None):
+        headers = {"Accept": "application/xml"}
+        if container_start is not None and container_size is not None:
+            headers["X-Plex-Container-Start"] = str(container_start)
+            headers["X-Plex-Container-Size"] = str(container_size)
+        url = self._plex.url(key, includeToken=True)
+        with self._session.get(url, headers=headers, stream=True, timeout=TIMEOUT) as response:
+            response.raise_for_status()
+            response.raw.decode_content = True
+            records = iter_episode_records(response.raw)
+            if section_id is None:
+                return list(records)
+            return [record._replace(section_id=str(section_id)) for record in records]
+
     def get_recently_added_episodes(self, minutes: int):
         episodes = []
         for section in self.get_show_sections():
@@ -68,18 +153,40 @@ class UnprivilegedPlexServer():
             episodes.extend(recent)
         return episodes
 
+    def get_sections(self):
+        return self._plex.library.sections()
+
     def get_show_sections(self):
-        return [s for s in self._plex.library.sections() if isinstance(s, ShowSection)]
+        return [s for s in self.get_sections() if isinstance(s, ShowSection)]
 
     @staticmethod
     def get_last_watched_or_first_episode(show: Show):
-        watched_episodes = show.watched()
-        if len(watched_episodes) == 0:
-            all_episodes = show.episodes()
-            if len(all_episodes) == 0:
-                return None
-            return all_episodes[0]
-        return watched_episodes[-1]
+        # Both lookups are limited to a single item instead of listing the watched episodes, then every episode
+        query = urlencode({"type": 4, "show.id": show.ratingKey, "viewCount>>": 0, "sort": "lastViewedAt:desc"})
+        watched_episodes = show.fetchItems(f"/library/sections/{show.librarySectionID}/all?{query}", Episode,
+                                           container_size=1, maxresults=1)
+        # The episode is only trusted if Plex honored the show filter, otherwise the first episode of the show is used
+        if len(watched_episodes) > 0 and str(watched_episodes[0].grandparentRatingKey) == str(show.ratingKey):
+            return watched_episodes[0]
+        all_episodes = show.fetchItems(f"{show.key}/allLeaves", Episode, container_size=1, maxresults=1)
+        if len(all_episodes) == 0:
+            return None
+        return all_episodes[0]
+
+    @staticmethod
+    def get_section_version(section: ShowSection):
+        # Plex bumps 'contentChangedAt' whenever an item of the section is added, updated or deleted
+        content_changed_at = section._data.attrib.get("contentChangedAt", None) if section._data is not None else None
+        if content_changed_at is not None:
+            return str(content_changed_at)
+        return section.updatedAt.isoformat() if section.updatedAt is not None else None
+
+    @staticmethod
+    def group_episodes_by_show(episodes: List[Episode]):
+        groups = {}  # show_key: [episode]
+        for episode in episodes:
+            groups.setdefault(episode.grandparentRatingKey, []).append(episode)
+        return groups
 
     @staticmethod
     def get_selected_streams(episode: Union[Episode, MediaPart]):
@@ -107,6 +214,11 @@ class PlexServer(UnprivilegedPlexServer):
         logger.info(f"Successfully connected as user '{self.username}' (id: {self.user_id})")
         self._alert_handler = None
         self._alert_listener = None
+        self._user_servers = PlexServerPool(self._get_user_server)
+        self._user_registry = (None, None)
+        self.session_tracker = SessionTracker(self)
+        self._write_limiter = TokenBucket(self.config.get("track_changes.write_rate"))
+        self._new_episodes = Coalescer(self.config.get("alerts.coalesce_window"), self._schedule_new_episodes)
         self.cache = PlexServerCache(self)
 
     @property
@@ -148,19 +260,38 @@ class PlexServer(UnprivilegedPlexServer):
     def save_cache(self):
         self.cache.save()
 
+    def get_stats(self):
+        return {
+            "cache": self.cache.get_stats(),
+            "user_servers": self._user_servers.stats,
+            "sessions": self.session_tracker.stats,
+            "alerts": self._alert_handler.stats if self._alert_handler is not None else None,
+            "listener": self._alert_listener.stats if self._alert_listener is not None else None,
+            "new_episodes": self._new_episodes.stats
+        }
+
     def start_alert_listener(self, error_callback: Callable):
         trigger_on_play = self.config.get("trigger_on_play")
         trigger_on_scan = self.config.get("trigger_on_scan")
         trigger_on_activity = self.config.get("trigger_on_activity")
-        self._alert_handler = PlexAlertHandler(self, trigger_on_play, trigger_on_scan, trigger_on_activity)
-        self._alert_listener = PlexAlertListener(self._plex, self._alert_handler, error_callback)
+        workers = self.config.get("alerts.workers")
+        debounce_window = self.config.get("alerts.debounce_window")
+        queue_size = self.config.get("alerts.queue_size")
+        overflow_policy = self.config.get("alerts.overflow_policy")
+        self._alert_handler = PlexAlertHandler(self, trigger_on_play, trigger_on_scan, trigger_on_activity, workers,
+                                               debounce_window, queue_size, overflow_policy)
+        filters = self._alert_handler.get_notification_types()
+        self._alert_listener = PlexAlertListener(self._plex, self._alert_handler, error_callback, filters)
         logger.info("Starting alert listener")
         self._alert_listener.start()
 
     def get_instance_users(self):
-        users = self.cache.get_instance_users()
-        if users is not None:
-            return users
+        return self.get_instance_user_registry().users
+
+    def get_instance_user_registry(self):
+        registry = self.cache.get_instance_user_registry()
+        if registry is not None:
+            return registry
         users = []
         try:
             for user in self._plex.myPlexAccount().users():
@@ -169,49 +300,62 @@ class PlexServer(UnprivilegedPlexServer):
                     user.name = user.title
                     users.append(user)
             self.cache.set_instance_users(users)
-            return users
+            return self.cache.get_instance_user_registry()
         except BadRequest:
             logger.warning("Unable to retrieve the users of the account, falling back to cache")
-            return self.cache.get_instance_users(check_validity=False)
+            return self.cache.get_instance_user_registry(check_validity=False)
+
+    def get_user_registry(self):
+        instance_registry = self.get_instance_user_registry()
+        source_registry, user_registry = self._user_registry
+        if source_registry is not instance_registry:
+            user_registry = UserRegistry([self._user] + instance_registry.users)
+            self._user_registry = (instance_registry, user_registry)
+        return user_registry
 
     def get_all_user_ids(self):
-        return [self.user_id] + [user.id for user in self.get_instance_users()]
+        return self.get_user_registry().ids
 
     def get_plex_instance_of_user(self, user_id: Union[int, str]):
         if str(self.user_id) == str(user_id):
             return self
-        matching_users = [u for u in self.get_instance_users() if str(u.id) == str(user_id)]
-        if len(matching_users) == 0:
+        user = self.get_instance_user_registry().get_by_id(user_id)
+        if user is None:
             logger.error(f"Unable to find user with id '{user_id}'")
             return None
-        user = matching_users[0]
         user_token = self.cache.get_instance_user_token(user.id)
         if user_token is None:
             user_token = user.get_token(self.unique_id)
             self.cache.set_instance_user_token(user.id, user_token)
-        user_plex = UnprivilegedPlexServer(self._plex_url, user_token, session=self._session)
-        if not user_plex.connected:
-            logger.error(f"Connection to the Plex server failed for user '{matching_users[0].name}'")
+        try:
+            user_plex = self._user_servers.get(user.id, user_token)
+        except Unauthorized:
+            # The token has been revoked, try again with a new one
+            user_token = user.get_token(self.unique_id)
+            self.cache.set_instance_user_token(user.id, user_token)
+            try:
+                user_plex = self._user_servers.get(user.id, user_token)
+            except Unauthorized:
+                user_plex = None
+        if user_plex is None:
+            logger.error(f"Connection to the Plex server failed for user '{user.name}'")
             return None
         return user_plex
 
-    def get_user_from_client_identifier(self, client_identifier: str):
-        plex_sessions = self._plex.sessions()
-        current_players = list(itertools.chain.from_iterable([s.players for s in plex_sessions]))
-        matching_players = [p for p in current_players if p.machineIdentifier == client_identifier]
-        if len(matching_players) == 0:
-            return (None, None)
-        player = matching_players[0]
-        user = self.get_user_by_id(player.userID)
-        if user is None:
-            return (None, None)
-        return (user.id, user.name)
+    def _get_user_server(self, token: str):
+        return UnprivilegedPlexServer(self._plex_url, token, session=self._session)
+
+    def get_user_from_client_identifier(self, client_identifier: str, session_key: str = None):
+        return self.session_tracker.get_user(client_identifier, session_key)
+
+    def get_sessions(self):
+        return self._plex.sessions()
 
     def get_user_by_id(self, user_id: Union[int, str]):
-        matching_users = [u for u in [self._user] + self.get_instance_users() if str(u.id) == str(user_id)]
-        if len(matching_users) == 0:
-            return None
-        return matching_users[0]
+        return self.get_user_registry().get_by_id(user_id)
+
+    def get_user_by_name(self, username: str):
+        return self.get_user_registry().get_by_name(username)
 
     def should_ignore_show(self, show: Show):
         for label in show.labels:
@@ -219,44 +363,153 @@ class PlexServer(UnprivilegedPlexServer):
                 return True
         return False
 
-    def process_new_or_updated_episode(self, item_id: Union[int, str], event_type: EventType, new: bool):
-        track_changes = NewOrUpdatedTrackChanges(event_type, new)
-        for user_id in self.get_all_user_ids():
-            # Switch to the user's Plex instance
-            user_plex = self.get_plex_instance_of_user(user_id)
-            if user_plex is None:
-                continue
+    def queue_new_episode(self, item_id: Union[int, str]):
+        # Newly added episodes are coalesced so that a burst of timeline alerts is processed in a single pass
+        self._new_episodes.add(item_id)
 
-            # Get the most recently watched episode or the first one of the show
-            user_item = user_plex.fetch_item(item_id)
-            if user_item is None:
-                continue
-            reference = user_plex.get_last_watched_or_first_episode(user_item.show())
-            if reference is None:
+    def _schedule_new_episodes(self, item_ids: List[Union[int, str]]):
+        # Coalesced episodes are processed by the alert workers rather than by the thread flushing the window
+        self._run_scheduled_task(f"/library/metadata/{item_ids[0]}", partial(self.process_new_episodes, item_ids))
+
+    def process_new_episodes(self, item_ids: List[Union[int, str]]):
+        items = self.fetch_items(item_ids)
+        for item in items:
+            if not isinstance(item, Episode):
+                self.cache.set_item_type(item.key, item.type)
+        episodes = []
+        for show_episodes in self.group_episodes_by_show([i for i in items if isinstance(i, Episode)]).values():
+            # Skip if the show should be ignored
+            if self.should_ignore_show(show_episodes[0].show()):
+                logger.debug(f"[Timeline] Ignoring {len(show_episodes)} episode(s) due to Plex show labels")
                 continue
+            for episode in show_episodes:
+                # Check if the item has been added recently
+                if episode.addedAt < datetime.now() - timedelta(minutes=5):
+                    continue
+                # Check if the item has already been processed
+                if not self.cache.should_process_recently_added(episode.key, episode.addedAt):
+                    continue
+                logger.info(f"[Timeline] Processing newly added episode {self.get_episode_short_name(episode)}")
+                episodes.append(episode.key)
+        if len(episodes) > 0:
+            self.process_new_or_updated_episodes(episodes, EventType.NEW_EPISODE, True)
 
-            # Change tracks
-            reference.reload()
-            user_item.reload()
-            user = self.get_user_by_id(user_id)
-            if user is None:
-                return
-            track_changes.change_track_for_user(user.name, reference, user_item)
+    def process_new_or_updated_episode(self, item_id: Union[int, str], event_type: EventType, new: bool):
+        self.process_new_or_updated_episodes([item_id], event_type, new)
+
+    def process_new_or_updated_episodes(self, item_ids: List[Union[int, str]], event_type: EventType, new: bool):
+        track_changes = {}  # episode_key: NewOrUpdatedTrackChanges
+        track_changes_lock = Lock()
+
+        def get_episode_changes(episode_key: str):
+            with track_changes_lock:
+                return track_changes.setdefault(episode_key, NewOrUpdatedTrackChanges(
+                    event_type, new, self.config.get("track_changes.write_concurrency"), self._write_limiter,
+                    self.cache.selection_ledger))
+
+        # Users are processed concurrently, each of them only waits for its own Plex requests
+        user_ids = self.get_all_user_ids()
+        timeout = self.config.get("track_changes.user_timeout") or None
+        stop_event = Event()
+        error = None
+        executor = ThreadPoolExecutor(max_workers=self.config.get("track_changes.user_workers"))
+        futures = {executor.submit(self._process_new_or_updated_episodes_for_user, user_id, item_ids, get_episode_changes,
+                                   stop_event): user_id for user_id in user_ids}
+        try:
+            for future in as_completed(futures, timeout=timeout):
+                try:
+                    future.result()
+                except Exception as e:
+                    if not self.config.get("track_changes.isolate_user_errors"):
+                        error = e
+                        break
+                    logger.exception(f"Unable to update the tracks of the episodes for user with id '{futures[future]}'")
+        except FuturesTimeoutError:
+            pending = [str(user_id) for future, user_id in futures.items() if not future.done()]
+            logger.warning(f"Updating the tracks of the episodes timed out after {timeout} seconds, "
+                           f"stopping the updates of user(s) with id: {', '.join(pending)}")
+        finally:
+            # Users not started yet are cancelled and the running ones stop before their next episode, they are joined
+            # so that the changes are not modified while being notified
+            stop_event.set()
+            for future in futures:
+                future.cancel()
+            executor.shutdown(wait=True)
+
+        # Notify changes, including the ones of the users processed before an error
+        with track_changes_lock:
+            episodes_changes = list(track_changes.items())
+        for episode_key, episode_changes in episodes_changes:
+            logger.debug(f"[Language Update] Matched the streams of episode {episode_key} "
+                         f"once for each of the {episode_changes.group_count} group(s) of users")
+            if episode_changes.has_changes:
+                self.notify_changes(episode_changes)
+        if error is not None:
+            raise error
+
+    def _process_new_or_updated_episodes_for_user(self, user_id: Union[int, str], item_ids: List[Union[int, str]],
+                                                  get_episode_changes: Callable[[str], NewOrUpdatedTrackChanges],
+                                                  stop_event: Event = None):
+        # Switch to the user's Plex instance
+        user_plex = self.get_plex_instance_of_user(user_id)
+        if user_plex is None:
+            return
+        user = self.get_user_by_id(user_id)
+        if user is None:
+            return
 
-        # Notify changes
-        if track_changes.has_changes:
-            self.notify_changes(track_changes)
+        # Fetch all the episodes at once and group them by show
+        user_items = [item for item in user_plex.fetch_items(item_ids) if isinstance(item, Episode)]
+        for show_key, show_items in self.group_episodes_by_show(user_items).items():
+            # The stored preference of the user avoids looking up and fetching a reference episode
+            preference = self.cache.language_preferences.get(user.id, show_key)
+            reference = None
+            if preference is None:
+                # Get the most recently watched episode or the first one of the show, once per show
+                reference = self.get_reference_episode(user_id, user_plex, show_items[0])
+                if reference is None:
+                    continue
+                self.cache.language_preferences.set(user.id, show_key, *self.get_selected_streams(reference))
 
-    def change_tracks(self, username: str, episode: Episode, event_type: EventType):
-        track_changes = TrackChanges(username, episode, event_type)
+            # Change tracks
+            for user_item in show_items:
+                if stop_event is not None and stop_event.is_set():
+                    return
+                # Episodes fetched by key already carry the streams selected by the user, they are not reloaded
+                get_episode_changes(user_item.key).change_track_for_user(user.name, reference, user_item, user.id, preference)
+
+    def get_reference_episode(self, user_id: Union[int, str], user_plex: UnprivilegedPlexServer, episode: Episode):
+        # The reference of a user only changes when they play an episode of the show, see PlexPlaying
+        cache_key = (str(user_id), str(episode.grandparentRatingKey))
+        reference_key = self.cache.reference_episodes.get(cache_key, None)
+        if reference_key is None:
+            reference = user_plex.get_last_watched_or_first_episode(episode.show())
+            if reference is None:
+                return None
+            reference_key = reference.key
+            self.cache.reference_episodes[cache_key] = reference_key
+        return user_plex.fetch_item(reference_key)
+
+    def change_tracks(self, username: str, episode: Episode, event_type: EventType,
+                      user_plex: UnprivilegedPlexServer = None):
+        # The episodes to update are reloaded through the Plex instance of the user the episode was fetched with
+        user = self.get_user_by_name(username)
+        user_id = user.id if user is not None else None
+        track_changes = TrackChanges(username, episode, event_type, user_id, self.cache.selection_ledger)
+        # Every observed selection becomes the preference of the user for the show
+        if user_id is not None:
+            self.cache.language_preferences.set(user_id, episode.grandparentRatingKey, *self.get_selected_streams(episode))
+        # Selections recorded for the parts of the reference under a previous choice of the user are replaced
+        track_changes.record_reference()
         # Get episodes to update
         episodes = track_changes.get_episodes_to_update(self.config.get("update_level"), self.config.get("update_strategy"))
 
         # Get changes to perform
-        track_changes.compute(episodes)
+        server = user_plex if user_plex is not None else self
+        track_changes.compute(episodes, server, self.config.get("track_changes.batch_size"))
 
         # Perform changes
-        track_changes.apply()
+        track_changes.apply(self.config.get("track_changes.write_concurrency"), self._write_limiter)
 
         # Notify changes
         if track_changes.has_changes:
@@ -280,8 +533,7 @@ class PlexServer(UnprivilegedPlexServer):
             user = self.get_user_by_id(episode.accountID)
             if user is None:
                 continue
-            episode.reload()
-            self.change_tracks(user.name, episode, EventType.SCHEDULER)
+            self._run_scheduled_task(episode.key, partial(self._change_tracks_of_history_item, user.name, episode))
 
         # Scan library
         added, updated = self.cache.refresh_library_cache()
@@ -291,15 +543,28 @@ class PlexServer(UnprivilegedPlexServer):
             if not self.cache.should_process_recently_added(item.key, item.addedAt):
                 continue
             logger.info(f"[Scheduler] Processing newly added episode {self.get_episode_short_name(item)}")
-            self.process_new_or_updated_episode(item.key, EventType.SCHEDULER, True)
+            task = partial(self.process_new_or_updated_episode, item.key, EventType.SCHEDULER, True)
+            self._run_scheduled_task(item.key, task)
         for item in updated:
             if self.should_ignore_show(item.show()):
                 continue
             if not self.cache.should_process_recently_updated(item.key):
                 continue
             logger.info(f"[Scheduler] Processing updated episode {self.get_episode_short_name(item)}")
-            self.process_new_or_updated_episode(item.key, EventType.SCHEDULER, False)
+            task = partial(self.process_new_or_updated_episode, item.key, EventType.SCHEDULER, False)
+            self._run_scheduled_task(item.key, task)
+
+    def _change_tracks_of_history_item(self, username: str, episode: Episode):
+        episode.reload()
+        self.change_tracks(username, episode, EventType.SCHEDULER)
+
+    def _run_scheduled_task(self, item_key: str, callback: Callable[[], None]):
+        # Scheduled work goes through the alert queues with the lowest priority so that it never delays user actions
+        if self._alert_handler is None or not self._alert_handler.put(PlexScheduledTask(item_key, callback)):
+            callback()
 
     def stop(self):
+        self._new_episodes.cancel()
         if self._alert_handler:
             self._alert_handler.stop()
+        self.cache.close()
@@ -1,16 +1,24 @@
 from __future__ import annotations
 import os
-import json
-import copy
-from typing import TYPE_CHECKING
+import sqlite3
+import itertools
+from threading import Lock
+from typing import TYPE_CHECKING, Iterable, List, Set, Union
 from datetime import datetime, timedelta
 from dateutil.parser import isoparse
+from plexapi.video import Episode
 
 from plex_auto_languages.utils.logger import get_logger
-from plex_auto_languages.utils.json_encoders import DateTimeEncoder
+from plex_auto_languages.utils.sqlite_store import SQLiteStore, SQLiteDict
+from plex_auto_languages.utils.ttl_cache import TTLCache
+from plex_auto_languages.utils.user_registry import UserRegistry
+from plex_auto_languages.utils.selection_ledger import SelectionLedger
+from plex_auto_languages.utils.preference_store import PreferenceStore
 
 if TYPE_CHECKING:
+    from plexapi.library import ShowSection
     from plex_auto_languages.plex_server import PlexServer
+    from plex_auto_languages.utils.episode_scanner import EpisodeRecord
 
 
 logger = get_logger()
@@ -20,78 +28,266 @@ class PlexServerCache():
 
     def __init__(self, plex: PlexServer):
         self._is_refreshing = False
-        self._encoder = DateTimeEncoder()
+        # Alerts are processed by several workers, check-and-set operations must be atomic
+        self._lock = Lock()
         self._plex = plex
         self._cache_file_path = self._get_cache_file_path()
+        self._store = self._open_store()
         self._last_refresh = datetime.fromtimestamp(0)
+        self._last_full_refresh = datetime.fromtimestamp(0)
         # Alerts cache
-        self.session_states = {}     # session_key: session_state
-        self.default_streams = {}    # item_key: (audio_stream_id, substitle_stream_id)
-        self.user_clients = {}       # client_identifier: user_id
-        self.newly_added = {}        # episode_id: added_at
-        self.newly_updated = {}      # episode_id: updated_at
-        self.recent_activities = {}  # (user_id, item_id): timestamp
+        self.session_states = TTLCache(max_size=1000, ttl=86400)     # session_key: session_state
+        self.default_streams = TTLCache(max_size=10000, ttl=86400)   # item_key: (audio_stream_id, substitle_stream_id)
+        self.newly_added = SQLiteDict(self._store, "newly_added", datetime.isoformat, isoparse)      # episode_id: added_at
+        self.newly_updated = SQLiteDict(self._store, "newly_updated", datetime.isoformat, isoparse)  # episode_id: updated_at
+        self.recent_activities = TTLCache(max_size=1000, ttl=3)      # (user_id, item_id): timestamp
+        self.reference_episodes = TTLCache(max_size=10000, ttl=3600)  # (user_id, show_id): episode_key
         # Users cache
-        self._instance_users = []
+        self._instance_users = UserRegistry()
         self._instance_user_tokens = {}
         self._instance_users_valid_until = datetime.fromtimestamp(0)
         # Library cache
-        self.episode_parts = {}
+        self.episode_parts = SQLiteDict(self._store, "episode_parts")  # episode_id: [part_key]
+        self.episode_sections = SQLiteDict(self._store, "episode_sections")  # episode_id: section_id
+        self._section_states = {}   # section_id: {"version": section_version, "last_refresh": isoformat}
+        self._scanned_sections = set()
+        # Track changes cache
+        self.selection_ledger = SelectionLedger(self._store)
+        self.language_preferences = PreferenceStore(self._store)
+        # Library index
+        self.section_types = {}                                        # section_id: section_type
+        self.item_types = TTLCache(max_size=100000, ttl=86400)          # item_key: item_type
+        self._section_types_refreshed_at = datetime.fromtimestamp(0)
+        self._rejected_items = 0
         # Initialization
         if not self._load():
             logger.info("Scanning all episodes from the Plex library, this action should only take a few seconds "
                         "but can take several minutes for larger libraries")
-            self.refresh_library_cache()
+            self.refresh_library_cache(full=True, fetch=False)
             logger.info(f"Scanned {len(self.episode_parts)} episodes from the library")
 
+    def get_stats(self):
+        return {
+            "session_states": self.session_states.stats,
+            "default_streams": self.default_streams.stats,
+            "recent_activities": self.recent_activities.stats,
+            "reference_episodes": self.reference_episodes.stats,
+            "item_types": self.item_types.stats,
+            "rejected_items": self._rejected_items,
+            "selection_ledger": self.selection_ledger.stats,
+            "language_preferences": self.language_preferences.stats
+        }
+
     def should_process_recently_added(self, episode_id: str, added_at: datetime):
-        if episode_id in self.newly_added and self.newly_added[episode_id] == added_at:
-            return False
-        self.newly_added[episode_id] = added_at
-        return True
+        with self._lock:
+            if self.newly_added.get(episode_id, None) == added_at:
+                return False
+            self.newly_added[episode_id] = added_at
+            return True
 
     def should_process_recently_updated(self, episode_id: str):
-        if episode_id in self.newly_updated and self.newly_updated[episode_id] >= self._last_refresh:
+        with self._lock:
+            updated_at = self.newly_updated.get(episode_id, None)
+            if updated_at is not None and updated_at >= self._last_refresh:
+                return False
+            self.newly_updated[episode_id] = datetime.now()
+            return True
+
+    def refresh_library_cache(self, full: bool = None, section_ids: Set[str] = None, fetch: bool = True):
+        # Without fetch, the cache is refreshed but the added and updated episodes are neither fetched nor returned
+        with self._lock:
+            if self._is_refreshing:
+                logger.debug("[Cache] The library cache is already being refreshed")
+                # The scanned sections are kept for the next refresh
+                if section_ids is not None:
+                    self._scanned_sections.update(str(section_id) for section_id in section_ids)
+                return [], []
+            self._is_refreshing = True
+        try:
+            # Explicit refreshes scan every section, otherwise sections whose content did not change are skipped
+            force = full is not None
+            if full is None:
+                full = self._should_full_refresh()
+            refresh_start = datetime.now()
+            self.refresh_section_types()
+            all_sections = self._plex.get_show_sections()
+            self._purge_removed_sections(all_sections)
+            sections = self._get_sections_to_refresh(all_sections, section_ids, force)
+            if len(sections) == 0:
+                logger.debug("[Cache] The content of the TV Show libraries did not change")
+                added, updated = [], []
+            elif full:
+                logger.debug(f"[Cache] Refreshing library cache ({len(sections)}/{len(all_sections)} sections)")
+                added, updated = self._full_refresh(sections, len(sections) == len(all_sections), fetch)
+            else:
+                logger.debug(f"[Cache] Incrementally refreshing library cache ({len(sections)}/{len(all_sections)} sections)")
+                added, updated = self._incremental_refresh(sections, fetch)
+            for section in sections:
+                self._section_states[str(section.key)] = {
+                    "version": self._plex.get_section_version(section),
+                    "last_refresh": refresh_start.isoformat()
+                }
+            logger.debug("[Cache] Done refreshing library cache")
+            if full and section_ids is None:
+                self._last_full_refresh = refresh_start
+            self._last_refresh = refresh_start
+            self.save()
+        finally:
+            self._is_refreshing = False
+        return added, updated
+
+    def mark_section_scanned(self, section_id: str):
+        with self._lock:
+            self._scanned_sections.add(str(section_id))
+
+    def pop_scanned_sections(self):
+        # Returns None when no scan has been reported, in which case all the sections should be considered
+        with self._lock:
+            scanned_sections = self._scanned_sections
+            self._scanned_sections = set()
+        return scanned_sections if len(scanned_sections) > 0 else None
+
+    def _purge_removed_sections(self, sections: List[ShowSection]):
+        # Episodes of sections that were deleted from Plex, or are no longer TV Show libraries, are dropped
+        section_ids = [str(section.key) for section in sections]
+        removed_keys = self.episode_sections.keys_with_values(section_ids, exclude=True)
+        if len(removed_keys) > 0:
+            logger.debug(f"[Cache] Removing {len(removed_keys)} episode(s) of deleted libraries")
+            self.episode_parts.delete_many(removed_keys)
+            self.episode_sections.delete_many(removed_keys)
+        for section_id in [s for s in self._section_states if s not in section_ids]:
+            del self._section_states[section_id]
+
+    def _get_sections_to_refresh(self, sections: List[ShowSection], section_ids: Set[str], force: bool):
+        if section_ids is not None:
+            sections = [s for s in sections if str(s.key) in section_ids]
+        if force:
+            return sections
+        return [s for s in sections
+                if self._section_states.get(str(s.key), {}).get("version", None) != self._plex.get_section_version(s)]
+
+    def is_episode_candidate(self, item_key: str, section_id: str = None):
+        # Items known not to be episodes are rejected without sending any request to Plex
+        if item_key in self.episode_parts:
+            return True
+        section_type = self.get_section_type(section_id)
+        item_type = self.item_types.get(item_key, None)
+        if (section_type is not None and section_type != "show") or (item_type is not None and item_type != "episode"):
+            self._rejected_items += 1
             return False
-        self.newly_updated[episode_id] = datetime.now()
         return True
 
-    def refresh_library_cache(self):
-        if self._is_refreshing:
-            logger.debug("[Cache] The library cache is already being refreshed")
+    def invalidate_reference_episode(self, user_id: Union[int, str], show_id: Union[int, str]):
+        self.reference_episodes.pop((str(user_id), str(show_id)), None)
+
+    def set_item_type(self, item_key: str, item_type: str):
+        self.item_types[item_key] = item_type
+
+    def get_section_type(self, section_id: str):
+        if section_id is None:
+            return None
+        section_id = str(section_id)
+        # Sections created since the last refresh are picked up, at most once per minute
+        if section_id not in self.section_types and datetime.now() - self._section_types_refreshed_at > timedelta(minutes=1):
+            self.refresh_section_types()
+        return self.section_types.get(section_id, None)
+
+    def refresh_section_types(self):
+        self.section_types = {str(section.key): section.type for section in self._plex.get_sections()}
+        self._section_types_refreshed_at = datetime.now()
+
+    @property
+    def _scan_workers(self):
+        return self._plex.config.get("library_cache.scan_workers")
+
+    def _should_full_refresh(self):
+        if not self._plex.config.get("library_cache.incremental_refresh"):
+            return True
+        full_refresh_interval = timedelta(hours=self._plex.config.get("library_cache.full_refresh_interval"))
+        return datetime.now() - self._last_full_refresh >= full_refresh_interval
+
+    def _full_refresh(self, sections: List[ShowSection], all_sections: bool, fetch: bool = True):
+        records = self._plex.scan_episodes(self._scan_workers, sections=sections)
+        # The scanned keys are kept in a temporary table, deleted episodes are then found with a single query
+        with self._store.temporary_keys("scanned_episodes") as scanned_table:
+            added, updated = self._diff_episode_records(records, fetch, "scanned_episodes")
+            # Only the episodes of the scanned sections can be detected as deleted
+            if all_sections:
+                deleted_keys = self.episode_parts.missing_keys(scanned_table)
+            else:
+                section_ids = [str(section.key) for section in sections]
+                deleted_keys = self.episode_parts.missing_keys(scanned_table, self.episode_sections, section_ids)
+        self.episode_parts.delete_many(deleted_keys)
+        self.episode_sections.delete_many(deleted_keys)
+        if not fetch:
+            return [], []
+        return self._fetch_episodes(added), self._fetch_episodes(updated)
+
+    def _incremental_refresh(self, sections: List[ShowSection], fetch: bool = True):
+        last_refreshes = [self._section_states.get(str(s.key), {}).get("last_refresh", None) for s in sections]
+        last_refresh = min(isoparse(r) if r is not None else self._last_refresh for r in last_refreshes)
+        # Look slightly before the last refresh to absorb clock differences with the Plex server
+        since = last_refresh - timedelta(minutes=5)
+        records = self._plex.get_episodes_changed_since(since, self._scan_workers, sections=sections)
+        added, updated = self._diff_episode_records(records, fetch)
+        if not fetch:
             return [], []
-        self._is_refreshing = True
-        logger.debug("[Cache] Refreshing library cache")
+        return self._fetch_episodes(added), self._fetch_episodes(updated)
+
+    def _diff_episode_records(self, records: Iterable[EpisodeRecord], collect: bool = True, scanned_table: str = None,
+                              page_size: int = 1000):
+        # Records are compared page by page against the cached rows of the same page
         added = []
         updated = []
-        new_episode_parts = {}
-        for episode in self._plex.episodes():
-            part_list = new_episode_parts.setdefault(episode.key, [])
-            for part in episode.iterParts():
-                part_list.append(part.key)
-            if episode.key in self.episode_parts and set(self.episode_parts[episode.key]) != set(part_list):
-                updated.append(episode)
-            elif episode.key not in self.episode_parts:
-                added.append(episode)
-        self.episode_parts = new_episode_parts
-        logger.debug("[Cache] Done refreshing library cache")
-        self._last_refresh = datetime.now()
-        self.save()
-        self._is_refreshing = False
+        records = iter(records)
+        while True:
+            page = list(itertools.islice(records, page_size))
+            if len(page) == 0:
+                break
+            keys = [record.key for record in page]
+            cached_episode_parts = self.episode_parts.get_many(keys)
+            cached_episode_sections = self.episode_sections.get_many(keys)
+            changed_episode_parts = {}
+            changed_episode_sections = {}
+            for record in page:
+                part_list = list(record.part_keys)
+                cached_part_list = cached_episode_parts.get(record.key, None)
+                if cached_part_list is None or set(cached_part_list) != set(part_list):
+                    changed_episode_parts[record.key] = part_list
+                    if collect:
+                        (added if cached_part_list is None else updated).append(record.key)
+                if record.section_id is not None and cached_episode_sections.get(record.key, None) != record.section_id:
+                    changed_episode_sections[record.key] = record.section_id
+            with self._store.transaction():
+                self.episode_parts.update(changed_episode_parts)
+                self.episode_sections.update(changed_episode_sections)
+                if scanned_table is not None:
+                    self._store.add_temporary_keys(scanned_table, keys)
         return added, updated
 
+    def _fetch_episodes(self, keys: List[str]):
+        if len(keys) == 0:
+            return []
+        return [item for item in self._plex.fetch_items(keys) if isinstance(item, Episode)]
+
     def get_instance_users(self, check_validity=True):
+        registry = self.get_instance_user_registry(check_validity)
+        return registry.users if registry is not None else None
+
+    def get_instance_user_registry(self, check_validity=True):
         if check_validity and datetime.now() > self._instance_users_valid_until:
             return None
-        return copy.deepcopy(self._instance_users)
+        return self._instance_users
 
     def set_instance_users(self, instance_users):
-        self._instance_users = copy.deepcopy(instance_users)
-        self._instance_users_valid_until = datetime.now() + timedelta(hours=12)
-        for user in self._instance_users:
+        registry = UserRegistry(instance_users)
+        for user in registry:
             if str(user.id) in self._instance_user_tokens:
                 continue
             self._instance_user_tokens[str(user.id)] = user.get_token(self._plex.unique_id)
+        # The registry is swapped in a single assignment so that readers always see a consistent snapshot
+        self._instance_users = registry
+        self._instance_users_valid_until = datetime.now() + timedelta(hours=12)
 
     def get_instance_user_token(self, user_id):
         return self._instance_user_tokens.get(str(user_id), None)
@@ -106,33 +302,34 @@ class PlexServerCache():
             os.makedirs(cache_dir)
         return os.path.join(cache_dir, self._plex.unique_id)
 
+    def _open_store(self):
+        try:
+            return SQLiteStore(self._cache_file_path)
+        except sqlite3.DatabaseError:
+            logger.warning("[Cache] The cache is corrupted or uses an outdated format, clearing the cache before trying again")
+            for suffix in ["", "-wal", "-shm"]:
+                if os.path.isfile(self._cache_file_path + suffix):
+                    os.remove(self._cache_file_path + suffix)
+            return SQLiteStore(self._cache_file_path)
+
     def _load(self):
-        if not os.path.exists(self._cache_file_path) or not os.path.isfile(self._cache_file_path):
+        last_refresh = self._store.get_value("last_refresh")
+        if last_refresh is None:
             return False
         logger.debug("[Cache] Loading server cache from file")
-        try:
-            with open(self._cache_file_path, "r", encoding="utf-8") as stream:
-                cache = json.load(stream)
-        except json.JSONDecodeError:
-            logger.warning("[Cache] The cache is corrupted, clearing the cache before trying again")
-            if os.path.exists(self._cache_file_path) and os.path.isfile(self._cache_file_path):
-                os.remove(self._cache_file_path)
-            return False
-        self.newly_updated = cache.get("newly_updated", self.newly_updated)
-        self.newly_updated = {key: isoparse(value) for key, value in self.newly_updated.items()}
-        self.newly_added = cache.get("newly_added", self.newly_added)
-        self.newly_added = {key: isoparse(value) for key, value in self.newly_added.items()}
-        self.episode_parts = cache.get("episode_parts", )
-        self._last_refresh = isoparse(cache.get("last_refresh", self._last_refresh))
+        self._last_refresh = isoparse(last_refresh)
+        last_full_refresh = self._store.get_value("last_full_refresh")
+        if last_full_refresh is not None:
+            self._last_full_refresh = isoparse(last_full_refresh)
+        self._section_states = self._store.get_value("section_states", {})
         return True
 
     def save(self):
         logger.debug("[Cache] Saving server cache to file")
-        cache = {
-            "newly_updated": self.newly_updated,
-            "newly_added": self.newly_added,
-            "episode_parts": self.episode_parts,
-            "last_refresh": self._last_refresh
-        }
-        with open(self._cache_file_path, "w", encoding="utf-8") as stream:
-            stream.write(self._encoder.encode(cache))
+        with self._store.transaction():
+            self._store.set_value("last_refresh", self._last_refresh.isoformat())
+            self._store.set_value("last_full_refresh", self._last_full_refresh.isoformat())
+            self._store.set_value("section_states", self._section_states)
+
+    def close(self):
+        self._store.close()
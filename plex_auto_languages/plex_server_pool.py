@@ -0,0 +1,68 @@
+from __future__ import annotations
+import time
+from threading import RLock
+from typing import TYPE_CHECKING, Callable, Union
+from plexapi.exceptions import Unauthorized
+
+from plex_auto_languages.utils.logger import get_logger
+from plex_auto_languages.utils.ttl_cache import TTLCache
+
+if TYPE_CHECKING:
+    from plex_auto_languages.plex_server import UnprivilegedPlexServer
+
+
+logger = get_logger()
+
+
+class PlexServerPool():
+
+    def __init__(self, factory: Callable[[str], UnprivilegedPlexServer], max_size: int = 200, idle_ttl: float = 3600,
+                 validation_interval: float = 600):
+        self._factory = factory
+        self._validation_interval = validation_interval
+        self._servers = TTLCache(max_size=max_size, ttl=idle_ttl)  # (user_id, token): (server, validated_at)
+        self._lock = RLock()
+
+    @property
+    def stats(self):
+        return self._servers.stats
+
+    def get(self, user_id: Union[int, str], token: str):
+        # Returns None when the Plex server cannot be reached, raises Unauthorized when the token has been revoked
+        key = (str(user_id), token)
+        with self._lock:
+            entry = self._servers.get(key, None)
+        if entry is not None:
+            server, validated_at = entry
+            # The connection is only checked again once the validation interval has elapsed
+            if not server.unauthorized and time.monotonic() - validated_at >= self._validation_interval:
+                if not server.connected and not server.unauthorized:
+                    # Connection failures are transient, the connection is kept and checked again on the next call
+                    logger.debug(f"[Pool] Unable to reach the Plex server with the connection of user {user_id}")
+                    return None
+                validated_at = time.monotonic()
+            if server.unauthorized:
+                logger.debug(f"[Pool] Dropping the Plex connection of user {user_id}")
+                self.invalidate(user_id)
+                raise Unauthorized(f"The token of user {user_id} is not authorized anymore")
+            # Storing the entry again resets its idle timer
+            with self._lock:
+                self._servers[key] = (server, validated_at)
+            return server
+        server = self._factory(token)
+        if not server.connected:
+            if server.unauthorized:
+                raise Unauthorized(f"The token of user {user_id} is not authorized")
+            return None
+        with self._lock:
+            self._servers[key] = (server, time.monotonic())
+        return server
+
+    def invalidate(self, user_id: Union[int, str]):
+        with self._lock:
+            for key in [k for k in self._servers if k[0] == str(user_id)]:
+                self._servers.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._servers.clear()
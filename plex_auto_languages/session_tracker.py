@@ -0,0 +1,82 @@
+from __future__ import annotations
+from threading import RLock
+from typing import TYPE_CHECKING
+
+from plex_auto_languages.utils.logger import get_logger
+from plex_auto_languages.utils.ttl_cache import TTLCache
+
+if TYPE_CHECKING:
+    from plex_auto_languages.plex_server import PlexServer
+
+
+logger = get_logger()
+
+
+class SessionTracker():
+
+    def __init__(self, plex: PlexServer, ttl: float = 21600, unknown_client_ttl: float = 10):
+        self._plex = plex
+        self._clients = TTLCache(max_size=1000, ttl=ttl)                         # client_identifier: (user_id, username)
+        self._sessions = TTLCache(max_size=1000, ttl=ttl)                        # session_key: (user_id, username, item_key)
+        self._unknown_clients = TTLCache(max_size=1000, ttl=unknown_client_ttl)  # (client_identifier, session_key): True
+        self._refresh_count = 0
+        self._lock = RLock()
+
+    @property
+    def stats(self):
+        return {
+            "clients": self._clients.stats,
+            "sessions": self._sessions.stats,
+            "refresh_count": self._refresh_count
+        }
+
+    def get_user(self, client_identifier: str, session_key: str = None):
+        user = self._get_cached_user(client_identifier, session_key)
+        if user is not None:
+            return user
+        with self._lock:
+            # Another thread may have refreshed the sessions in the meantime
+            user = self._get_cached_user(client_identifier, session_key)
+            if user is not None:
+                return user
+            unknown_key = (client_identifier, str(session_key) if session_key is not None else None)
+            if unknown_key in self._unknown_clients:
+                return (None, None)
+            self.refresh()
+            user = self._get_cached_user(client_identifier, session_key)
+            if user is None:
+                self._unknown_clients[unknown_key] = True
+                return (None, None)
+            return user
+
+    def get_session(self, session_key: str):
+        return self._sessions.get(str(session_key), None)
+
+    def track(self, client_identifier: str, session_key: str, user_id: str, username: str, item_key: str):
+        self._clients[client_identifier] = (user_id, username)
+        if session_key is not None:
+            self._sessions[str(session_key)] = (user_id, username, item_key)
+
+    def refresh(self):
+        logger.debug("[Sessions] Refreshing the list of active sessions")
+        self._refresh_count += 1
+        for session in self._plex.get_sessions():
+            for player in session.players:
+                user = self._plex.get_user_by_id(player.userID)
+                if user is None:
+                    continue
+                self.track(player.machineIdentifier, session.sessionKey, user.id, user.name, session.key)
+                self._unknown_clients.pop((player.machineIdentifier, None), None)
+                self._unknown_clients.pop((player.machineIdentifier, str(session.sessionKey)), None)
+
+    def clear(self):
+        self._clients.clear()
+        self._sessions.clear()
+        self._unknown_clients.clear()
+
+    def _get_cached_user(self, client_identifier: str, session_key: str):
+        # A device can be shared by several users, a new session must not be attributed to the previous user
+        if session_key is not None:
+            session = self.get_session(session_key)
+            return (session[0], session[1]) if session is not None else None
+        return self._clients.get(client_identifier, None)
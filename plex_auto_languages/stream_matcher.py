@@ -0,0 +1,115 @@
+from typing import List, Optional
+from plexapi.media import AudioStream, SubtitleStream
+
+
+class StreamMatcher():
+
+    def __init__(self, audio_stream: Optional[AudioStream], subtitle_stream: Optional[SubtitleStream]):
+        self._audio_stream = audio_stream
+        self._subtitle_stream = subtitle_stream
+        # Decisions only depend on the fields of the fingerprint, they are memoized for the lifetime of the matcher
+        self._audio_decisions = {}
+        self._subtitle_decisions = {}
+        self._hits = 0
+        self._misses = 0
+
+    @property
+    def audio_stream(self):
+        return self._audio_stream
+
+    @property
+    def subtitle_stream(self):
+        return self._subtitle_stream
+
+    @property
+    def stats(self):
+        return {
+            "layouts": len(self._audio_decisions) + len(self._subtitle_decisions),
+            "hits": self._hits,
+            "misses": self._misses
+        }
+
+    def match_audio_stream(self, audio_streams: List[AudioStream]):
+        # Returns the index of the matching stream in the given list, or None
+        if self._audio_stream is None:
+            return None
+        fingerprint = self.get_audio_fingerprint(audio_streams)
+        if fingerprint in self._audio_decisions:
+            self._hits += 1
+            return self._audio_decisions[fingerprint]
+        self._misses += 1
+        decision = self._score_audio_streams(fingerprint)
+        self._audio_decisions[fingerprint] = decision
+        return decision
+
+    def match_subtitle_stream(self, subtitle_streams: List[SubtitleStream]):
+        # Returns the index of the matching stream in the given list, or None
+        if self._subtitle_stream is None and self._audio_stream is None:
+            return None
+        fingerprint = self.get_subtitle_fingerprint(subtitle_streams)
+        if fingerprint in self._subtitle_decisions:
+            self._hits += 1
+            return self._subtitle_decisions[fingerprint]
+        self._misses += 1
+        decision = self._score_subtitle_streams(fingerprint)
+        self._subtitle_decisions[fingerprint] = decision
+        return decision
+
+    @staticmethod
+    def get_audio_fingerprint(audio_streams: List[AudioStream]):
+        return tuple((s.languageCode, s.codec, s.audioChannelLayout, s.channels, s.title) for s in audio_streams)
+
+    @staticmethod
+    def get_subtitle_fingerprint(subtitle_streams: List[SubtitleStream]):
+        return tuple((s.languageCode, s.forced, s.codec, s.title) for s in subtitle_streams)
+
+    def _score_audio_streams(self, fingerprint: tuple):
+        reference = self._audio_stream
+        # We only want stream with the same language code
+        candidates = [index for index, (language_code, _, _, _, _) in enumerate(fingerprint)
+                      if language_code == reference.languageCode]
+        if len(candidates) == 0:
+            return None
+        if len(candidates) == 1:
+            return candidates[0]
+        # If multiple streams match, order them based on a score
+        scores = [0] * len(candidates)
+        for position, index in enumerate(candidates):
+            _, codec, audio_channel_layout, channels, title = fingerprint[index]
+            if reference.codec == codec:
+                scores[position] += 5
+            if reference.audioChannelLayout == audio_channel_layout:
+                scores[position] += 3
+            if reference.channels <= channels:
+                scores[position] += 1
+            if reference.title is not None and title is not None and reference.title == title:
+                scores[position] += 5
+        return candidates[scores.index(max(scores))]
+
+    def _score_subtitle_streams(self, fingerprint: tuple):
+        reference = self._subtitle_stream
+        # If no subtitle is selected, only forced subtitles in the language of the audio stream are matched
+        if reference is None:
+            match_forced_only = True
+            language_code = self._audio_stream.languageCode
+        else:
+            match_forced_only = reference.forced
+            language_code = reference.languageCode
+        # We only want stream with the same language code
+        candidates = [index for index, (stream_language_code, forced, _, _) in enumerate(fingerprint)
+                      if stream_language_code == language_code and (forced or not match_forced_only)]
+        if len(candidates) == 0:
+            return None
+        if len(candidates) == 1 or match_forced_only:
+            return candidates[0]
+        # If multiple streams match, order them based on a score
+        scores = [0] * len(candidates)
+        for position, index in enumerate(candidates):
+            _, forced, codec, title = fingerprint[index]
+            if reference.forced == forced:
+                scores[position] += 3
+            if reference.codec is not None and codec is not None and reference.codec == codec:
+                scores[position] += 1
+            if reference.title is not None and title is not None and reference.title == title:
+                scores[position] += 5
+        return candidates[scores.index(max(scores))]
@@ -1,22 +1,48 @@
-from typing import List, Union
+from __future__ import annotations
+import json
+import hashlib
+from typing import TYPE_CHECKING, List, Union
+from threading import Lock
+from urllib.parse import urlencode
+from concurrent.futures import ThreadPoolExecutor
 from plexapi.video import Episode
 from plexapi.media import AudioStream, SubtitleStream, MediaPart
 
 from plex_auto_languages.utils.logger import get_logger
+from plex_auto_languages.utils.rate_limiter import TokenBucket
+from plex_auto_languages.utils.selection_ledger import SelectionLedger
+from plex_auto_languages.utils.preference_store import LanguagePreference
+from plex_auto_languages.stream_matcher import StreamMatcher
 from plex_auto_languages.constants import EventType
 
+if TYPE_CHECKING:
+    from plex_auto_languages.plex_server import UnprivilegedPlexServer
+
 
 logger = get_logger()
 
 
 class TrackChanges():
 
-    def __init__(self, username: str, reference: Episode, event_type: EventType):
+    def __init__(self, username: str, reference: Episode, event_type: EventType, user_id: Union[int, str] = None,
+                 ledger: SelectionLedger = None, preference: LanguagePreference = None):
         self._reference = reference
         self._username = username
         self._event_type = event_type
-        self._audio_stream, self._subtitle_stream = self._get_selected_streams(reference)
+        self._user_id = user_id
+        self._ledger = ledger if user_id is not None else None
+        # A stored preference replaces the streams selected on the reference episode, which then only names the show
+        self._from_preference = preference is not None
+        if preference is not None:
+            self._audio_stream, self._subtitle_stream = preference
+        else:
+            self._audio_stream, self._subtitle_stream = self._get_selected_streams(reference)
+        self._matcher = None
         self._changes = []
+        self._failed_changes = []
+        self._matching_selections = []
+        self._skipped_episode_count = 0
+        self._episodes = []
         self._description = ""
         self._title = ""
         self._computed = False
@@ -47,7 +73,8 @@ class TrackChanges():
 
     @property
     def has_changes(self):
-        return len(self._changes) > 0
+        # Changes that failed to be applied are not reported
+        return len(self._changes) > len(self._failed_changes)
 
     @property
     def username(self):
@@ -57,7 +84,44 @@ class TrackChanges():
     def change_count(self):
         return len(self._changes)
 
+    @property
+    def failed_change_count(self):
+        return len(self._failed_changes)
+
+    @property
+    def audio_stream(self):
+        return self._audio_stream
+
+    @property
+    def subtitle_stream(self):
+        return self._subtitle_stream
+
+    @property
+    def skipped_episode_count(self):
+        return self._skipped_episode_count
+
+    @property
+    def signature(self):
+        # Identifies the reference selection, parts updated from the same signature end up with the same streams
+        audio, subtitle = self._audio_stream, self._subtitle_stream
+        fields = [
+            [audio.languageCode, audio.codec, audio.audioChannelLayout, audio.channels, audio.title] if audio else None,
+            [subtitle.languageCode, subtitle.forced, subtitle.codec, subtitle.title] if subtitle else None
+        ]
+        return hashlib.sha1(json.dumps(fields, default=str).encode("utf-8")).hexdigest()[:16]
+
     def get_episodes_to_update(self, update_level: str, update_strategy: str):
+        if update_level == "show" and update_strategy == "next" and self._reference.seasonNumber is not None:
+            # The episodes of the seasons from the reference season are listed through the library section in a single
+            # query, the show and the episodes before the reference are still checked locally in case Plex ignores
+            # one of the filters
+            query = urlencode({"type": 4, "show.id": self._reference.grandparentRatingKey,
+                               "season.index>>": self._reference.seasonNumber - 1})
+            episodes = self._reference.fetchItems(f"/library/sections/{self._reference.librarySectionID}/all?{query}",
+                                                  Episode)
+            episodes = [e for e in episodes if str(e.grandparentRatingKey) == str(self._reference.grandparentRatingKey)
+                        and self._is_episode_after(e)]
+            return sorted(episodes, key=lambda e: (e.seasonNumber, e.episodeNumber))
         show_or_season = None
         if update_level == "show":
             show_or_season = self._reference.show()
@@ -68,13 +132,22 @@ class TrackChanges():
             episodes = [e for e in episodes if self._is_episode_after(e)]
         return episodes
 
-    def compute(self, episodes: List[Episode]):
+    def compute(self, episodes: List[Episode], server: UnprivilegedPlexServer = None, batch_size: int = 100):
+        # Episodes are reloaded with their streams through the server of the user, or used as given without server
+        based_on = "the stored preference" if self._from_preference else f"episode {self._reference}"
         logger.debug(f"[Language Update] Checking language update for show "
-                     f"{self._reference.show()} and user '{self._username}' based on episode {self._reference}")
+                     f"{self._reference.show()} and user '{self._username}' based on {based_on}")
         self._changes = []
-        for episode in episodes:
-            episode.reload()
+        self._matching_selections = []
+        signature = self.signature
+        # Episodes whose parts already carry the selection of this reference are neither reloaded nor updated
+        to_check = [e for e in episodes if not self._is_episode_up_to_date(e, signature)]
+        self._skipped_episode_count = len(episodes) - len(to_check)
+        if server is not None and len(to_check) > 0:
+            to_check = self._reload_episodes(server, to_check, batch_size)
+        for episode in to_check:
             for part in episode.iterParts():
+                change_count = len(self._changes)
                 current_audio_stream, current_subtitle_stream = self._get_selected_streams(part)
                 # Audio stream
                 matching_audio_stream = self._match_audio_stream(part.audioStreams())
@@ -88,24 +161,103 @@ class TrackChanges():
                 if matching_subtitle_stream is not None and \
                         (current_subtitle_stream is None or matching_subtitle_stream.id != current_subtitle_stream.id):
                     self._changes.append((episode, part, SubtitleStream.STREAMTYPE, matching_subtitle_stream))
+                if len(self._changes) == change_count:
+                    self._matching_selections.append(self._get_selection(episode, part, signature))
+        if self._ledger is not None:
+            self._ledger.record_many(self._matching_selections)
+        self._episodes = episodes
         self._update_description(episodes)
         self._computed = True
 
-    def apply(self):
+    def apply(self, max_workers: int = 1, rate_limiter: TokenBucket = None):
+        self._failed_changes = []
         if not self.has_changes:
             logger.debug(f"[Language Update] No changes to perform for show "
                          f"{self._reference.show()} and user '{self.username}'")
             return
         logger.debug(f"[Language Update] Performing {len(self._changes)} change(s) for show {self._reference.show()}")
-        for episode, part, stream_type, new_stream in self._changes:
+        with ThreadPoolExecutor(max_workers=max(max_workers, 1)) as executor:
+            errors = list(executor.map(lambda change: self._apply_change(change, rate_limiter), self._changes))
+        for change, error in zip(self._changes, errors):
+            if error is None:
+                continue
+            episode, _, stream_type, new_stream = change
             stream_type_name = "audio" if stream_type == AudioStream.STREAMTYPE else "subtitle"
-            logger.debug(f"[Language Update] Updating {stream_type_name} stream of episode {episode} to {new_stream}")
+            logger.error(f"[Language Update] Unable to update {stream_type_name} stream of episode {episode} "
+                         f"to {new_stream}: {error}")
+            self._failed_changes.append(change)
+        if len(self._failed_changes) > 0:
+            self._update_description(self._episodes)
+        if self._ledger is not None:
+            signature = self.signature
+            failed_parts = set(part.id for _, part, _, _ in self._failed_changes)
+            selections = {part.id: self._get_selection(episode, part, signature, self._changes)
+                          for episode, part, _, _ in self._changes if part.id not in failed_parts}
+            self._ledger.record_many(selections.values())
+
+    def record_reference(self):
+        # The streams selected on the reference are the selection of this reference for its own parts
+        if self._ledger is None or self._from_preference:
+            return
+        signature = self.signature
+        self._ledger.record_many([self._get_selection(self._reference, part, signature)
+                                  for part in self._reference.iterParts()])
+
+    def _is_episode_up_to_date(self, episode: Episode, signature: str):
+        if self._ledger is None:
+            return False
+        parts = list(episode.iterParts())
+        return len(parts) > 0 and all(
+            self._ledger.matches(self._user_id, part.id, signature, episode.updatedAt, self._get_selected_stream_ids(part))
+            for part in parts
+        )
+
+    def _get_selected_stream_ids(self, part: MediaPart):
+        # Episodes listed without their details have no streams, the selection of their parts is then unknown
+        if len(part.audioStreams()) == 0:
+            return None
+        audio_stream, subtitle_stream = self._get_selected_streams(part)
+        return (audio_stream.id if audio_stream is not None else None,
+                subtitle_stream.id if subtitle_stream is not None else None)
+
+    def _get_selection(self, episode: Episode, part: MediaPart, signature: str, changes: list = ()):
+        audio_stream, subtitle_stream = self._get_selected_streams(part)
+        audio_stream_id = audio_stream.id if audio_stream is not None else None
+        subtitle_stream_id = subtitle_stream.id if subtitle_stream is not None else None
+        # Pending changes take precedence over the streams selected when the part was fetched
+        for _, changed_part, stream_type, new_stream in changes:
+            if changed_part.id != part.id:
+                continue
+            if stream_type == AudioStream.STREAMTYPE:
+                audio_stream_id = new_stream.id
+            else:
+                subtitle_stream_id = new_stream.id if new_stream is not None else None
+        return (self._user_id, part.id, signature, audio_stream_id, subtitle_stream_id, episode.updatedAt)
+
+    @staticmethod
+    def _apply_change(change: tuple, rate_limiter: TokenBucket = None):
+        episode, part, stream_type, new_stream = change
+        stream_type_name = "audio" if stream_type == AudioStream.STREAMTYPE else "subtitle"
+        if rate_limiter is not None:
+            rate_limiter.acquire()
+        logger.debug(f"[Language Update] Updating {stream_type_name} stream of episode {episode} to {new_stream}")
+        try:
             if stream_type == AudioStream.STREAMTYPE:
                 part.setDefaultAudioStream(new_stream)
             elif stream_type == SubtitleStream.STREAMTYPE and new_stream is None:
                 part.resetDefaultSubtitleStream()
             elif stream_type == SubtitleStream.STREAMTYPE:
                 part.setDefaultSubtitleStream(new_stream)
+        except Exception as e:
+            return e
+        return None
+
+    @staticmethod
+    def _reload_episodes(server: UnprivilegedPlexServer, episodes: List[Episode], batch_size: int):
+        # Stream details are fetched with comma-separated keys instead of reloading the episodes one by one
+        fetched = {item.key: item for item in server.fetch_items([episode.key for episode in episodes], max(batch_size, 1))}
+        # Episodes deleted in the meantime are not returned by Plex
+        return [fetched[episode.key] for episode in episodes if episode.key in fetched]
 
     def _is_episode_after(self, episode: Episode):
         return self._reference.seasonNumber < episode.seasonNumber or \
@@ -123,7 +275,9 @@ class TrackChanges():
         from_str = f"S{min_season_number:02}E{min_episode_number:02}"
         to_str = f"S{max_season_number:02}E{max_episode_number:02}"
         range_str = f"{from_str} - {to_str}" if from_str != to_str else from_str
-        nb_updated = len({e.key for e, _, _, _ in self._changes})
+        failed_changes = set(id(change) for change in self._failed_changes)
+        nb_updated = len({e.key for e, _, _, _ in [c for c in self._changes if id(c) not in failed_changes]})
+        nb_failed = len({e.key for e, _, _, _ in self._failed_changes})
         nb_total = len(episodes)
         self._title = self._reference.show().title
         self._description = (
@@ -133,60 +287,28 @@ class TrackChanges():
             f"Subtitles: {self._subtitle_stream.displayTitle if self._subtitle_stream is not None else 'None'}\n"
             f"Updated episodes: {nb_updated}/{nb_total} ({range_str})"
         )
+        if nb_failed > 0:
+            self._description += f"\nFailed episodes: {nb_failed}/{nb_total}"
+
+    def share_matcher(self, matcher: StreamMatcher):
+        # Users whose references share the same signature reuse the decisions of a single matcher
+        self._audio_stream, self._subtitle_stream = matcher.audio_stream, matcher.subtitle_stream
+        self._matcher = matcher
+
+    def _get_matcher(self):
+        # The matcher is compiled once per reference selection
+        if self._matcher is None or self._matcher.audio_stream is not self._audio_stream or \
+                self._matcher.subtitle_stream is not self._subtitle_stream:
+            self._matcher = StreamMatcher(self._audio_stream, self._subtitle_stream)
+        return self._matcher
 
     def _match_audio_stream(self, audio_streams: List[AudioStream]):
-        # The reference stream can be 'None'
-        if self._audio_stream is None:
-            return None
-        # We only want stream with the same language code
-        streams = [s for s in audio_streams if s.languageCode == self._audio_stream.languageCode]
-        if len(streams) == 0:
-            return None
-        if len(streams) == 1:
-            return streams[0]
-        # If multiple streams match, order them based on a score
-        scores = [0] * len(streams)
-        for index, stream in enumerate(streams):
-            if self._audio_stream.codec == stream.codec:
-                scores[index] += 5
-            if self._audio_stream.audioChannelLayout == stream.audioChannelLayout:
-                scores[index] += 3
-            if self._audio_stream.channels <= stream.channels:
-                scores[index] += 1
-            if self._audio_stream.title is not None and stream.title is not None and self._audio_stream.title == stream.title:
-                scores[index] += 5
-        return streams[scores.index(max(scores))]
+        index = self._get_matcher().match_audio_stream(audio_streams)
+        return audio_streams[index] if index is not None else None
 
     def _match_subtitle_stream(self, subtitle_streams: List[SubtitleStream]):
-        # If no subtitle is selected, the reference stream can be 'None'
-        if self._subtitle_stream is None:
-            if self._audio_stream is None:
-                return None
-            match_forced_only = True
-            language_code = self._audio_stream.languageCode
-        else:
-            match_forced_only = self._subtitle_stream.forced
-            language_code = self._subtitle_stream.languageCode
-        # We only want stream with the same language code
-        streams = [s for s in subtitle_streams if s.languageCode == language_code]
-        if match_forced_only:
-            streams = [s for s in streams if s.forced]
-        if len(streams) == 0:
-            return None
-        if len(streams) == 1 or match_forced_only:
-            return streams[0]
-        # If multiple streams match, order them based on a score
-        scores = [0] * len(streams)
-        for index, stream in enumerate(streams):
-            if self._subtitle_stream.forced == stream.forced:
-                scores[index] += 3
-            if self._subtitle_stream.codec is not None and stream.codec is not None and \
-                    self._subtitle_stream.codec == stream.codec:
-                scores[index] += 1
-            if self._subtitle_stream.title is not None and stream.title is not None and \
-                    self._subtitle_stream.title == stream.title:
-                scores[index] += 5
-        return streams[scores.index(max(scores))]
+        index = self._get_matcher().match_subtitle_stream(subtitle_streams)
+        return subtitle_streams[index] if index is not None else None
 
     @staticmethod
     def _get_selected_streams(episode: Union[Episode, MediaPart]):
@@ -197,11 +319,17 @@ class TrackChanges():
 
 class NewOrUpdatedTrackChanges():
 
-    def __init__(self, event_type: EventType, new: bool):
+    def __init__(self, event_type: EventType, new: bool, max_workers: int = 1, rate_limiter: TokenBucket = None,
+                 ledger: SelectionLedger = None):
         self._episode = None
+        self._lock = Lock()
+        self._ledger = ledger
+        self._max_workers = max_workers
+        self._rate_limiter = rate_limiter
         self._event_type = event_type
         self._new = new
         self._track_changes = []
+        self._matchers = {}  # signature: StreamMatcher
         self._description = ""
         self._title = ""
 
@@ -231,13 +359,28 @@ class NewOrUpdatedTrackChanges():
     def has_changes(self):
         return sum([1 for tc in self._track_changes if tc.has_changes]) > 0
 
-    def change_track_for_user(self, username: str, reference: Episode, episode: Episode):
-        self._episode = episode
-        track_changes = TrackChanges(username, reference, self._event_type)
-        track_changes.compute([episode])
-        track_changes.apply()
-        self._track_changes.append(track_changes)
-        self._update_description()
+    @property
+    def group_count(self):
+        return len(self._matchers)
+
+    def change_track_for_user(self, username: str, reference: Episode, episode: Episode, user_id: Union[int, str] = None,
+                              preference: LanguagePreference = None, server: UnprivilegedPlexServer = None):
+        track_changes = TrackChanges(username, reference if preference is None else episode, self._event_type, user_id,
+                                     self._ledger, preference)
+        # Users are grouped by signature, the matching streams are only computed once per group and layout
+        with self._lock:
+            matcher = self._matchers.get(track_changes.signature, None)
+            if matcher is None:
+                matcher = StreamMatcher(track_changes.audio_stream, track_changes.subtitle_stream)
+                self._matchers[track_changes.signature] = matcher
+        track_changes.share_matcher(matcher)
+        track_changes.compute([episode], server)
+        track_changes.apply(self._max_workers, self._rate_limiter)
+        # Users can be processed concurrently
+        with self._lock:
+            self._episode = episode
+            self._track_changes.append(track_changes)
+            self._update_description()
 
     def _update_description(self):
         if len(self._track_changes) == 0:
@@ -247,8 +390,11 @@ class NewOrUpdatedTrackChanges():
             return
         event_str = "New" if self._new else "Updated"
         self._title = f"{event_str}: {self.episode_name}"
+        # Users whose changes failed to be applied are reported separately
+        failed_usernames = sorted({tc.username for tc in self._track_changes if tc.failed_change_count > 0})
+        users_str = f"all users except {', '.join(failed_usernames)}" if len(failed_usernames) > 0 else "all users"
         self._description = (
             f"Episode: {self.episode_name}\n"
             f"Status: {event_str} episode\n"
-            f"Updated for all users"
+            f"Updated for {users_str}"
         )
@@ -0,0 +1,66 @@
+from typing import Callable, Hashable, List
+from threading import Lock, Timer
+
+from plex_auto_languages.utils.logger import get_logger
+
+
+logger = get_logger()
+
+
+class Coalescer():
+
+    def __init__(self, window: float, callback: Callable[[List[Hashable]], None]):
+        self._window = window
+        self._callback = callback
+        self._pending = {}  # Insertion ordered set of the keys waiting to be flushed
+        self._timer = None
+        self._lock = Lock()
+        self._flush_count = 0
+        self._key_count = 0
+
+    @property
+    def stats(self):
+        with self._lock:
+            return {
+                "pending": len(self._pending),
+                "flushes": self._flush_count,
+                "keys": self._key_count
+            }
+
+    def add(self, key: Hashable):
+        if self._window <= 0:
+            self._run([key])
+            return
+        with self._lock:
+            self._pending[key] = None
+            # The window starts with the first key, later keys are flushed along with it
+            if self._timer is None:
+                self._timer = Timer(self._window, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+
+    def flush(self):
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+            self._timer = None
+            keys = list(self._pending)
+            self._pending = {}
+        if len(keys) > 0:
+            self._run(keys)
+
+    def cancel(self):
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+            self._timer = None
+            self._pending = {}
+
+    def _run(self, keys: List[Hashable]):
+        with self._lock:
+            self._flush_count += 1
+            self._key_count += len(keys)
+        try:
+            self._callback(keys)
+        except Exception:
+            logger.exception("Unable to process a batch of coalesced items")
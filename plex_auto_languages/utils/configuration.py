@@ -126,6 +126,46 @@ class Configuration():
         if not isinstance(self.get("ignore_labels"), list):
             logger.error("The 'ignore_labels' parameter must be a list or a string-based comma separated list")
             raise InvalidConfiguration
+        if not isinstance(self.get("library_cache.full_refresh_interval"), int) or \
+                self.get("library_cache.full_refresh_interval") < 0:
+            logger.error("The 'library_cache.full_refresh_interval' parameter must be a positive integer")
+            raise InvalidConfiguration
+        if not isinstance(self.get("library_cache.scan_workers"), int) or self.get("library_cache.scan_workers") < 1:
+            logger.error("The 'library_cache.scan_workers' parameter must be a strictly positive integer")
+            raise InvalidConfiguration
+        if not isinstance(self.get("alerts.workers"), int) or self.get("alerts.workers") < 1:
+            logger.error("The 'alerts.workers' parameter must be a strictly positive integer")
+            raise InvalidConfiguration
+        if not isinstance(self.get("alerts.debounce_window"), (int, float)) or self.get("alerts.debounce_window") < 0:
+            logger.error("The 'alerts.debounce_window' parameter must be a positive number")
+            raise InvalidConfiguration
+        if not isinstance(self.get("alerts.coalesce_window"), (int, float)) or self.get("alerts.coalesce_window") < 0:
+            logger.error("The 'alerts.coalesce_window' parameter must be a positive number")
+            raise InvalidConfiguration
+        if not isinstance(self.get("alerts.queue_size"), int) or self.get("alerts.queue_size") < 1:
+            logger.error("The 'alerts.queue_size' parameter must be a strictly positive integer")
+            raise InvalidConfiguration
+        if self.get("alerts.overflow_policy") not in ["drop_lowest", "drop_new"]:
+            logger.error("The 'alerts.overflow_policy' parameter must be either 'drop_lowest' or 'drop_new'")
+            raise InvalidConfiguration
+        if not isinstance(self.get("track_changes.batch_size"), int) or self.get("track_changes.batch_size") < 1:
+            logger.error("The 'track_changes.batch_size' parameter must be a strictly positive integer")
+            raise InvalidConfiguration
+        if not isinstance(self.get("track_changes.write_concurrency"), int) or self.get("track_changes.write_concurrency") < 1:
+            logger.error("The 'track_changes.write_concurrency' parameter must be a strictly positive integer")
+            raise InvalidConfiguration
+        if not isinstance(self.get("track_changes.write_rate"), (int, float)) or self.get("track_changes.write_rate") < 0:
+            logger.error("The 'track_changes.write_rate' parameter must be a positive number")
+            raise InvalidConfiguration
+        if not isinstance(self.get("track_changes.user_workers"), int) or self.get("track_changes.user_workers") < 1:
+            logger.error("The 'track_changes.user_workers' parameter must be a strictly positive integer")
+            raise InvalidConfiguration
+        if not isinstance(self.get("track_changes.user_timeout"), (int, float)) or self.get("track_changes.user_timeout") < 0:
+            logger.error("The 'track_changes.user_timeout' parameter must be a positive number")
+            raise InvalidConfiguration
+        if not isinstance(self.get("track_changes.isolate_user_errors"), bool):
+            logger.error("The 'track_changes.isolate_user_errors' parameter must be a boolean")
+            raise InvalidConfiguration
         if self.get("scheduler.enable") and not re.match(r"^\d{2}:\d{2}$", self.get("scheduler.schedule_time")):
             logger.error("A valid 'schedule_time' parameter with the format 'HH:MM' is required (ex: 02:30)")
             raise InvalidConfiguration
@@ -0,0 +1,40 @@
+from typing import IO, NamedTuple, Tuple
+from datetime import datetime
+from xml.etree.ElementTree import iterparse
+
+
+class EpisodeRecord(NamedTuple):
+
+    key: str
+    added_at: datetime
+    updated_at: datetime
+    part_keys: Tuple[str, ...]
+    section_id: str = None
+
+
+def _to_datetime(value: str):
+    return datetime.fromtimestamp(int(value)) if value else None
+
+
+def iter_episode_records(stream: IO[bytes]):
+    root = None
+    part_keys = []
+    for event, element in iterparse(stream, events=("start", "end")):
+        if event == "start":
+            if root is None:
+                root = element
+            continue
+        if element.tag == "Part":
+            part_keys.append(element.get("key"))
+        elif element.tag == "Video":
+            if element.get("type") == "episode":
+                yield EpisodeRecord(
+                    key=element.get("key"),
+                    added_at=_to_datetime(element.get("addedAt")),
+                    updated_at=_to_datetime(element.get("updatedAt")),
+                    part_keys=tuple(part_keys),
+                    section_id=element.get("librarySectionID", root.get("librarySectionID"))
+                )
+            part_keys = []
+            # Drop the parsed elements so that memory does not grow with the size of the library
+            root.clear()
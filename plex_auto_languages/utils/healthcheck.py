@@ -12,10 +12,11 @@ flask_logger.setLevel(logging.ERROR)
 
 class HealthcheckServer(Thread):
 
-    def __init__(self, name: str, is_ready: Callable, is_healthy: Callable):
+    def __init__(self, name: str, is_ready: Callable, is_healthy: Callable, get_stats: Callable = None):
         super().__init__()
         self._is_healthy = is_healthy
         self._is_ready = is_ready
+        self._get_stats = get_stats
         self._app = Flask(name)
         self._server = make_server("0.0.0.0", 9880, self._app)
         self._ctx = self._app.app_context()
@@ -34,6 +35,11 @@ class HealthcheckServer(Thread):
             code = 200 if ready else 400
             return json.dumps({"ready": ready}), code
 
+        @self._app.route("/stats")
+        def __stats():
+            stats = self._get_stats() if self._get_stats is not None else {}
+            return json.dumps(stats), 200
+
     def run(self):
         self._server.serve_forever()
 
@@ -0,0 +1,72 @@
+from collections import namedtuple
+from datetime import datetime
+from typing import Optional, Union
+from plexapi.media import AudioStream, SubtitleStream
+
+from plex_auto_languages.utils.sqlite_store import SQLiteStore, SQLiteDict
+
+
+# Only hold the fields used to match streams, they can stand in for the streams of a reference episode
+AudioSignature = namedtuple("AudioSignature", ["languageCode", "codec", "audioChannelLayout", "channels", "title",
+                                               "displayTitle"])
+SubtitleSignature = namedtuple("SubtitleSignature", ["languageCode", "forced", "codec", "title", "displayTitle"])
+LanguagePreference = namedtuple("LanguagePreference", ["audio", "subtitle"])
+
+
+class PreferenceStore():
+
+    def __init__(self, store: SQLiteStore, table: str = "language_preferences"):
+        # "user_id:show_id": {"audio": [fields], "subtitle": [fields], "updated_at": isoformat}
+        self._preferences = SQLiteDict(store, table)
+        self._hits = 0
+        self._misses = 0
+
+    @property
+    def stats(self):
+        return {
+            "size": len(self._preferences),
+            "hits": self._hits,
+            "misses": self._misses
+        }
+
+    def get(self, user_id: Union[int, str], show_id: Union[int, str]):
+        entry = self._preferences.get(self._get_key(user_id, show_id), None)
+        if entry is None:
+            self._misses += 1
+            return None
+        self._hits += 1
+        audio = AudioSignature(*entry["audio"]) if entry["audio"] is not None else None
+        subtitle = SubtitleSignature(*entry["subtitle"]) if entry["subtitle"] is not None else None
+        return LanguagePreference(audio, subtitle)
+
+    def set(self, user_id: Union[int, str], show_id: Union[int, str], audio_stream: Optional[AudioStream],
+            subtitle_stream: Optional[SubtitleStream]):
+        preference = self.from_streams(audio_stream, subtitle_stream)
+        self._preferences[self._get_key(user_id, show_id)] = {
+            "audio": list(preference.audio) if preference.audio is not None else None,
+            "subtitle": list(preference.subtitle) if preference.subtitle is not None else None,
+            "updated_at": datetime.now().isoformat()
+        }
+        return preference
+
+    def delete(self, user_id: Union[int, str], show_id: Union[int, str]):
+        self._preferences.pop(self._get_key(user_id, show_id), None)
+
+    def clear(self):
+        self._preferences.clear()
+
+    @staticmethod
+    def from_streams(audio_stream: Optional[AudioStream], subtitle_stream: Optional[SubtitleStream]):
+        audio = None
+        if audio_stream is not None:
+            audio = AudioSignature(audio_stream.languageCode, audio_stream.codec, audio_stream.audioChannelLayout,
+                                   audio_stream.channels, audio_stream.title, audio_stream.displayTitle)
+        subtitle = None
+        if subtitle_stream is not None:
+            subtitle = SubtitleSignature(subtitle_stream.languageCode, subtitle_stream.forced, subtitle_stream.codec,
+                                         subtitle_stream.title, subtitle_stream.displayTitle)
+        return LanguagePreference(audio, subtitle)
+
+    @staticmethod
+    def _get_key(user_id: Union[int, str], show_id: Union[int, str]):
+        return f"{user_id}:{show_id}"
@@ -0,0 +1,82 @@
+import time
+from queue import Empty
+from threading import Condition
+from collections import deque
+from typing import Any, Iterable
+
+
+class BoundedPriorityQueue():
+
+    DROP_NEW = "drop_new"
+    DROP_LOWEST = "drop_lowest"
+    OVERFLOW_POLICIES = [DROP_NEW, DROP_LOWEST]
+
+    def __init__(self, max_size: int, overflow_policy: str = DROP_LOWEST, protected_priorities: Iterable[int] = ()):
+        if overflow_policy not in self.OVERFLOW_POLICIES:
+            raise ValueError(f"Unknown overflow policy '{overflow_policy}'")
+        self._max_size = max_size
+        self._overflow_policy = overflow_policy
+        # Items of protected priorities are never evicted, new items are rejected instead
+        self._protected_priorities = set(protected_priorities)
+        self._queues = {}   # priority: deque([(enqueued_at, item)])
+        self._dropped = {}  # priority: count
+        self._size = 0
+        self._not_empty = Condition()
+
+    @property
+    def max_size(self):
+        return self._max_size
+
+    @property
+    def stats(self):
+        now = time.monotonic()
+        with self._not_empty:
+            priorities = set(self._queues) | set(self._dropped)
+            return {
+                "size": self._size,
+                "max_size": self._max_size,
+                "priorities": {
+                    priority: {
+                        "depth": len(self._queues.get(priority, ())),
+                        "oldest_age": now - self._queues[priority][0][0] if self._queues.get(priority) else 0,
+                        "dropped": self._dropped.get(priority, 0)
+                    } for priority in sorted(priorities)
+                }
+            }
+
+    def __len__(self):
+        with self._not_empty:
+            return self._size
+
+    def put(self, item: Any, priority: int = 0):
+        # Lower priorities are served first, returns False if the item has been dropped
+        with self._not_empty:
+            if self._size >= self._max_size and not self._make_room(priority):
+                self._dropped[priority] = self._dropped.get(priority, 0) + 1
+                return False
+            self._queues.setdefault(priority, deque()).append((time.monotonic(), item))
+            self._size += 1
+            self._not_empty.notify()
+            return True
+
+    def get(self, block: bool = True, timeout: float = None):
+        with self._not_empty:
+            if not self._not_empty.wait_for(lambda: self._size > 0, timeout if block else 0):
+                raise Empty
+            priority = min(p for p, items in self._queues.items() if len(items) > 0)
+            self._size -= 1
+            return self._queues[priority].popleft()[1]
+
+    def _make_room(self, priority: int):
+        if self._overflow_policy == self.DROP_NEW:
+            return False
+        # Evict the oldest item of the least urgent priority, unless the new item is even less urgent
+        candidates = [p for p, items in self._queues.items()
+                      if len(items) > 0 and p >= priority and p not in self._protected_priorities]
+        if len(candidates) == 0:
+            return False
+        lowest = max(candidates)
+        self._queues[lowest].popleft()
+        self._dropped[lowest] = self._dropped.get(lowest, 0) + 1
+        self._size -= 1
+        return True
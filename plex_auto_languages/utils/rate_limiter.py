@@ -0,0 +1,31 @@
+import time
+from threading import Lock
+
+
+class TokenBucket():
+
+    def __init__(self, rate: float, burst: int = None):
+        # A rate of 0 disables the limiter
+        self._rate = rate
+        self._capacity = max(burst if burst is not None else rate, 1)
+        self._tokens = self._capacity
+        self._updated_at = time.monotonic()
+        self._lock = Lock()
+
+    @property
+    def rate(self):
+        return self._rate
+
+    def acquire(self):
+        if self._rate <= 0:
+            return
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self._capacity, self._tokens + (now - self._updated_at) * self._rate)
+                self._updated_at = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self._rate
+            time.sleep(wait)
@@ -0,0 +1,58 @@
+from typing import List, Tuple, Union
+from datetime import datetime
+
+from plex_auto_languages.utils.sqlite_store import SQLiteStore, SQLiteDict
+
+
+class SelectionLedger():
+
+    def __init__(self, store: SQLiteStore, table: str = "applied_selections"):
+        # "user_id:part_id": [signature, audio_stream_id, subtitle_stream_id, updated_at]
+        self._selections = SQLiteDict(store, table)
+        self._hits = 0
+        self._misses = 0
+
+    @property
+    def stats(self):
+        return {
+            "size": len(self._selections),
+            "hits": self._hits,
+            "misses": self._misses
+        }
+
+    def matches(self, user_id: Union[int, str], part_id: Union[int, str], signature: str, updated_at: datetime,
+                stream_ids: Tuple[int, int] = None):
+        # A part matches if the same reference was already applied and the part has not been updated since then,
+        # when the selected (audio, subtitle) stream ids of the part are known they must still be the recorded ones
+        entry = self._selections.get(self._get_key(user_id, part_id), None)
+        if entry is None or entry[0] != signature or updated_at is None or entry[3] < self._to_timestamp(updated_at) or \
+                (stream_ids is not None and tuple(entry[1:3]) != tuple(stream_ids)):
+            self._misses += 1
+            return False
+        self._hits += 1
+        return True
+
+    def record(self, user_id: Union[int, str], part_id: Union[int, str], signature: str, audio_stream_id: int,
+               subtitle_stream_id: int, updated_at: datetime):
+        self.record_many([(user_id, part_id, signature, audio_stream_id, subtitle_stream_id, updated_at)])
+
+    def record_many(self, selections: List[Tuple]):
+        # Tuples of (user_id, part_id, signature, audio_stream_id, subtitle_stream_id, updated_at)
+        selections = list(selections)
+        if len(selections) == 0:
+            return
+        self._selections.update({
+            self._get_key(user_id, part_id): [signature, audio_id, subtitle_id, self._to_timestamp(updated_at)]
+            for user_id, part_id, signature, audio_id, subtitle_id, updated_at in selections
+        })
+
+    def clear(self):
+        self._selections.clear()
+
+    @staticmethod
+    def _to_timestamp(value: datetime):
+        return int(value.timestamp()) if value is not None else 0
+
+    @staticmethod
+    def _get_key(user_id: Union[int, str], part_id: Union[int, str]):
+        return f"{user_id}:{part_id}"
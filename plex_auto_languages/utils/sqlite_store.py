@@ -0,0 +1,155 @@
+import json
+import sqlite3
+from threading import RLock
+from contextlib import contextmanager
+from collections.abc import MutableMapping
+from typing import Any, Callable, Iterable
+
+
+class SQLiteStore():
+
+    def __init__(self, path: str):
+        self._path = path
+        self._lock = RLock()
+        self._depth = 0
+        self._connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.execute("CREATE TABLE IF NOT EXISTS metadata (name TEXT PRIMARY KEY, value TEXT NOT NULL)")
+
+    @property
+    def path(self):
+        return self._path
+
+    @contextmanager
+    def transaction(self):
+        with self._lock:
+            if self._depth == 0:
+                self._connection.execute("BEGIN")
+            self._depth += 1
+            try:
+                yield self._connection
+            except BaseException:
+                self._depth -= 1
+                if self._depth == 0:
+                    self._connection.execute("ROLLBACK")
+                raise
+            self._depth -= 1
+            if self._depth == 0:
+                self._connection.execute("COMMIT")
+
+    def execute(self, query: str, parameters: Iterable = ()):
+        with self._lock:
+            return self._connection.execute(query, tuple(parameters)).fetchall()
+
+    def get_value(self, name: str, default: Any = None):
+        rows = self.execute("SELECT value FROM metadata WHERE name = ?", (name,))
+        return json.loads(rows[0][0]) if len(rows) > 0 else default
+
+    def set_value(self, name: str, value: Any):
+        with self.transaction() as connection:
+            connection.execute("INSERT OR REPLACE INTO metadata (name, value) VALUES (?, ?)", (name, json.dumps(value)))
+
+    @contextmanager
+    def temporary_keys(self, name: str):
+        # Temporary tables are private to the connection and never written to the database file
+        self.execute(f"CREATE TEMP TABLE IF NOT EXISTS {name} (key TEXT PRIMARY KEY)")
+        self.execute(f"DELETE FROM temp.{name}")
+        try:
+            yield f"temp.{name}"
+        finally:
+            self.execute(f"DROP TABLE IF EXISTS temp.{name}")
+
+    def add_temporary_keys(self, name: str, keys: Iterable[str]):
+        with self.transaction() as connection:
+            connection.executemany(f"INSERT OR IGNORE INTO temp.{name} (key) VALUES (?)", [(key,) for key in keys])
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
+
+
+class SQLiteDict(MutableMapping):
+
+    def __init__(self, store: SQLiteStore, table: str, encode: Callable = json.dumps, decode: Callable = json.loads):
+        self._store = store
+        self._table = table
+        self._encode = encode
+        self._decode = decode
+        self._store.execute(f"CREATE TABLE IF NOT EXISTS {table} (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+
+    def __getitem__(self, key: str):
+        rows = self._store.execute(f"SELECT value FROM {self._table} WHERE key = ?", (key,))
+        if len(rows) == 0:
+            raise KeyError(key)
+        return self._decode(rows[0][0])
+
+    def __setitem__(self, key: str, value: Any):
+        with self._store.transaction() as connection:
+            connection.execute(f"INSERT OR REPLACE INTO {self._table} (key, value) VALUES (?, ?)",
+                               (key, self._encode(value)))
+
+    def __delitem__(self, key: str):
+        with self._store.transaction() as connection:
+            cursor = connection.execute(f"DELETE FROM {self._table} WHERE key = ?", (key,))
+            if cursor.rowcount == 0:
+                raise KeyError(key)
+
+    def __contains__(self, key: object):
+        return len(self._store.execute(f"SELECT 1 FROM {self._table} WHERE key = ?", (key,))) > 0
+
+    def __iter__(self):
+        return iter([row[0] for row in self._store.execute(f"SELECT key FROM {self._table}")])
+
+    def __len__(self):
+        return self._store.execute(f"SELECT COUNT(*) FROM {self._table}")[0][0]
+
+    def items(self):
+        # Single query instead of one query per key
+        return [(row[0], self._decode(row[1])) for row in self._store.execute(f"SELECT key, value FROM {self._table}")]
+
+    def get_many(self, keys: Iterable[str], batch_size: int = 500):
+        # One query per batch of keys instead of one query per key
+        keys = list(keys)
+        values = {}
+        for index in range(0, len(keys), batch_size):
+            batch = keys[index:index + batch_size]
+            rows = self._store.execute(
+                f"SELECT key, value FROM {self._table} WHERE key IN ({','.join('?' * len(batch))})", batch
+            )
+            values.update((row[0], self._decode(row[1])) for row in rows)
+        return values
+
+    def missing_keys(self, keys_table: str, filter_dict: "SQLiteDict" = None, filter_values: Iterable[Any] = None):
+        # Keys absent from the given table of keys, optionally restricted to the keys whose value in filter_dict is listed
+        query = f"SELECT key FROM {self._table} WHERE key NOT IN (SELECT key FROM {keys_table})"
+        parameters = []
+        if filter_dict is not None:
+            subquery, parameters = filter_dict.keys_with_values_query(filter_values)
+            query += f" AND key IN ({subquery})"
+        return [row[0] for row in self._store.execute(query, parameters)]
+
+    def keys_with_values(self, values: Iterable[Any], exclude: bool = False):
+        # Keys whose value is listed, or is not listed when exclude is set
+        query, parameters = self.keys_with_values_query(values, exclude)
+        return [row[0] for row in self._store.execute(query, parameters)]
+
+    def keys_with_values_query(self, values: Iterable[Any], exclude: bool = False):
+        # Query and parameters selecting the keys of keys_with_values, to be used as a subquery on the same store
+        parameters = [self._encode(value) for value in values]
+        operator = "NOT IN" if exclude else "IN"
+        return f"SELECT key FROM {self._table} WHERE value {operator} ({','.join('?' * len(parameters))})", parameters
+
+    def update(self, other=(), **kwargs):
+        items = dict(other, **kwargs)
+        with self._store.transaction() as connection:
+            connection.executemany(f"INSERT OR REPLACE INTO {self._table} (key, value) VALUES (?, ?)",
+                                   [(key, self._encode(value)) for key, value in items.items()])
+
+    def delete_many(self, keys: Iterable[str]):
+        with self._store.transaction() as connection:
+            connection.executemany(f"DELETE FROM {self._table} WHERE key = ?", [(key,) for key in keys])
+
+    def clear(self):
+        with self._store.transaction() as connection:
+            connection.execute(f"DELETE FROM {self._table}")
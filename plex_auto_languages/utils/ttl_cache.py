@@ -0,0 +1,95 @@
+import time
+from threading import RLock
+from collections import OrderedDict
+from collections.abc import MutableMapping
+from typing import Any, Hashable
+
+
+class TTLCache(MutableMapping):
+
+    def __init__(self, max_size: int, ttl: float):
+        self._max_size = max_size
+        self._ttl = ttl
+        self._data = OrderedDict()  # key: (expires_at, value)
+        self._lock = RLock()
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._expirations = 0
+
+    @property
+    def max_size(self):
+        return self._max_size
+
+    @property
+    def ttl(self):
+        return self._ttl
+
+    @property
+    def stats(self):
+        with self._lock:
+            return {
+                "size": len(self._data),
+                "max_size": self._max_size,
+                "hits": self._hits,
+                "misses": self._misses,
+                "evictions": self._evictions,
+                "expirations": self._expirations
+            }
+
+    def __getitem__(self, key: Hashable):
+        with self._lock:
+            if not self._is_valid(key):
+                self._misses += 1
+                raise KeyError(key)
+            self._hits += 1
+            self._data.move_to_end(key)
+            return self._data[key][1]
+
+    def __setitem__(self, key: Hashable, value: Any):
+        with self._lock:
+            self._data[key] = (time.monotonic() + self._ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self._max_size:
+                self._data.popitem(last=False)
+                self._evictions += 1
+
+    def __delitem__(self, key: Hashable):
+        with self._lock:
+            del self._data[key]
+
+    def __contains__(self, key: object):
+        with self._lock:
+            return self._is_valid(key)
+
+    def __iter__(self):
+        with self._lock:
+            self.purge()
+            return iter(list(self._data.keys()))
+
+    def __len__(self):
+        with self._lock:
+            self.purge()
+            return len(self._data)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def purge(self):
+        with self._lock:
+            now = time.monotonic()
+            expired_keys = [key for key, (expires_at, _) in self._data.items() if expires_at <= now]
+            for key in expired_keys:
+                del self._data[key]
+            self._expirations += len(expired_keys)
+
+    def _is_valid(self, key: Hashable):
+        entry = self._data.get(key, None)
+        if entry is None:
+            return False
+        if entry[0] <= time.monotonic():
+            del self._data[key]
+            self._expirations += 1
+            return False
+        return True
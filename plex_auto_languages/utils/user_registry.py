@@ -0,0 +1,32 @@
+from typing import Iterable, Union
+
+
+class UserRegistry():
+
+    def __init__(self, users: Iterable = ()):
+        self._users = tuple(users)
+        self._users_by_id = {str(user.id): user for user in self._users}
+        self._users_by_name = {user.name: user for user in self._users}
+
+    @property
+    def users(self):
+        return list(self._users)
+
+    @property
+    def ids(self):
+        return [user.id for user in self._users]
+
+    def get_by_id(self, user_id: Union[int, str]):
+        return self._users_by_id.get(str(user_id), None)
+
+    def get_by_name(self, name: str):
+        return self._users_by_name.get(name, None)
+
+    def __contains__(self, user_id: Union[int, str]):
+        return str(user_id) in self._users_by_id
+
+    def __iter__(self):
+        return iter(self._users)
+
+    def __len__(self):
+        return len(self._users)
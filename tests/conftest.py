@@ -1,10 +1,12 @@
 import os
+import tempfile
 import pytest
 import plexapi
 
 from plex_auto_languages.utils.logger import init_logger
 from plex_auto_languages.plex_server import PlexServer
 from plex_auto_languages.utils.configuration import Configuration
+from plex_auto_languages.utils.sqlite_store import SQLiteStore
 
 
 init_logger()
@@ -39,3 +41,16 @@ def episode(plex):
     episode = plex.episodes()[0]
     print("Episode: %s" % episode)
     return episode
+
+
+@pytest.fixture()
+def store():
+    fd, path = tempfile.mkstemp()
+    os.close(fd)
+    os.remove(path)
+    store = SQLiteStore(path)
+    yield store
+    store.close()
+    for suffix in ["", "-wal", "-shm"]:
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
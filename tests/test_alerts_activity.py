@@ -1,5 +1,5 @@
 import copy
-from unittest.mock import patch
+from unittest.mock import ANY, patch
 
 from plex_auto_languages.constants import EventType
 from plex_auto_languages.plex_server import PlexServer
@@ -28,7 +28,7 @@ def test_activity(plex, episode):
     with patch.object(PlexServer, "change_tracks") as mocked_change_tracks:
         # Default behavior
         activity.process(plex)
-        mocked_change_tracks.assert_called_once_with(plex.username, episode, EventType.PLAY_OR_ACTIVITY)
+        mocked_change_tracks.assert_called_once_with(plex.username, episode, EventType.PLAY_OR_ACTIVITY, ANY)
         assert (plex.user_id, episode.key) in plex.cache.recent_activities
 
         # Not called because the previous call is too recent
@@ -40,7 +40,7 @@ def test_activity(plex, episode):
         mocked_change_tracks.reset_mock()
         plex.cache.recent_activities.clear()
         activity.process(plex)
-        mocked_change_tracks.assert_called_once_with(plex.username, episode, EventType.PLAY_OR_ACTIVITY)
+        mocked_change_tracks.assert_called_once_with(plex.username, episode, EventType.PLAY_OR_ACTIVITY, ANY)
         plex.cache.recent_activities.clear()
 
         # Not called because the show is ignored
@@ -1,5 +1,5 @@
 import copy
-from unittest.mock import patch
+from unittest.mock import ANY, patch
 
 from plex_auto_languages.constants import EventType
 from plex_auto_languages.plex_server import PlexServer
@@ -21,9 +21,9 @@ def test_playing(plex, episode):
 
     with patch.object(PlexServer, "get_user_from_client_identifier", return_value=(None, None)) as mocked_get_user:
         playing.process(plex)
-        mocked_get_user.assert_called_once_with("some_identifier")
+        mocked_get_user.assert_called_once_with("some_identifier", "1")
 
-    plex.cache.user_clients["some_identifier"] = (plex.user_id, plex.username)
+    plex.session_tracker.track("some_identifier", "1", plex.user_id, plex.username, episode.key)
 
     with patch.object(PlexServer, "change_tracks") as mocked_change_tracks:
         # Not called because the show is ignored
@@ -37,7 +37,7 @@ def test_playing(plex, episode):
         # Default behavior
         mocked_change_tracks.reset_mock()
         playing.process(plex)
-        mocked_change_tracks.assert_called_once_with(plex.username, episode, EventType.PLAY_OR_ACTIVITY)
+        mocked_change_tracks.assert_called_once_with(plex.username, episode, EventType.PLAY_OR_ACTIVITY, ANY)
         plex.cache.default_streams.clear()
 
         # Not called because the state hasn't changed
@@ -51,7 +51,7 @@ def test_playing(plex, episode):
         playing._message["state"] = "paused"
         assert playing.session_state == "paused"
         playing.process(plex)
-        mocked_change_tracks.assert_called_once_with(plex.username, episode, EventType.PLAY_OR_ACTIVITY)
+        mocked_change_tracks.assert_called_once_with(plex.username, episode, EventType.PLAY_OR_ACTIVITY, ANY)
 
         # Not called because the selected streams are unchanged
         mocked_change_tracks.reset_mock()
@@ -63,10 +63,10 @@ def test_playing(plex, episode):
 
         # Not called because the user is invalid
         mocked_change_tracks.reset_mock()
-        plex.cache.user_clients["some_identifier"] = ("invalid_user_id", plex.username)
+        plex.session_tracker.track("some_identifier", "1", "invalid_user_id", plex.username, episode.key)
         playing.process(plex)
         mocked_change_tracks.assert_not_called()
-        plex.cache.user_clients["some_identifier"] = (plex.user_id, plex.username)
+        plex.session_tracker.track("some_identifier", "1", plex.user_id, plex.username, episode.key)
 
         # Not called because the item key is invalid
         mocked_change_tracks.reset_mock()
@@ -80,9 +80,9 @@ def test_playing(plex, episode):
         mocked_change_tracks.reset_mock()
         playing._message["state"] = "stopped"
         assert playing.session_state == "stopped"
-        assert "some_identifier" in plex.cache.user_clients
         playing.process(plex)
-        assert "some_identifier" not in plex.cache.user_clients
-        mocked_change_tracks.assert_called_once_with(plex.username, episode, EventType.PLAY_OR_ACTIVITY)
+        # The user of the client is still known after the end of the session
+        assert plex.session_tracker.get_user("some_identifier") == (plex.user_id, plex.username)
+        mocked_change_tracks.assert_called_once_with(plex.username, episode, EventType.PLAY_OR_ACTIVITY, ANY)
         playing._message = copy.deepcopy(playing_message)
         plex.cache.default_streams.clear()
@@ -16,7 +16,7 @@ def test_status(plex, episode):
 
     plex.config._config["ignore_labels"] = ["PAL_IGNORE"]
 
-    with patch.object(PlexServer, "process_new_or_updated_episode") as mocked_process:
+    with patch.object(PlexServer, "process_new_or_updated_episodes") as mocked_process:
 
         plex.config._config["refresh_library_on_scan"] = True
 
@@ -31,7 +31,7 @@ def test_status(plex, episode):
             # Default behavior for new episode
             mocked_process.reset_mock()
             status.process(plex)
-            mocked_process.assert_called_once_with(episode.key, EventType.NEW_EPISODE, True)
+            mocked_process.assert_called_once_with([episode.key], EventType.NEW_EPISODE, True)
 
             # Not called because the episode has been processed recently
             mocked_process.reset_mock()
@@ -50,7 +50,7 @@ def test_status(plex, episode):
             # Default behavior for updated episode
             mocked_process.reset_mock()
             status.process(plex)
-            mocked_process.assert_called_once_with(episode.key, EventType.UPDATED_EPISODE, False)
+            mocked_process.assert_called_once_with([episode.key], EventType.UPDATED_EPISODE, False)
 
             # Not called because the episode has been processed recently
             mocked_process.reset_mock()
@@ -64,7 +64,7 @@ def test_status(plex, episode):
             # Default behavior for new episode
             mocked_process.reset_mock()
             status.process(plex)
-            mocked_process.assert_called_once_with(episode.key, EventType.NEW_EPISODE, True)
+            mocked_process.assert_called_once_with([episode.key], EventType.NEW_EPISODE, True)
             plex.cache.newly_added.clear()
 
         # Not called because the title is invalid
@@ -13,83 +13,113 @@ def test_timeline(plex, episode):
         "itemID": str(item_id),
         "identifier": "com.plexapp.plugins.library",
         "state": 5,
-        "type": 0
+        "type": 4
     }
     timeline = PlexTimeline(copy.deepcopy(timeline_message))
     assert timeline.item_id == item_id
     assert timeline.identifier == "com.plexapp.plugins.library"
     assert timeline.state == 5
-    assert timeline.entry_type == 0
+    assert timeline.entry_type == 4
+    assert timeline.item_key == episode.key
 
+    with patch.object(PlexServer, "queue_new_episode") as mocked_queue:
+        # Default behavior
+        timeline.process(plex)
+        mocked_queue.assert_called_once_with(item_id)
+
+        # Not called because the alert has metadata state
+        mocked_queue.reset_mock()
+        timeline._message["metadataState"] = "state"
+        timeline.process(plex)
+        mocked_queue.assert_not_called()
+        timeline._message = copy.deepcopy(timeline_message)
+
+        # Not called because the alert has media state
+        mocked_queue.reset_mock()
+        timeline._message["mediaState"] = "state"
+        timeline.process(plex)
+        mocked_queue.assert_not_called()
+        timeline._message = copy.deepcopy(timeline_message)
+
+        # Not called because the alert has an invalid identifier
+        mocked_queue.reset_mock()
+        timeline._message["identifier"] = "invalid_identifier"
+        timeline.process(plex)
+        mocked_queue.assert_not_called()
+        timeline._message = copy.deepcopy(timeline_message)
+
+        # Not called because the alert has an invalid state
+        mocked_queue.reset_mock()
+        timeline._message["state"] = 2
+        timeline.process(plex)
+        mocked_queue.assert_not_called()
+        timeline._message = copy.deepcopy(timeline_message)
+
+        # Not called because the alert has the type '-1'
+        mocked_queue.reset_mock()
+        timeline._message["type"] = -1
+        timeline.process(plex)
+        mocked_queue.assert_not_called()
+        timeline._message = copy.deepcopy(timeline_message)
+
+        # Not called because the alert is not related to an episode
+        mocked_queue.reset_mock()
+        timeline._message["type"] = 1
+        timeline.process(plex)
+        mocked_queue.assert_not_called()
+        timeline._message = copy.deepcopy(timeline_message)
+
+
+def test_timeline_new_episodes(plex, episode):
     plex.config._config["ignore_labels"] = ["PAL_IGNORE"]
 
-    with patch.object(PlexServer, "process_new_or_updated_episode") as mocked_process:
+    with patch.object(PlexServer, "process_new_or_updated_episodes") as mocked_process:
         fake_recent_episode = copy.deepcopy(episode)
         fake_recent_episode.addedAt = datetime.now()
-        with patch.object(PlexServer, "fetch_item", return_value=fake_recent_episode):
+        with patch.object(PlexServer, "fetch_items", return_value=[fake_recent_episode]):
             # Not called because the show should be ignored
             mocked_process.reset_mock()
             episode.show().addLabel("PAL_IGNORE")
-            timeline.process(plex)
+            plex.process_new_episodes([episode.key])
             mocked_process.assert_not_called()
             episode.show().removeLabel("PAL_IGNORE")
 
             # Default behavior
             mocked_process.reset_mock()
-            timeline.process(plex)
-            mocked_process.assert_called_once_with(item_id, EventType.NEW_EPISODE, True)
+            plex.process_new_episodes([episode.key])
+            mocked_process.assert_called_once_with([episode.key], EventType.NEW_EPISODE, True)
 
             # Not called because it has already been processed
             mocked_process.reset_mock()
-            timeline.process(plex)
+            plex.process_new_episodes([episode.key])
             mocked_process.assert_not_called()
             plex.cache.newly_added.clear()
 
-            # Not called because the alert has metadata state
-            mocked_process.reset_mock()
-            timeline._message["metadataState"] = "state"
-            timeline.process(plex)
-            mocked_process.assert_not_called()
-            timeline._message = copy.deepcopy(timeline_message)
-
-            # Not called because the alert has media state
-            mocked_process.reset_mock()
-            timeline._message["mediaState"] = "state"
-            timeline.process(plex)
-            mocked_process.assert_not_called()
-            timeline._message = copy.deepcopy(timeline_message)
-
-            # Not called because the alert has an invalid identifier
-            mocked_process.reset_mock()
-            timeline._message["identifier"] = "invalid_identifier"
-            timeline.process(plex)
-            mocked_process.assert_not_called()
-            timeline._message = copy.deepcopy(timeline_message)
-
-            # Not called because the alert has an invalid state
-            mocked_process.reset_mock()
-            timeline._message["state"] = 2
-            timeline.process(plex)
-            mocked_process.assert_not_called()
-            timeline._message = copy.deepcopy(timeline_message)
-
-            # Not called because the alert has the type '-1'
+        with patch.object(PlexServer, "fetch_items", return_value=[]):
+            # Not called because the episode can't be found
             mocked_process.reset_mock()
-            timeline._message["type"] = -1
-            timeline.process(plex)
-            mocked_process.assert_not_called()
-            timeline._message = copy.deepcopy(timeline_message)
-
-        with patch.object(PlexServer, "fetch_item", return_value=None):
-            # Not called because the episode is None
-            mocked_process.reset_mock()
-            timeline.process(plex)
+            plex.process_new_episodes([episode.key])
             mocked_process.assert_not_called()
 
         fake_old_episode = copy.deepcopy(episode)
         fake_old_episode.addedAt = datetime.now() - timedelta(minutes=10)
-        with patch.object(PlexServer, "fetch_item", return_value=fake_old_episode):
+        with patch.object(PlexServer, "fetch_items", return_value=[fake_old_episode]):
             # Not called because the episode has been added more than 5 minutes ago
             mocked_process.reset_mock()
-            timeline.process(plex)
+            plex.process_new_episodes([episode.key])
+            mocked_process.assert_not_called()
+
+
+def test_coalesced_new_episodes(plex):
+    # Coalesced episodes are handed to the alert workers as a single scheduled task
+    with patch.object(PlexServer, "_run_scheduled_task") as mocked_schedule:
+        with patch.object(PlexServer, "process_new_episodes") as mocked_process:
+            plex.queue_new_episode(1)
+            plex.queue_new_episode(2)
+            plex._new_episodes.flush()
+            mocked_schedule.assert_called_once()
             mocked_process.assert_not_called()
+            item_key, callback = mocked_schedule.call_args[0]
+            assert item_key == "/library/metadata/1"
+            callback()
+            mocked_process.assert_called_once_with([1, 2])
@@ -0,0 +1,36 @@
+import time
+from unittest.mock import MagicMock
+
+from plex_auto_languages.utils.coalescer import Coalescer
+
+
+def test_coalescer():
+    callback = MagicMock()
+    coalescer = Coalescer(0.2, callback)
+    for key in [1, 2, 1, 3]:
+        coalescer.add(key)
+    callback.assert_not_called()
+    assert coalescer.stats["pending"] == 3
+
+    time.sleep(0.4)
+    callback.assert_called_once_with([1, 2, 3])
+    assert coalescer.stats == {"pending": 0, "flushes": 1, "keys": 3}
+
+    # Pending keys can be flushed before the end of the window
+    callback.reset_mock()
+    coalescer.add(4)
+    coalescer.flush()
+    callback.assert_called_once_with([4])
+
+    callback.reset_mock()
+    coalescer.add(5)
+    coalescer.cancel()
+    time.sleep(0.4)
+    callback.assert_not_called()
+
+
+def test_coalescer_without_window():
+    callback = MagicMock(side_effect=Exception())
+    coalescer = Coalescer(0, callback)
+    coalescer.add(1)
+    callback.assert_called_once_with([1])
@@ -194,6 +194,71 @@ def test_configuration_unvalidated():
     finally:
         os.remove(path)
 
+    os.environ["LIBRARY_CACHE_FULL_REFRESH_INTERVAL"] = "-1"
+    with pytest.raises(InvalidConfiguration):
+        _ = Configuration(None)
+    del os.environ["LIBRARY_CACHE_FULL_REFRESH_INTERVAL"]
+
+    os.environ["LIBRARY_CACHE_SCAN_WORKERS"] = "0"
+    with pytest.raises(InvalidConfiguration):
+        _ = Configuration(None)
+    del os.environ["LIBRARY_CACHE_SCAN_WORKERS"]
+
+    os.environ["ALERTS_WORKERS"] = "0"
+    with pytest.raises(InvalidConfiguration):
+        _ = Configuration(None)
+    del os.environ["ALERTS_WORKERS"]
+
+    os.environ["ALERTS_DEBOUNCE_WINDOW"] = "-1"
+    with pytest.raises(InvalidConfiguration):
+        _ = Configuration(None)
+    del os.environ["ALERTS_DEBOUNCE_WINDOW"]
+
+    os.environ["ALERTS_COALESCE_WINDOW"] = "-1"
+    with pytest.raises(InvalidConfiguration):
+        _ = Configuration(None)
+    del os.environ["ALERTS_COALESCE_WINDOW"]
+
+    os.environ["ALERTS_QUEUE_SIZE"] = "0"
+    with pytest.raises(InvalidConfiguration):
+        _ = Configuration(None)
+    del os.environ["ALERTS_QUEUE_SIZE"]
+
+    os.environ["ALERTS_OVERFLOW_POLICY"] = "drop_oldest"
+    with pytest.raises(InvalidConfiguration):
+        _ = Configuration(None)
+    del os.environ["ALERTS_OVERFLOW_POLICY"]
+
+    os.environ["TRACK_CHANGES_BATCH_SIZE"] = "0"
+    with pytest.raises(InvalidConfiguration):
+        _ = Configuration(None)
+    del os.environ["TRACK_CHANGES_BATCH_SIZE"]
+
+    os.environ["TRACK_CHANGES_WRITE_CONCURRENCY"] = "0"
+    with pytest.raises(InvalidConfiguration):
+        _ = Configuration(None)
+    del os.environ["TRACK_CHANGES_WRITE_CONCURRENCY"]
+
+    os.environ["TRACK_CHANGES_WRITE_RATE"] = "-1"
+    with pytest.raises(InvalidConfiguration):
+        _ = Configuration(None)
+    del os.environ["TRACK_CHANGES_WRITE_RATE"]
+
+    os.environ["TRACK_CHANGES_USER_WORKERS"] = "0"
+    with pytest.raises(InvalidConfiguration):
+        _ = Configuration(None)
+    del os.environ["TRACK_CHANGES_USER_WORKERS"]
+
+    os.environ["TRACK_CHANGES_USER_TIMEOUT"] = "-1"
+    with pytest.raises(InvalidConfiguration):
+        _ = Configuration(None)
+    del os.environ["TRACK_CHANGES_USER_TIMEOUT"]
+
+    os.environ["TRACK_CHANGES_ISOLATE_USER_ERRORS"] = "sometimes"
+    with pytest.raises(InvalidConfiguration):
+        _ = Configuration(None)
+    del os.environ["TRACK_CHANGES_ISOLATE_USER_ERRORS"]
+
     os.environ["SCHEDULER_ENABLE"] = "true"
     os.environ["SCHEDULER_SCHEDULE_TIME"] = "12h30"
     with pytest.raises(InvalidConfiguration):
@@ -0,0 +1,47 @@
+import io
+from datetime import datetime
+
+from plex_auto_languages.utils.episode_scanner import iter_episode_records
+
+
+EPISODES_XML = b"""<?xml version="1.0" encoding="UTF-8"?>
+<MediaContainer size="3" librarySectionID="1">
+  <Video type="episode" key="/library/metadata/1" addedAt="1600000000" updatedAt="1600000100">
+    <Media id="1">
+      <Part id="1" key="/library/parts/1/1600000000/file.mkv" />
+      <Part id="2" key="/library/parts/2/1600000000/file.mkv" />
+    </Media>
+    <Director tag="Someone" />
+  </Video>
+  <Video type="movie" key="/library/metadata/2" addedAt="1600000000">
+    <Media id="2">
+      <Part id="3" key="/library/parts/3/1600000000/file.mkv" />
+    </Media>
+  </Video>
+  <Video type="episode" key="/library/metadata/3" addedAt="1600000200">
+    <Media id="3">
+      <Part id="4" key="/library/parts/4/1600000000/file.mkv" />
+    </Media>
+  </Video>
+</MediaContainer>
+"""
+
+
+def test_iter_episode_records():
+    records = list(iter_episode_records(io.BytesIO(EPISODES_XML)))
+    assert len(records) == 2
+
+    assert records[0].key == "/library/metadata/1"
+    assert records[0].added_at == datetime.fromtimestamp(1600000000)
+    assert records[0].updated_at == datetime.fromtimestamp(1600000100)
+    assert records[0].part_keys == ("/library/parts/1/1600000000/file.mkv", "/library/parts/2/1600000000/file.mkv")
+
+    assert records[0].section_id == "1"
+
+    assert records[1].key == "/library/metadata/3"
+    assert records[1].updated_at is None
+    assert records[1].part_keys == ("/library/parts/4/1600000000/file.mkv",)
+
+
+def test_iter_episode_records_empty():
+    assert list(iter_episode_records(io.BytesIO(b"<MediaContainer size=\"0\" />"))) == []
@@ -13,6 +13,10 @@ def always_false():
     return False
 
 
+def get_stats():
+    return {"cache": {"hits": 1}}
+
+
 def test_healthcheck():
     server = HealthcheckServer("test", always_false, always_false)
     server.start()
@@ -30,6 +34,10 @@ def test_healthcheck():
     assert response.status_code == 400
     assert response.json()["ready"] is False
 
+    response = requests.get("http://localhost:9880/stats")
+    assert response.status_code == 200
+    assert response.json() == {}
+
     server.shutdown()
     time.sleep(1)
 
@@ -52,7 +60,7 @@ def test_healthcheck():
     server.shutdown()
     time.sleep(1)
 
-    server = HealthcheckServer("test3", always_true, always_true)
+    server = HealthcheckServer("test3", always_true, always_true, get_stats)
     server.start()
     time.sleep(1)
 
@@ -68,6 +76,10 @@ def test_healthcheck():
     assert response.status_code == 200
     assert response.json()["ready"] is True
 
+    response = requests.get("http://localhost:9880/stats")
+    assert response.status_code == 200
+    assert response.json() == {"cache": {"hits": 1}}
+
     server.shutdown()
     time.sleep(2)
 
@@ -1,18 +1,18 @@
 import time
-from queue import Queue
 from logging import Logger
-from unittest.mock import patch
+from unittest.mock import MagicMock, patch
 from requests.exceptions import ReadTimeout
 
 from plex_auto_languages.plex_alert_handler import PlexAlertHandler
-from plex_auto_languages.alerts import PlexStatus, PlexPlaying, PlexActivity, PlexTimeline
+from plex_auto_languages.utils.priority_queue import BoundedPriorityQueue
+from plex_auto_languages.alerts import PlexStatus, PlexPlaying, PlexActivity, PlexTimeline, PlexScheduledTask
 
 
 def test_plex_alert_handler():
     handler = PlexAlertHandler(None, True, True, True)
 
     playing_alert = {"type": PlexPlaying.TYPE, "PlaySessionStateNotification": [{}]}
-    with patch.object(Queue, "put") as mocked_put:
+    with patch.object(BoundedPriorityQueue, "put") as mocked_put:
         handler(playing_alert)
         mocked_put.assert_called_once()
 
@@ -22,7 +22,7 @@ def test_plex_alert_handler():
         mocked_put.assert_not_called()
 
     timeline_alert = {"type": PlexTimeline.TYPE, "TimelineEntry": [{}]}
-    with patch.object(Queue, "put") as mocked_put:
+    with patch.object(BoundedPriorityQueue, "put") as mocked_put:
         handler(timeline_alert)
         mocked_put.assert_called_once()
 
@@ -32,7 +32,7 @@ def test_plex_alert_handler():
         mocked_put.assert_not_called()
 
     status_alert = {"type": PlexStatus.TYPE, "StatusNotification": [{}]}
-    with patch.object(Queue, "put") as mocked_put:
+    with patch.object(BoundedPriorityQueue, "put") as mocked_put:
         handler(status_alert)
         mocked_put.assert_called_once()
 
@@ -42,7 +42,7 @@ def test_plex_alert_handler():
         mocked_put.assert_not_called()
 
     activity_alert = {"type": PlexActivity.TYPE, "ActivityNotification": [{}]}
-    with patch.object(Queue, "put") as mocked_put:
+    with patch.object(BoundedPriorityQueue, "put") as mocked_put:
         handler(activity_alert)
         mocked_put.assert_called_once()
 
@@ -59,21 +59,21 @@ def test_alert_processing():
 
     status_alert = PlexStatus({"type": PlexStatus.TYPE, "StatusNotification": [{}]})
     with patch.object(PlexStatus, "process") as mocked_process:
-        handler._alerts_queue.put(status_alert)
+        handler.put(status_alert)
         time.sleep(1)
         mocked_process.assert_called_once()
 
     status_alert = PlexStatus({"type": PlexStatus.TYPE, "StatusNotification": [{"title": "Library scan complete"}]})
     with patch.object(PlexStatus, "process", side_effect=Exception()) as mocked_process:
         with patch.object(Logger, "debug") as mocked_debug:
-            handler._alerts_queue.put(status_alert)
+            handler.put(status_alert)
             time.sleep(1)
             mocked_debug.assert_called_with(status_alert.message)
 
     status_alert = PlexStatus({"type": PlexStatus.TYPE, "StatusNotification": [{"title": "Library scan complete"}]})
     with patch.object(PlexStatus, "process", side_effect=ReadTimeout()) as mocked_process:
         with patch.object(Logger, "debug") as mocked_debug:
-            handler._alerts_queue.put(status_alert)
+            handler.put(status_alert)
             time.sleep(1)
             mocked_debug.assert_called_with(status_alert.message)
 
@@ -82,7 +82,119 @@ def test_alert_processing():
 
 def test_processor_thread():
     handler = PlexAlertHandler(None, True, True, True)
-    assert handler._processor_thread.is_alive() is True
+    assert len(handler._processor_threads) == 1
+    assert handler._processor_threads[0].is_alive() is True
 
     handler.stop()
-    assert handler._processor_thread.is_alive() is False
+    assert handler._processor_threads[0].is_alive() is False
+
+
+def test_processor_threads_sharding():
+    handler = PlexAlertHandler(None, True, True, True, workers=4)
+    assert handler.workers == 4
+    assert all(processor_thread.is_alive() for processor_thread in handler._processor_threads)
+
+    # Alerts related to the same item are always dispatched to the same worker
+    playing_alert = PlexPlaying({"key": "/library/metadata/1234"})
+    activity_alert = PlexActivity({"Activity": {"Context": {"key": "/library/metadata/1234"}}})
+    timeline_alert = PlexTimeline({"itemID": "1234"})
+    assert handler._get_queue(playing_alert) is handler._get_queue(activity_alert)
+    assert handler._get_queue(playing_alert) is handler._get_queue(timeline_alert)
+    queues = {id(handler._get_queue(PlexTimeline({"itemID": str(item_id)}))) for item_id in range(100)}
+    assert len(queues) == 4
+
+    # Alerts of the same shard are processed in order of arrival
+    processed = []
+
+    def process(alert, plex):
+        time.sleep(0.01)
+        processed.append(alert.message["state"])
+
+    with patch.object(PlexPlaying, "process", autospec=True, side_effect=process):
+        states = [f"state_{i}" for i in range(20)]
+        handler({"type": PlexPlaying.TYPE, "PlaySessionStateNotification": [
+            {"key": "/library/metadata/1234", "state": state} for state in states
+        ]})
+        time.sleep(1)
+        assert processed == states
+
+    handler.stop()
+    assert all(processor_thread.is_alive() is False for processor_thread in handler._processor_threads)
+
+
+def test_alert_debouncing():
+    handler = PlexAlertHandler(None, True, True, True, debounce_window=0.5)
+
+    def playing_alert(state):
+        return {"type": PlexPlaying.TYPE, "PlaySessionStateNotification": [{"sessionKey": "1", "state": state}]}
+
+    with patch.object(BoundedPriorityQueue, "put") as mocked_put:
+        handler(playing_alert("playing"))
+        handler(playing_alert("playing"))
+        assert mocked_put.call_count == 1
+
+        # State changes are never collapsed
+        handler(playing_alert("paused"))
+        handler(playing_alert("playing"))
+        assert mocked_put.call_count == 3
+
+        # Alerts are processed again once the debounce window has elapsed
+        time.sleep(0.6)
+        handler(playing_alert("playing"))
+        assert mocked_put.call_count == 4
+
+        timeline_alert = {"type": PlexTimeline.TYPE, "TimelineEntry": [{"itemID": "1", "state": 5}] * 3}
+        handler(timeline_alert)
+        assert mocked_put.call_count == 5
+
+        # Status alerts are never debounced
+        status_alert = {"type": PlexStatus.TYPE, "StatusNotification": [{}, {}]}
+        handler(status_alert)
+        assert mocked_put.call_count == 7
+
+    assert handler.stats["received"] == {PlexPlaying.TYPE: 5, PlexTimeline.TYPE: 3, PlexStatus.TYPE: 2}
+    assert handler.stats["debounced"] == {PlexPlaying.TYPE: 1, PlexTimeline.TYPE: 2}
+
+    handler.stop()
+
+
+def test_alert_priorities():
+    handler = PlexAlertHandler(None, True, True, True, queue_size=3, overflow_policy=BoundedPriorityQueue.DROP_LOWEST)
+    handler.stop()
+
+    timeline_alerts = [PlexTimeline({"itemID": "1", "state": state}) for state in range(3)]
+    for alert in timeline_alerts:
+        assert handler.put(alert) is True
+    playing_alert = PlexPlaying({"key": "/library/metadata/1"})
+    assert handler.put(playing_alert) is True
+    scheduled_task = PlexScheduledTask("/library/metadata/1", lambda: None)
+    assert handler.put(scheduled_task) is False
+
+    stats = handler.stats["queue"]
+    assert stats["size"] == 3
+    assert stats["priorities"][PlexTimeline.PRIORITY]["dropped"] == 1
+    assert stats["priorities"][PlexScheduledTask.PRIORITY]["dropped"] == 1
+    assert stats["priorities"][PlexPlaying.PRIORITY]["depth"] == 1
+
+    # Playback alerts are served first
+    alerts_queue = handler._get_queue(playing_alert)
+    assert alerts_queue.get(False) is playing_alert
+    assert alerts_queue.get(False) is timeline_alerts[1]
+    assert alerts_queue.get(False) is timeline_alerts[2]
+
+
+def test_scanned_sections():
+    plex = MagicMock()
+    handler = PlexAlertHandler(plex, True, True, True, workers=4)
+    handler.stop()
+
+    # Sections are recorded when the alerts are received, before any worker processes them
+    handler({"type": PlexTimeline.TYPE, "TimelineEntry": [
+        {"itemID": "1", "sectionID": "2", "identifier": "com.plexapp.plugins.library"},
+        {"itemID": "2", "sectionID": "3", "identifier": "com.plexapp.system"}
+    ]})
+    handler({"type": PlexActivity.TYPE, "ActivityNotification": [
+        {"event": "started", "Activity": {"Context": {"key": "/library/metadata/3", "librarySectionID": "4"}}}
+    ]})
+    handler({"type": PlexStatus.TYPE, "StatusNotification": [{"title": "Library scan complete"}]})
+    assert [c.args for c in plex.cache.mark_section_scanned.call_args_list] == [("2",), ("4",)]
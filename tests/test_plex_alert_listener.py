@@ -0,0 +1,104 @@
+import json
+from unittest.mock import MagicMock, patch
+from websocket import WebSocketBadStatusException
+
+from plex_auto_languages.plex_alert_listener import PlexAlertListener
+from plex_auto_languages.plex_alert_handler import PlexAlertHandler
+
+
+def get_fake_server():
+    server = MagicMock()
+    server.url.side_effect = lambda key, includeToken: \
+        f"http://localhost:32400{key}{'&' if '?' in key else '?'}X-Plex-Token=token"
+    return server
+
+
+def get_message(message_type: str):
+    return json.dumps({"NotificationContainer": {"type": message_type, "size": 1}})
+
+
+def test_notification_types():
+    handler = PlexAlertHandler(None, True, False, False)
+    assert handler.get_notification_types() == ["playing"]
+    handler.stop()
+
+    handler = PlexAlertHandler(None, True, True, True)
+    assert handler.get_notification_types() == ["playing", "activity", "timeline", "status"]
+    handler.stop()
+
+
+def test_listener_url():
+    listener = PlexAlertListener(get_fake_server(), filters=["playing", "timeline"])
+    assert listener.get_url() == \
+        "ws://localhost:32400/:/websockets/notifications?filters=playing,timeline&X-Plex-Token=token"
+
+    listener = PlexAlertListener(get_fake_server())
+    assert listener.filters is None
+    assert listener.get_url() == "ws://localhost:32400/:/websockets/notifications?X-Plex-Token=token"
+
+
+def test_listener_messages():
+    callback = MagicMock()
+    listener = PlexAlertListener(get_fake_server(), callback, filters=["playing"])
+
+    listener._onMessage(None, get_message("playing"))
+    callback.assert_called_once_with({"type": "playing", "size": 1})
+
+    # Notifications are filtered locally if the server does not apply the filters
+    callback.reset_mock()
+    listener._onMessage(None, get_message("transcodeSession.update"))
+    callback.assert_not_called()
+    assert listener.stats["received"] == 1
+    assert listener.stats["ignored"] == 1
+
+    listener._onMessage(None, "invalid json")
+    callback.assert_not_called()
+
+
+def test_listener_rejected_filters():
+    error_callback = MagicMock()
+    listener = PlexAlertListener(get_fake_server(), callbackError=error_callback, filters=["playing"])
+
+    listener._onError(None, WebSocketBadStatusException("Handshake status %d %s", 400, "Bad Request"))
+    error_callback.assert_not_called()
+    assert listener._filters_rejected is True
+    assert listener.filters is None
+    assert "filters" not in listener.get_url()
+
+    # Errors are forwarded once the subscription has been accepted
+    listener._onOpen(None)
+    listener._onError(None, WebSocketBadStatusException("Handshake status %d %s", 400, "Bad Request"))
+    error_callback.assert_called_once()
+
+
+def test_peek_notification_type():
+    assert PlexAlertListener.peek_notification_type(get_message("playing")) == "playing"
+    assert PlexAlertListener.peek_notification_type(get_message("playing").encode("utf-8")) == "playing"
+    assert PlexAlertListener.peek_notification_type('{"NotificationContainer":{"size":1,"type":"playing"}}') is None
+    assert PlexAlertListener.peek_notification_type("invalid") is None
+
+    # Frames that cannot be peeked are still decoded and filtered
+    callback = MagicMock()
+    listener = PlexAlertListener(get_fake_server(), callback, filters=["playing"])
+    listener._onMessage(None, '{"NotificationContainer":{"size":1,"type":"progress"}}')
+    listener._onMessage(None, '{"NotificationContainer":{"size":1,"type":"playing"}}')
+    callback.assert_called_once_with({"size": 1, "type": "playing"})
+    assert listener.stats["ignored"] == 1
+
+
+def test_peek_only_with_standard_decoder():
+    callback = MagicMock()
+    listener = PlexAlertListener(get_fake_server(), callback, filters=["playing"])
+    with patch("plex_auto_languages.plex_alert_listener.json_loads", json.loads), \
+            patch.object(PlexAlertListener, "peek_notification_type", wraps=PlexAlertListener.peek_notification_type) as peek:
+        listener._onMessage(None, get_message("progress"))
+        peek.assert_called_once()
+
+    # Faster decoders decode the whole frame instead
+    with patch("plex_auto_languages.plex_alert_listener.json_loads", lambda message: json.loads(message)), \
+            patch.object(PlexAlertListener, "peek_notification_type") as peek:
+        listener._onMessage(None, get_message("progress"))
+        listener._onMessage(None, get_message("playing"))
+        peek.assert_not_called()
+    callback.assert_called_once()
+    assert listener.stats["ignored"] == 2
@@ -1,11 +1,13 @@
+import copy
 import time
 import math
 import pytest
 import requests
-from datetime import datetime
-from unittest.mock import patch
+from datetime import datetime, timedelta
+from unittest.mock import PropertyMock, patch
 from plexapi.video import Episode, Show
 from plexapi.exceptions import BadRequest
+from plexapi.myplex import MyPlexUser
 from plexapi.server import PlexServer as BasePlexServer
 
 from plex_auto_languages.track_changes import TrackChanges, NewOrUpdatedTrackChanges
@@ -24,6 +26,35 @@ def test_episodes(plex):
     assert len(episodes) == 46
 
 
+def test_scan_episodes(plex):
+    episodes = plex.episodes()
+    records = list(plex.scan_episodes())
+    assert {r.key for r in records} == {e.key for e in episodes}
+
+    parallel_records = list(plex.scan_episodes(max_workers=4, container_size=10))
+    assert sorted(parallel_records) == sorted(records)
+
+    episode_parts = {e.key: [p.key for p in e.iterParts()] for e in episodes}
+    assert all(list(r.part_keys) == episode_parts[r.key] for r in records)
+
+
+def test_fetch_items(plex):
+    keys = [e.key for e in plex.episodes()]
+    items = plex.fetch_items(keys, batch_size=10)
+    assert {i.key for i in items} == set(keys)
+    assert all(isinstance(i, Episode) for i in items)
+    assert plex.fetch_items([]) == []
+
+
+def test_episodes_changed_since(plex, episode):
+    episodes = plex.get_episodes_changed_since(datetime.fromtimestamp(0))
+    assert len(episodes) == 46
+    assert episode.key in [e.key for e in episodes]
+
+    episodes = plex.get_episodes_changed_since(datetime.now() + timedelta(days=1))
+    assert len(episodes) == 0
+
+
 def test_fetch_item(plex, episode):
     same_episode = plex.fetch_item(episode.key)
     assert same_episode is not None and isinstance(same_episode, Episode)
@@ -53,12 +84,43 @@ def test_last_watched_or_first(plex, episode):
     last_watched_or_first = plex.get_last_watched_or_first_episode(show)
     assert last_episode == last_watched_or_first
 
+    # Only a single episode is requested per lookup
+    fetch_items = Show.fetchItems
+    with patch.object(Show, "fetchItems", autospec=True, side_effect=fetch_items) as mocked_fetch:
+        plex.get_last_watched_or_first_episode(show)
+        mocked_fetch.assert_called_once()
+        assert mocked_fetch.call_args[1]["maxresults"] == 1
+
+    # An episode of another show is never used as the reference
+    other_show_episode = copy.copy(last_episode)
+    other_show_episode.grandparentRatingKey = -1
+    with patch.object(Show, "fetchItems", autospec=True, side_effect=[[other_show_episode], [first_episode]]) as mocked_fetch:
+        assert plex.get_last_watched_or_first_episode(show) == first_episode
+        assert mocked_fetch.call_args[0][1] == f"{show.key}/allLeaves"
+
     show.markUnplayed()
-    with patch.object(Show, "episodes", return_value=[]):
+    with patch.object(Show, "fetchItems", return_value=[]):
         last_watched_or_first = plex.get_last_watched_or_first_episode(show)
         assert last_watched_or_first is None
 
 
+def test_reference_episode(plex, episode):
+    plex.cache.reference_episodes.clear()
+    with patch.object(UnprivilegedPlexServer, "get_last_watched_or_first_episode", return_value=episode) as mocked_lookup:
+        assert plex.get_reference_episode(plex.user_id, plex, episode).key == episode.key
+        assert plex.get_reference_episode(plex.user_id, plex, episode).key == episode.key
+        mocked_lookup.assert_called_once()
+
+        # Playing an episode of the show invalidates the reference of the user
+        plex.cache.invalidate_reference_episode(plex.user_id, episode.grandparentRatingKey)
+        assert plex.get_reference_episode(plex.user_id, plex, episode).key == episode.key
+        assert mocked_lookup.call_count == 2
+
+    with patch.object(UnprivilegedPlexServer, "get_last_watched_or_first_episode", return_value=None):
+        plex.cache.reference_episodes.clear()
+        assert plex.get_reference_episode(plex.user_id, plex, episode) is None
+
+
 def test_get_selected_streams(plex, episode):
     episode.reload()
     part = episode.media[0].parts[0]
@@ -122,6 +184,13 @@ def test_get_user_by_id(plex):
     assert user is None
 
 
+def test_get_user_by_name(plex):
+    user = plex.get_user_by_name(plex.username)
+    assert user.id == plex.user_id
+
+    assert plex.get_user_by_name("invalid_username") is None
+
+
 def test_should_ignore_show(plex, episode):
     plex.config._config["ignore_labels"] = ["PAL_IGNORE"]
 
@@ -147,6 +216,10 @@ def test_get_plex_instance_of_user(plex):
     new_plex = plex.get_plex_instance_of_user(other_user_id)
     assert plex != new_plex
     assert isinstance(new_plex, UnprivilegedPlexServer)
+    assert plex.get_plex_instance_of_user(other_user_id) is new_plex
+
+    new_plex._unauthorized = True
+    assert plex.get_plex_instance_of_user(other_user_id) is not new_plex
 
     plex.cache._instance_user_tokens.clear()
     other_user_id = plex.get_all_user_ids()[1]
@@ -154,6 +227,15 @@ def test_get_plex_instance_of_user(plex):
     assert plex != new_plex
     assert isinstance(new_plex, UnprivilegedPlexServer)
 
+    # Connection failures keep the token of the user
+    plex._user_servers._validation_interval = 0
+    with patch.object(UnprivilegedPlexServer, "connected", new_callable=PropertyMock, return_value=False), \
+            patch.object(MyPlexUser, "get_token") as mocked_get_token:
+        assert plex.get_plex_instance_of_user(other_user_id) is None
+        mocked_get_token.assert_not_called()
+    plex._user_servers._validation_interval = 600
+    assert plex.get_plex_instance_of_user(other_user_id) is new_plex
+
     new_plex = plex.get_plex_instance_of_user("invalid_user_id")
     assert new_plex is None
 
@@ -162,6 +244,10 @@ def test_get_user_from_client_identifier(plex):
     user_id, username = plex.get_user_from_client_identifier("invalid_client_identifier")
     assert user_id is None and username is None
 
+    plex.session_tracker.track("client_identifier", "1", plex.user_id, plex.username, "/library/metadata/1")
+    user_id, username = plex.get_user_from_client_identifier("client_identifier")
+    assert user_id == plex.user_id and username == plex.username
+
 
 def test_is_alive(plex):
     assert plex.is_alive is False
@@ -225,6 +311,9 @@ def test_process_new_or_updated_episode(plex, episode):
     part.setDefaultAudioStream(english_audio)
     english_sub = [sub for sub in part.subtitleStreams() if sub.languageCode == "eng"][0]
     part.setDefaultSubtitleStream(english_sub)
+    plex.cache.selection_ledger.clear()
+    plex.cache.language_preferences.clear()
+    plex.cache.reference_episodes.clear()
 
     # The mocked function must be called once per user
     with patch.object(NewOrUpdatedTrackChanges, "change_track_for_user") as mocked_change_track:
@@ -239,6 +328,57 @@ def test_process_new_or_updated_episode(plex, episode):
     assert selected_audio.languageCode == "fra"
     assert selected_sub.languageCode == "fra"
 
+    # The stored preference is used instead of a reference episode
+    assert plex.cache.language_preferences.get(plex.user_id, show.ratingKey).audio.languageCode == "fra"
+    with patch.object(PlexServer, "get_reference_episode") as mocked_reference:
+        plex.process_new_or_updated_episode(last_episode.key, EventType.NEW_EPISODE, True)
+        mocked_reference.assert_not_called()
+
+
+def test_process_new_or_updated_episodes_for_users(plex, episode, caplog):
+    user_ids = ["user1", "user2", "user3"]
+    with patch.object(PlexServer, "get_all_user_ids", return_value=user_ids):
+        # Users are processed concurrently
+        plex.config._config["track_changes"]["user_workers"] = 3
+        with patch.object(PlexServer, "_process_new_or_updated_episodes_for_user",
+                          side_effect=lambda *_: time.sleep(0.5)) as mocked_process:
+            start = time.monotonic()
+            plex.process_new_or_updated_episodes([episode.key], EventType.NEW_EPISODE, True)
+            assert time.monotonic() - start < 1
+            assert sorted(call[0][0] for call in mocked_process.call_args_list) == user_ids
+
+        # Errors of a user do not prevent the others from being processed
+        def process_user(user_id, *_):
+            if user_id == "user2":
+                raise Exception("Unable to process the user")
+        with patch.object(PlexServer, "_process_new_or_updated_episodes_for_user", side_effect=process_user) as mocked_process:
+            plex.process_new_or_updated_episodes([episode.key], EventType.NEW_EPISODE, True)
+            assert mocked_process.call_count == 3
+
+        # Changes of the users processed before an error are notified before the error is raised
+        def process_user_with_changes(user_id, item_ids, get_episode_changes, stop_event):
+            if user_id == "user2":
+                raise Exception("Unable to process the user")
+            get_episode_changes(item_ids[0])
+        plex.config._config["track_changes"]["isolate_user_errors"] = False
+        with patch.object(PlexServer, "_process_new_or_updated_episodes_for_user", side_effect=process_user_with_changes), \
+                patch.object(NewOrUpdatedTrackChanges, "has_changes", new_callable=PropertyMock, return_value=True), \
+                patch.object(PlexServer, "notify_changes") as mocked_notify:
+            with pytest.raises(Exception):
+                plex.process_new_or_updated_episodes([episode.key], EventType.NEW_EPISODE, True)
+            mocked_notify.assert_called_once()
+        plex.config._config["track_changes"]["isolate_user_errors"] = True
+
+        # Slow users are not waited for, they stop before their next episode
+        plex.config._config["track_changes"]["user_timeout"] = 0.2
+        with patch.object(PlexServer, "_process_new_or_updated_episodes_for_user",
+                          side_effect=lambda user_id, item_ids, get_episode_changes, stop_event: stop_event.wait(1)):
+            start = time.monotonic()
+            plex.process_new_or_updated_episodes([episode.key], EventType.NEW_EPISODE, True)
+            assert time.monotonic() - start < 0.8
+            assert "timed out" in caplog.text
+        plex.config._config["track_changes"]["user_timeout"] = 300
+
 
 def test_change_tracks(plex, episode):
     show = episode.show()
@@ -259,11 +399,15 @@ def test_change_tracks(plex, episode):
     part.setDefaultAudioStream(english_audio)
     english_sub = [sub for sub in part.subtitleStreams() if sub.languageCode == "eng"][0]
     part.setDefaultSubtitleStream(english_sub)
+    plex.cache.selection_ledger.clear()
 
     # The mocked function must be called once
     with patch.object(TrackChanges, "apply") as mocked_apply:
         plex.change_tracks(plex.username, first_episode, EventType.PLAY_OR_ACTIVITY)
         mocked_apply.assert_called_once()
+    preference = plex.cache.language_preferences.get(plex.user_id, show.ratingKey)
+    assert preference.audio.languageCode == "fra"
+    assert preference.subtitle.languageCode == "fra"
 
     # The function must update the language of the second episode
     plex.change_tracks(plex.username, first_episode, EventType.PLAY_OR_ACTIVITY)
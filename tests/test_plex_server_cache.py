@@ -1,6 +1,5 @@
 import os
-import copy
-from datetime import datetime
+from datetime import datetime, timedelta
 from unittest.mock import patch
 
 from plex_auto_languages.plex_server_cache import PlexServerCache
@@ -10,6 +9,7 @@ class FakeUser():
 
     def __init__(self, user_id):
         self.id = user_id
+        self.name = f"name_{user_id}"
 
     def get_token(self, machine_identifier):
         return "token"
@@ -24,6 +24,23 @@ def test_is_refreshing(plex):
     assert plex.cache.refresh_library_cache() == ([], [])
 
 
+def test_is_refreshing_keeps_scanned_sections():
+    mocked_path = "/tmp/mocked_cache_scanned_sections"
+    if os.path.exists(mocked_path):
+        os.remove(mocked_path)
+
+    with patch.object(PlexServerCache, "_get_cache_file_path", return_value=mocked_path):
+        with patch.object(PlexServerCache, "refresh_library_cache"):
+            cache = PlexServerCache(None)
+        cache._is_refreshing = True
+        cache.mark_section_scanned("1")
+        cache.mark_section_scanned("2")
+        assert cache.refresh_library_cache(section_ids=cache.pop_scanned_sections()) == ([], [])
+        # The sections are refreshed by the next refresh
+        assert cache.pop_scanned_sections() == {"1", "2"}
+        cache.close()
+
+
 def test_cache_dir(plex):
     mocked_path = "/tmp/mocked_cache_dir"
     plex.config._config["data_dir"] = mocked_path
@@ -46,15 +63,19 @@ def test_load_save():
     with patch.object(PlexServerCache, "_get_cache_file_path", return_value=mocked_path):
         with patch.object(PlexServerCache, "refresh_library_cache") as mocked_refresh:
             cache = PlexServerCache(None)
-            mocked_refresh.assert_called_once()
+            # The initial scan does not fetch the episodes of the whole library
+            mocked_refresh.assert_called_once_with(full=True, fetch=False)
 
             mocked_refresh.reset_mock()
-            old_episode_parts = copy.deepcopy(cache.episode_parts)
+            cache.episode_parts["/library/metadata/1"] = ["/library/parts/1"]
+            old_episode_parts = dict(cache.episode_parts)
             cache.save()
+            cache.close()
             cache = PlexServerCache(None)
             mocked_refresh.assert_not_called()
 
-            assert old_episode_parts == cache.episode_parts
+            assert old_episode_parts == dict(cache.episode_parts)
+            cache.close()
 
             with open(mocked_path, "w") as stream:
                 stream.write("Not a JSON object")
@@ -62,7 +83,7 @@ def test_load_save():
             mocked_refresh.reset_mock()
             cache = PlexServerCache(None)
             mocked_refresh.assert_called_once()
-            assert not os.path.exists(mocked_path)
+            assert len(cache.episode_parts) == 0
 
 
 def test_instance_users(plex):
@@ -71,11 +92,15 @@ def test_instance_users(plex):
 
     plex.cache.set_instance_users([FakeUser("user1"), FakeUser("user2")])
     assert len(plex.cache.get_instance_users()) == 2
+    registry = plex.cache.get_instance_user_registry()
+    assert registry.get_by_id("user2").name == "name_user2"
     user1_token = plex.cache.get_instance_user_token("user1")
     assert user1_token is not None
 
     plex.cache.set_instance_users([FakeUser("user1")])
     assert len(plex.cache.get_instance_users()) == 1
+    assert registry.get_by_id("user2") is not None
+    assert plex.cache.get_instance_user_registry().get_by_id("user2") is None
     assert plex.cache.get_instance_user_token("user1") == user1_token
 
 
@@ -94,7 +119,7 @@ def test_refresh(plex):
     del plex.cache.episode_parts[first_key]
     plex.cache.episode_parts[second_key] = []
 
-    added, updated = plex.cache.refresh_library_cache()
+    added, updated = plex.cache.refresh_library_cache(full=True)
 
     added_keys = [episode.key for episode in added]
     assert added_keys == [first_key]
@@ -103,6 +128,61 @@ def test_refresh(plex):
     assert updated_keys == [second_key]
 
 
+def test_refresh_without_fetch(plex):
+    keys = list(plex.cache.episode_parts.keys())
+    del plex.cache.episode_parts[keys[0]]
+
+    with patch.object(PlexServerCache, "_fetch_episodes") as mocked_fetch:
+        assert plex.cache.refresh_library_cache(full=True, fetch=False) == ([], [])
+        mocked_fetch.assert_not_called()
+    assert keys[0] in plex.cache.episode_parts
+
+
+def test_incremental_refresh(plex):
+    keys = list(plex.cache.episode_parts.keys())
+    assert len(keys) > 1
+    first_key = keys[0]
+    second_key = keys[1]
+
+    del plex.cache.episode_parts[first_key]
+    plex.cache.episode_parts[second_key] = []
+    plex.cache._last_refresh = datetime.fromtimestamp(0)
+
+    added, updated = plex.cache.refresh_library_cache(full=False)
+
+    added_keys = [episode.key for episode in added]
+    assert added_keys == [first_key]
+
+    updated_keys = [episode.key for episode in updated]
+    assert updated_keys == [second_key]
+    assert len(plex.cache.episode_parts) == 46
+
+
+def test_full_refresh_interval(plex):
+    plex.cache._last_full_refresh = datetime.now()
+    with patch.object(PlexServerCache, "_full_refresh", return_value=([], [])) as mocked_full_refresh:
+        with patch.object(PlexServerCache, "_incremental_refresh", return_value=([], [])) as mocked_incremental_refresh:
+            plex.config._config["library_cache"]["incremental_refresh"] = True
+            plex.cache._section_states = {}
+            plex.cache.refresh_library_cache()
+            mocked_full_refresh.assert_not_called()
+            mocked_incremental_refresh.assert_called_once()
+
+            mocked_incremental_refresh.reset_mock()
+            plex.cache._last_full_refresh = datetime.now() - timedelta(hours=25)
+            plex.cache._section_states = {}
+            plex.cache.refresh_library_cache()
+            mocked_full_refresh.assert_called_once()
+            mocked_incremental_refresh.assert_not_called()
+
+            mocked_full_refresh.reset_mock()
+            plex.config._config["library_cache"]["incremental_refresh"] = False
+            plex.cache._section_states = {}
+            plex.cache.refresh_library_cache()
+            mocked_full_refresh.assert_called_once()
+            mocked_incremental_refresh.assert_not_called()
+
+
 def test_should_process_recently_added(plex):
     now = datetime.now()
     assert plex.cache.should_process_recently_added("123456", now) is True
@@ -114,3 +194,69 @@ def test_should_process_recently_updated(plex):
     assert plex.cache.should_process_recently_updated("123456") is False
     plex.cache.refresh_library_cache()
     assert plex.cache.should_process_recently_updated("123456") is True
+
+
+def test_is_episode_candidate(plex, episode):
+    show_section = plex.get_show_sections()[0]
+    plex.cache.refresh_section_types()
+    assert plex.cache.get_section_type(show_section.key) == "show"
+
+    assert plex.cache.is_episode_candidate(episode.key) is True
+    assert plex.cache.is_episode_candidate("/library/metadata/999999") is True
+    assert plex.cache.is_episode_candidate("/library/metadata/999999", show_section.key) is True
+
+    # Negative lookups are cached
+    plex.cache.set_item_type("/library/metadata/999999", "track")
+    assert plex.cache.is_episode_candidate("/library/metadata/999999") is False
+    plex.cache.section_types["999"] = "artist"
+    assert plex.cache.is_episode_candidate("/library/metadata/999998", "999") is False
+    assert plex.cache.get_stats()["rejected_items"] == 2
+
+    # Unknown sections are only looked up once in a while
+    with patch.object(PlexServerCache, "refresh_section_types") as mocked_refresh:
+        assert plex.cache.get_section_type("998") is None
+        mocked_refresh.assert_not_called()
+    plex.cache.item_types.clear()
+    plex.cache.refresh_section_types()
+
+
+def test_section_scoped_refresh(plex):
+    show_section = plex.get_show_sections()[0]
+    assert plex.cache.episode_sections[list(plex.cache.episode_parts.keys())[0]] == str(show_section.key)
+
+    with patch.object(PlexServerCache, "_full_refresh", return_value=([], [])) as mocked_full_refresh:
+        with patch.object(PlexServerCache, "_incremental_refresh", return_value=([], [])) as mocked_incremental_refresh:
+            plex.config._config["library_cache"]["incremental_refresh"] = True
+            plex.cache._last_full_refresh = datetime.now()
+
+            # Sections whose content did not change are skipped
+            plex.cache.refresh_library_cache()
+            mocked_incremental_refresh.assert_not_called()
+
+            # Only the scanned sections are refreshed
+            plex.cache._section_states = {}
+            plex.cache.mark_section_scanned("999")
+            plex.cache.refresh_library_cache(section_ids=plex.cache.pop_scanned_sections())
+            mocked_incremental_refresh.assert_not_called()
+            assert plex.cache.pop_scanned_sections() is None
+
+            plex.cache.mark_section_scanned(show_section.key)
+            plex.cache.refresh_library_cache(section_ids=plex.cache.pop_scanned_sections())
+            mocked_incremental_refresh.assert_called_once()
+            assert [s.key for s in mocked_incremental_refresh.call_args[0][0]] == [show_section.key]
+            mocked_full_refresh.assert_not_called()
+
+
+def test_removed_section_purge(plex):
+    episode_key = list(plex.cache.episode_parts.keys())[0]
+    plex.cache.episode_parts["/library/metadata/removed"] = ["/library/parts/removed"]
+    plex.cache.episode_sections["/library/metadata/removed"] = "999"
+    plex.cache._section_states["999"] = {"version": None, "last_refresh": datetime.now().isoformat()}
+
+    # Episodes of libraries that no longer exist are dropped on the next refresh
+    with patch.object(PlexServerCache, "_incremental_refresh", return_value=([], [])):
+        plex.cache.refresh_library_cache(full=False)
+    assert "/library/metadata/removed" not in plex.cache.episode_parts
+    assert "/library/metadata/removed" not in plex.cache.episode_sections
+    assert "999" not in plex.cache._section_states
+    assert episode_key in plex.cache.episode_parts
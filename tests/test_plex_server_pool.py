@@ -0,0 +1,71 @@
+import pytest
+from unittest.mock import patch
+from plexapi.exceptions import Unauthorized
+
+from plex_auto_languages.plex_server_pool import PlexServerPool
+
+
+class FakeServer():
+
+    def __init__(self, token):
+        self.token = token
+        self.connected_calls = 0
+        self.is_connected = token not in ["invalid_token", "revoked_token"]
+        self.unauthorized = token == "revoked_token"
+
+    @property
+    def connected(self):
+        self.connected_calls += 1
+        return self.is_connected
+
+
+def test_pool_reuse():
+    pool = PlexServerPool(FakeServer)
+    server = pool.get("user1", "token")
+    assert server is not None
+    assert server.connected_calls == 1
+
+    # The connection is not checked again within the validation interval
+    assert pool.get("user1", "token") is server
+    assert pool.get(1, "token") is not server
+    assert server.connected_calls == 1
+    assert pool.stats["hits"] == 1
+
+    assert pool.get("user2", "invalid_token") is None
+
+
+def test_pool_validation():
+    pool = PlexServerPool(FakeServer, validation_interval=60)
+    with patch("time.monotonic", return_value=1000):
+        server = pool.get("user1", "token")
+    with patch("time.monotonic", return_value=1100):
+        assert pool.get("user1", "token") is server
+        assert server.connected_calls == 2
+
+        # Connection failures do not drop the connection, it is checked again on the next call
+        server.is_connected = False
+    with patch("time.monotonic", return_value=1200):
+        assert pool.get("user1", "token") is None
+        server.is_connected = True
+        assert pool.get("user1", "token") is server
+        assert server.connected_calls == 4
+
+
+def test_pool_invalidation():
+    pool = PlexServerPool(FakeServer)
+    server = pool.get("user1", "token")
+    server.unauthorized = True
+    with pytest.raises(Unauthorized):
+        pool.get("user1", "token")
+    new_server = pool.get("user1", "token")
+    assert new_server is not server
+
+    # Revoked tokens are reported to get a new one
+    with pytest.raises(Unauthorized):
+        pool.get("user2", "revoked_token")
+
+    pool.invalidate("user1")
+    assert pool.get("user1", "token") is not new_server
+
+    pool.clear()
+    assert pool.stats["size"] == 0
@@ -0,0 +1,35 @@
+from types import SimpleNamespace
+
+from plex_auto_languages.utils.preference_store import PreferenceStore, AudioSignature, SubtitleSignature
+
+
+def test_preference_store(store):
+    preferences = PreferenceStore(store)
+    assert preferences.get(1, 100) is None
+
+    audio = SimpleNamespace(languageCode="fra", codec="ac3", audioChannelLayout="5.1", channels=6, title=None,
+                            displayTitle="Français (AC3 5.1)")
+    subtitle = SimpleNamespace(languageCode="eng", forced=True, codec="srt", title="Forced", displayTitle="English (SRT)")
+    preferences.set(1, 100, audio, subtitle)
+    preference = preferences.get(1, 100)
+    assert preference.audio == AudioSignature("fra", "ac3", "5.1", 6, None, "Français (AC3 5.1)")
+    assert preference.subtitle == SubtitleSignature("eng", True, "srt", "Forced", "English (SRT)")
+    assert preferences.get(2, 100) is None
+
+    # Signatures can be used in place of the streams
+    assert preference.audio.languageCode == audio.languageCode
+    assert preference.subtitle.forced is True
+
+    # No subtitles selected
+    preferences.set(1, 100, audio, None)
+    assert preferences.get(1, 100).subtitle is None
+
+    # The preferences are persisted in the store
+    assert PreferenceStore(store).get(1, 100).audio.codec == "ac3"
+    assert preferences.stats == {"size": 1, "hits": 2, "misses": 2}
+
+    preferences.delete(1, 100)
+    assert preferences.get(1, 100) is None
+    preferences.set(1, 100, None, None)
+    preferences.clear()
+    assert preferences.stats["size"] == 0
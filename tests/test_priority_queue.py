@@ -0,0 +1,59 @@
+from queue import Empty
+import pytest
+
+from plex_auto_languages.utils.priority_queue import BoundedPriorityQueue
+
+
+def test_priority_queue():
+    queue = BoundedPriorityQueue(10)
+    queue.put("timeline_1", 2)
+    queue.put("playing", 0)
+    queue.put("timeline_2", 2)
+    queue.put("activity", 1)
+    assert len(queue) == 4
+    assert [queue.get(False) for _ in range(4)] == ["playing", "activity", "timeline_1", "timeline_2"]
+    with pytest.raises(Empty):
+        queue.get(True, 0.1)
+
+
+def test_priority_queue_drop_new():
+    queue = BoundedPriorityQueue(2, BoundedPriorityQueue.DROP_NEW)
+    assert queue.put("a", 1) is True
+    assert queue.put("b", 1) is True
+    assert queue.put("c", 0) is False
+    assert queue.stats["priorities"][0]["dropped"] == 1
+    assert queue.get(False) == "a"
+
+
+def test_priority_queue_drop_lowest():
+    queue = BoundedPriorityQueue(2, BoundedPriorityQueue.DROP_LOWEST)
+    assert queue.put("a", 1) is True
+    assert queue.put("b", 2) is True
+    assert queue.put("c", 3) is False
+    assert queue.put("d", 0) is True
+    stats = queue.stats
+    assert stats["size"] == 2
+    assert stats["priorities"][2] == {"depth": 0, "oldest_age": 0, "dropped": 1}
+    assert stats["priorities"][3]["dropped"] == 1
+    assert stats["priorities"][1]["oldest_age"] > 0
+    assert [queue.get(False), queue.get(False)] == ["d", "a"]
+
+
+def test_priority_queue_protected_priorities():
+    queue = BoundedPriorityQueue(2, BoundedPriorityQueue.DROP_LOWEST, protected_priorities=[3])
+    assert queue.put("a", 1) is True
+    assert queue.put("task", 3) is True
+
+    # Protected items are never evicted, the next least urgent priority is evicted instead
+    assert queue.put("b", 0) is True
+    assert queue.stats["priorities"][1]["dropped"] == 1
+    # With only protected items left to evict, the new item is rejected
+    assert queue.put("other_task", 3) is False
+    assert queue.stats["priorities"][3]["depth"] == 1
+    assert queue.stats["priorities"][3]["dropped"] == 1
+    assert [queue.get(False), queue.get(False)] == ["b", "task"]
+
+
+def test_priority_queue_invalid_policy():
+    with pytest.raises(ValueError):
+        _ = BoundedPriorityQueue(10, "drop_oldest")
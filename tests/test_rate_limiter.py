@@ -0,0 +1,20 @@
+import time
+
+from plex_auto_languages.utils.rate_limiter import TokenBucket
+
+
+def test_token_bucket():
+    bucket = TokenBucket(20, burst=5)
+    start = time.monotonic()
+    for _ in range(15):
+        bucket.acquire()
+    # The first 5 tokens are available immediately, the next 10 are refilled at 20 per second
+    assert 0.4 <= time.monotonic() - start < 1
+
+
+def test_token_bucket_disabled():
+    bucket = TokenBucket(0)
+    start = time.monotonic()
+    for _ in range(1000):
+        bucket.acquire()
+    assert time.monotonic() - start < 0.5
@@ -0,0 +1,35 @@
+from datetime import datetime, timedelta
+
+from plex_auto_languages.utils.selection_ledger import SelectionLedger
+
+
+def test_selection_ledger(store):
+    ledger = SelectionLedger(store)
+    updated_at = datetime.now().replace(microsecond=0)
+    assert ledger.matches(1, 10, "signature", updated_at, (100, None)) is False
+
+    ledger.record(1, 10, "signature", 100, None, updated_at)
+    assert ledger.matches(1, 10, "signature", updated_at, (100, None)) is True
+    assert ledger.matches(1, 10, "signature", updated_at - timedelta(hours=1), (100, None)) is True
+
+    # The part has been updated or the reference changed since the selection was applied
+    assert ledger.matches(1, 10, "signature", updated_at + timedelta(seconds=1), (100, None)) is False
+    assert ledger.matches(1, 10, "other_signature", updated_at, (100, None)) is False
+    assert ledger.matches(2, 10, "signature", updated_at, (100, None)) is False
+    assert ledger.matches(1, 10, "signature", None, (100, None)) is False
+
+    # The selected streams of the part are only compared when they are known
+    assert ledger.matches(1, 10, "signature", updated_at) is True
+
+    # The streams of the part have been changed by the user since the selection was applied
+    assert ledger.matches(1, 10, "signature", updated_at, (101, None)) is False
+    assert ledger.matches(1, 10, "signature", updated_at, (100, 102)) is False
+
+    ledger.record_many([(1, 11, "signature", 101, 102, updated_at), (2, 10, "signature", 100, None, updated_at)])
+    assert ledger.stats == {"size": 3, "hits": 3, "misses": 7}
+
+    # The ledger is persisted in the store
+    assert SelectionLedger(store).matches(2, 10, "signature", updated_at, (100, None)) is True
+
+    ledger.clear()
+    assert ledger.stats["size"] == 0
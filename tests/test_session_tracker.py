@@ -0,0 +1,69 @@
+from unittest.mock import MagicMock
+
+from plex_auto_languages.session_tracker import SessionTracker
+
+
+class FakeUser():
+
+    def __init__(self, user_id, name):
+        self.id = user_id
+        self.name = name
+
+
+class FakePlayer():
+
+    def __init__(self, machine_identifier, user_id):
+        self.machineIdentifier = machine_identifier
+        self.userID = user_id
+
+
+class FakeSession():
+
+    def __init__(self, session_key, key, players):
+        self.sessionKey = session_key
+        self.key = key
+        self.players = players
+
+
+def get_fake_plex(sessions):
+    users = {1: FakeUser(1, "user1"), 2: FakeUser(2, "user2")}
+    plex = MagicMock()
+    plex.get_sessions.return_value = sessions
+    plex.get_user_by_id.side_effect = users.get
+    return plex
+
+
+def test_session_tracker():
+    plex = get_fake_plex([
+        FakeSession(1, "/library/metadata/1", [FakePlayer("client1", 1)]),
+        FakeSession(2, "/library/metadata/2", [FakePlayer("client2", 2), FakePlayer("client3", 3)])
+    ])
+    tracker = SessionTracker(plex)
+
+    # All the sessions are fetched at once
+    assert tracker.get_user("client1") == (1, "user1")
+    assert tracker.get_user("client2") == (2, "user2")
+    assert plex.get_sessions.call_count == 1
+    assert tracker.get_session("2") == (2, "user2", "/library/metadata/2")
+
+    # Unknown clients only trigger a single refresh
+    assert tracker.get_user("client3") == (None, None)
+    assert tracker.get_user("client3") == (None, None)
+    assert plex.get_sessions.call_count == 2
+    assert tracker.stats["refresh_count"] == 2
+
+    # Session keys take precedence over client identifiers
+    tracker.track("client4", "4", 2, "user2", "/library/metadata/4")
+    assert tracker.get_user("unknown_client", "4") == (2, "user2")
+    assert plex.get_sessions.call_count == 2
+
+    # New sessions of a known client are looked up instead of being attributed to the previous user
+    plex.get_sessions.return_value = [FakeSession(5, "/library/metadata/5", [FakePlayer("client1", 2)])]
+    assert tracker.get_user("client1", "5") == (2, "user2")
+    assert plex.get_sessions.call_count == 3
+    assert tracker.get_user("client1", "6") == (None, None)
+    assert tracker.get_user("client1", "6") == (None, None)
+    assert plex.get_sessions.call_count == 4
+
+    tracker.clear()
+    assert tracker.get_session("4") is None
@@ -0,0 +1,96 @@
+import pytest
+from datetime import datetime
+from dateutil.parser import isoparse
+
+from plex_auto_languages.utils.sqlite_store import SQLiteStore, SQLiteDict
+
+
+def test_store_values(store):
+    assert store.get_value("value") is None
+    assert store.get_value("value", 42) == 42
+    store.set_value("value", {"key": [1, 2]})
+    assert store.get_value("value") == {"key": [1, 2]}
+    assert store.execute("PRAGMA journal_mode")[0][0] == "wal"
+
+
+def test_store_transaction(store):
+    with pytest.raises(ValueError):
+        with store.transaction():
+            store.set_value("value", 1)
+            raise ValueError()
+    assert store.get_value("value") is None
+
+    with store.transaction():
+        with store.transaction():
+            store.set_value("value", 1)
+        store.set_value("other_value", 2)
+    assert store.get_value("value") == 1
+    assert store.get_value("other_value") == 2
+
+
+def test_sqlite_dict(store):
+    data = SQLiteDict(store, "data")
+    assert len(data) == 0
+    assert "key" not in data
+    with pytest.raises(KeyError):
+        _ = data["key"]
+    with pytest.raises(KeyError):
+        del data["key"]
+
+    data["key"] = ["value1", "value2"]
+    assert "key" in data
+    assert data["key"] == ["value1", "value2"]
+    assert data.get("other_key", None) is None
+
+    data.update({"key1": [], "key2": ["value"]})
+    assert len(data) == 3
+    assert set(data) == {"key", "key1", "key2"}
+    assert sorted(data.items()) == [("key", ["value1", "value2"]), ("key1", []), ("key2", ["value"])]
+
+    data.delete_many(["key1", "key2"])
+    assert list(data) == ["key"]
+
+    del data["key"]
+    assert len(data) == 0
+
+    data.update({"key1": [], "key2": ["value"]})
+    data.clear()
+    assert len(data) == 0
+
+
+def test_sqlite_dict_persistence(store):
+    now = datetime.now()
+    data = SQLiteDict(store, "dates", datetime.isoformat, isoparse)
+    data["key"] = now
+
+    other_store = SQLiteStore(store.path)
+    other_data = SQLiteDict(other_store, "dates", datetime.isoformat, isoparse)
+    assert other_data["key"] == now
+    other_store.close()
+
+
+def test_sqlite_dict_queries(store):
+    parts = SQLiteDict(store, "parts")
+    sections = SQLiteDict(store, "sections")
+    parts.update({f"key{index}": [f"part{index}"] for index in range(1200)})
+    sections.update({f"key{index}": str(index % 3) for index in range(1200)})
+
+    # Keys are fetched in batches, unknown keys are omitted
+    values = parts.get_many([f"key{index}" for index in range(1000, 1300)])
+    assert len(values) == 200
+    assert values["key1000"] == ["part1000"]
+
+    with store.temporary_keys("seen") as seen_table:
+        store.add_temporary_keys("seen", [f"key{index}" for index in range(1195)])
+        store.add_temporary_keys("seen", ["key0"])
+        assert sorted(parts.missing_keys(seen_table)) == [f"key{index}" for index in range(1195, 1200)]
+        assert sorted(parts.missing_keys(seen_table, sections, ["0", "1"])) == ["key1195", "key1197", "key1198"]
+    assert len(store.execute("SELECT name FROM sqlite_temp_master WHERE name = 'seen'")) == 0
+
+    assert len(sections.keys_with_values(["0", "1"])) == 800
+    assert sorted(sections.keys_with_values(["0", "1"], exclude=True))[:2] == ["key1001", "key1004"]
+    assert len(sections.keys_with_values(["0", "1", "2"], exclude=True)) == 0
+
+    query, parameters = sections.keys_with_values_query(["0", "1"], exclude=True)
+    assert "NOT IN (?,?)" in query
+    assert len(parameters) == 2
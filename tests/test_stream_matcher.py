@@ -0,0 +1,75 @@
+from plex_auto_languages.stream_matcher import StreamMatcher
+
+
+class SubtitleStream():
+
+    def __init__(self, languageCode, codec, title, forced):
+        self.languageCode = languageCode
+        self.codec = codec
+        self.title = title
+        self.forced = forced
+
+
+class AudioStream():
+
+    def __init__(self, languageCode, codec, title, audioChannelLayout, channels):
+        self.languageCode = languageCode
+        self.codec = codec
+        self.title = title
+        self.audioChannelLayout = audioChannelLayout
+        self.channels = channels
+
+
+AUDIO_STREAMS = [
+    AudioStream("eng", "ac3", "English", "5.1", 6),
+    AudioStream("eng", "ac3", "English", "7.1", 8),
+    AudioStream("eng", "ac3", "English with another title", "5.1", 6),
+    AudioStream("eng", "truehd", "English", "5.1", 6),
+    AudioStream("fre", "truehd", "French TrueHD", "7.1", 8),
+    AudioStream("fre", "truehd", "", "7.1", 8),
+    AudioStream("fre", "truehd", "", "5.1", 6)
+]
+
+SUBTITLE_STREAMS = [
+    SubtitleStream("eng", "srt", "English", False),
+    SubtitleStream("eng", "srt", "English (Forced)", True),
+    SubtitleStream("spa", "srt", "Spanish", False),
+    SubtitleStream("spa", "srt", "Spanish (Forced)", True),
+    SubtitleStream("fra", "srt", "French", False)
+]
+
+
+def test_match_audio_stream():
+    assert StreamMatcher(AudioStream("eng", "ac3", "English", "5.1", 6), None).match_audio_stream(AUDIO_STREAMS) == 0
+    assert StreamMatcher(AudioStream("eng", "truehd", "English", "7.1", 8), None).match_audio_stream(AUDIO_STREAMS) == 3
+    assert StreamMatcher(AudioStream("fre", "truehd", "French", "7.1", 8), None).match_audio_stream(AUDIO_STREAMS) == 4
+    assert StreamMatcher(AudioStream("ger", "ac3", "German", "5.1", 6), None).match_audio_stream(AUDIO_STREAMS) is None
+    assert StreamMatcher(None, None).match_audio_stream(AUDIO_STREAMS) is None
+
+
+def test_match_subtitle_stream():
+    audio = AudioStream("eng", "ac3", "English", "5.1", 6)
+    assert StreamMatcher(audio, SubtitleStream("fra", "srt", "", False)).match_subtitle_stream(SUBTITLE_STREAMS) == 4
+    assert StreamMatcher(audio, SubtitleStream("spa", "srt", "", True)).match_subtitle_stream(SUBTITLE_STREAMS) == 3
+    assert StreamMatcher(audio, None).match_subtitle_stream(SUBTITLE_STREAMS) == 1
+
+    audio = AudioStream("fra", "ac3", "French", "5.1", 6)
+    assert StreamMatcher(audio, None).match_subtitle_stream(SUBTITLE_STREAMS) is None
+    assert StreamMatcher(None, None).match_subtitle_stream(SUBTITLE_STREAMS) is None
+
+
+def test_memoized_decisions():
+    matcher = StreamMatcher(AudioStream("eng", "truehd", "English", "7.1", 8), SubtitleStream("spa", "srt", "", True))
+    assert matcher.match_audio_stream(AUDIO_STREAMS) == 3
+    assert matcher.match_subtitle_stream(SUBTITLE_STREAMS) == 3
+    assert matcher.stats == {"layouts": 2, "hits": 0, "misses": 2}
+
+    # Parts with the same layout reuse the decision, even though the stream objects differ
+    same_layout = [AudioStream(s.languageCode, s.codec, s.title, s.audioChannelLayout, s.channels) for s in AUDIO_STREAMS]
+    assert matcher.match_audio_stream(same_layout) == 3
+    assert matcher.stats == {"layouts": 2, "hits": 1, "misses": 2}
+
+    # A different layout is scored again
+    assert matcher.match_audio_stream(list(reversed(AUDIO_STREAMS))) == 3
+    assert matcher.match_audio_stream(AUDIO_STREAMS[:3]) == 1
+    assert matcher.stats == {"layouts": 4, "hits": 1, "misses": 4}
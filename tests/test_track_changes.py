@@ -1,7 +1,13 @@
-from unittest.mock import patch
+import time
+from datetime import datetime
+from unittest.mock import MagicMock, patch
+from concurrent.futures import ThreadPoolExecutor
 
 from plex_auto_languages.constants import EventType
 from plex_auto_languages.track_changes import TrackChanges, NewOrUpdatedTrackChanges
+from plex_auto_languages.utils.rate_limiter import TokenBucket
+from plex_auto_languages.utils.selection_ledger import SelectionLedger
+from plex_auto_languages.utils.preference_store import AudioSignature, SubtitleSignature, LanguagePreference
 
 
 class SubtitleStream():
@@ -106,7 +112,14 @@ def test_track_changes(plex, show):
     assert len(episodes) == 1
     assert episodes[0].key == next_episode.key
 
-    changes.compute(episodes)
+    # Episodes are fetched in batches
+    fetch_items = type(plex._plex).fetchItems
+    with patch.object(type(plex._plex), "fetchItems", autospec=True, side_effect=fetch_items) as mocked_fetch:
+        changes.compute(episodes + [episode], plex, batch_size=1)
+        assert mocked_fetch.call_count == 2
+    assert changes.change_count == 2
+
+    changes.compute(episodes, plex)
 
     assert changes.description != ""
     assert changes.title != ""
@@ -137,7 +150,7 @@ def test_new_or_updated_track_changes(plex, show):
     new_episode = season_one_episodes[-1]
 
     with patch.object(TrackChanges, "apply") as mocked_apply:
-        changes.change_track_for_user(plex.username, reference, new_episode)
+        changes.change_track_for_user(plex.username, reference, new_episode, server=plex)
         mocked_apply.assert_called_once()
 
     assert changes.episode_name != ""
@@ -167,3 +180,225 @@ def test_get_episodes_to_update(plex, show):
 
     episodes = changes.get_episodes_to_update("season", "next")
     assert {e.key for e in episodes} == {e.key for e in season_one_episodes} - keys_before
+
+
+class FakePart():
+
+    def __init__(self, fail=False):
+        self.fail = fail
+        self.calls = []
+
+    def setDefaultAudioStream(self, stream):
+        if self.fail:
+            raise Exception("Unable to update the stream")
+        time.sleep(0.05)
+        self.calls.append(("audio", stream))
+
+    def setDefaultSubtitleStream(self, stream):
+        self.calls.append(("subtitle", stream))
+
+    def resetDefaultSubtitleStream(self):
+        self.calls.append(("subtitle", None))
+
+
+class FakeEpisode():
+
+    def __init__(self, key="/library/metadata/1", parts=()):
+        self.key = key
+        self.ratingKey = key.split("/")[-1]
+        self.seasonNumber = 1
+        self.episodeNumber = int(self.ratingKey)
+        self.updatedAt = datetime(2023, 1, 1)
+        self.grandparentRatingKey = 1
+        self.parts = list(parts)
+
+    def audioStreams(self):
+        return []
+
+    def subtitleStreams(self):
+        return []
+
+    def iterParts(self):
+        return iter(self.parts)
+
+    def show(self):
+        return FakeShow()
+
+
+class FakeShow():
+
+    title = "show"
+
+
+def test_apply():
+    changes = TrackChanges("username", FakeEpisode(), EventType.NEW_EPISODE)
+    parts = [FakePart() for _ in range(10)]
+    failing_part = FakePart(fail=True)
+    changes._changes = [("episode", part, 2, "audio_stream") for part in parts + [failing_part]]
+    changes._changes.append(("episode", parts[0], 3, None))
+    changes._changes.append(("episode", parts[1], 3, "subtitle_stream"))
+
+    # Changes are applied concurrently
+    start = time.monotonic()
+    changes.apply(max_workers=10, rate_limiter=TokenBucket(1000))
+    assert time.monotonic() - start < 0.4
+    assert all(("audio", "audio_stream") in part.calls for part in parts)
+    assert ("subtitle", None) in parts[0].calls
+    assert ("subtitle", "subtitle_stream") in parts[1].calls
+
+    # Failures are reported without interrupting the other changes
+    assert changes.failed_change_count == 1
+    assert changes.change_count == 13
+
+
+def test_apply_with_failures():
+    episodes = [FakeEpisode(f"/library/metadata/{index}") for index in range(1, 4)]
+    changes = TrackChanges("username", FakeEpisode(), EventType.NEW_EPISODE)
+    changes._changes = [(episodes[0], FakePart(), 2, "audio_stream"), (episodes[1], FakePart(fail=True), 2, "audio_stream")]
+    changes._episodes = episodes
+    changes._update_description(episodes)
+    assert "Updated episodes: 2/3" in changes.description
+
+    # Failed changes are reported separately from the applied ones
+    changes.apply()
+    assert changes.has_changes is True
+    assert "Updated episodes: 1/3" in changes.description
+    assert "Failed episodes: 1/3" in changes.description
+
+    # Nothing is reported as applied when every change failed
+    changes._changes = [(episodes[1], FakePart(fail=True), 2, "audio_stream")]
+    changes.apply()
+    assert changes.has_changes is False
+    assert "Updated episodes: 0/3" in changes.description
+
+    # Users whose changes failed are listed in the description of new episodes
+    new_changes = NewOrUpdatedTrackChanges(EventType.NEW_EPISODE, True)
+    new_changes._episode = episodes[0]
+    new_changes._track_changes = [changes]
+    new_changes._update_description()
+    assert "Updated for all users except username" in new_changes.description
+
+
+def test_compute_with_ledger(store):
+    ledger = SelectionLedger(store)
+
+    part = FakePart()
+    part.id = 1
+    part.audioStreams = part.subtitleStreams = lambda: []
+    episode = FakeEpisode("/library/metadata/2", [part])
+    changes = TrackChanges("username", FakeEpisode(), EventType.NEW_EPISODE, 1, ledger)
+
+    # Parts already matching the reference are recorded in the ledger
+    changes.compute([episode])
+    assert changes.skipped_episode_count == 0
+    assert ledger.matches(1, 1, changes.signature, episode.updatedAt) is True
+
+    # The episode is neither reloaded nor matched again as long as it has not been updated
+    server = MagicMock()
+    changes.compute([episode], server)
+    server.fetch_items.assert_not_called()
+    assert changes.skipped_episode_count == 1
+    assert changes.has_changes is False
+    assert changes.description != ""
+
+    # The streams of the part have been changed since the selection was recorded
+    selected_stream = AudioStream("eng", "ac3", None, "5.1", 6)
+    selected_stream.id, selected_stream.selected = 10, True
+    part.audioStreams = lambda: [selected_stream]
+    changes.compute([episode])
+    assert changes.skipped_episode_count == 0
+
+    # The selection of the reference replaces the one recorded for its own parts
+    reference_part = FakePart()
+    reference_part.id = 2
+    reference_part.audioStreams, reference_part.subtitleStreams = (lambda: [selected_stream]), (lambda: [])
+    ledger.record(1, 2, "previous_signature", 11, None, episode.updatedAt)
+    reference = FakeEpisode("/library/metadata/3", [reference_part])
+    reference_changes = TrackChanges("username", reference, EventType.PLAY_OR_ACTIVITY, 1, ledger)
+    reference_changes.record_reference()
+    assert ledger.matches(1, 2, reference_changes.signature, reference.updatedAt, (10, None)) is True
+
+
+def test_get_next_episodes_by_season():
+    episodes = []
+    for season_number in range(0, 5):
+        for episode_number in range(10, 0, -1):
+            episode = FakeEpisode(f"/library/metadata/{season_number * 100 + episode_number}")
+            episode.seasonNumber, episode.episodeNumber = season_number, episode_number
+            episodes.append(episode)
+    other_show_episode = FakeEpisode("/library/metadata/1001")
+    other_show_episode.seasonNumber, other_show_episode.episodeNumber = 4, 1
+    other_show_episode.grandparentRatingKey = 9
+    episodes.append(other_show_episode)
+    reference = FakeEpisode("/library/metadata/305")
+    reference.seasonNumber, reference.episodeNumber = 3, 5
+    reference.grandparentRatingKey, reference.librarySectionID = 1, 2
+    queries = []
+
+    def fetch_items(key, cls=None):
+        queries.append(key)
+        return [e for e in episodes if e.seasonNumber >= 3]
+
+    reference.fetchItems = fetch_items
+    changes = TrackChanges("username", reference, EventType.PLAY_OR_ACTIVITY)
+
+    # Seasons before the reference season are filtered by Plex in a single query, episodes of other shows are dropped
+    episodes_to_update = changes.get_episodes_to_update("show", "next")
+    assert queries == ["/library/sections/2/all?type=4&show.id=1&season.index%3E%3E=2"]
+    assert other_show_episode not in episodes_to_update
+    assert [(e.seasonNumber, e.episodeNumber) for e in episodes_to_update] == \
+        [(3, n) for n in range(6, 11)] + [(4, n) for n in range(1, 11)]
+
+
+def test_track_changes_from_preference():
+    preference = LanguagePreference(AudioSignature("fra", "ac3", "5.1", 6, None, "Français"),
+                                    SubtitleSignature("fra", False, "srt", None, "Français"))
+    changes = TrackChanges("username", FakeEpisode(), EventType.NEW_EPISODE, preference=preference)
+    audio_streams = [AudioStream("eng", "ac3", None, "5.1", 6), AudioStream("fra", "aac", None, "stereo", 2)]
+    assert changes._match_audio_stream(audio_streams) == audio_streams[1]
+    subtitle_streams = [SubtitleStream("eng", "srt", None, False), SubtitleStream("fra", "srt", None, False)]
+    assert changes._match_subtitle_stream(subtitle_streams) == subtitle_streams[1]
+
+    # Selections recorded from a preference and from the reference streams share the same signature
+    reference_changes = TrackChanges("username", FakeEpisode(), EventType.NEW_EPISODE)
+    reference_changes._audio_stream = AudioStream("fra", "ac3", None, "5.1", 6)
+    reference_changes._subtitle_stream = SubtitleStream("fra", "srt", None, False)
+    assert changes.signature == reference_changes.signature
+
+
+def test_new_or_updated_track_changes_concurrent_users():
+    preference = LanguagePreference(AudioSignature("fra", "ac3", "5.1", 6, None, "Français"), None)
+    changes = NewOrUpdatedTrackChanges(EventType.NEW_EPISODE, True)
+    episode = FakeEpisode()
+    episode.seasonNumber, episode.episodeNumber = 1, 1
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        list(executor.map(lambda index: changes.change_track_for_user(f"user{index}", None, episode, index, preference),
+                          range(32)))
+    assert len(changes._track_changes) == 32
+    assert changes.episode_name == "show (S01E01)"
+
+
+def test_new_or_updated_track_changes_user_groups():
+    french = LanguagePreference(AudioSignature("fra", "ac3", "5.1", 6, None, "Français"), None)
+    english = LanguagePreference(AudioSignature("eng", "ac3", "5.1", 6, None, "English"), None)
+    changes = NewOrUpdatedTrackChanges(EventType.NEW_EPISODE, True)
+    part = FakePart()
+    part.id = 1
+    audio_streams = [AudioStream("eng", "ac3", None, "5.1", 6), AudioStream("fra", "ac3", None, "5.1", 6)]
+    for stream_id, stream in enumerate(audio_streams):
+        stream.id, stream.selected = stream_id, stream_id == 0
+    part.audioStreams = lambda: audio_streams
+    part.subtitleStreams = lambda: []
+    episode = FakeEpisode("/library/metadata/2", [part])
+
+    # Episodes fetched with their streams are not reloaded
+    for index in range(6):
+        changes.change_track_for_user(f"user{index}", None, episode, index, french if index % 2 == 0 else english)
+
+    # The matching streams are computed once per group of users sharing the same preference
+    assert changes.group_count == 2
+    matchers = list(changes._matchers.values())
+    assert [matcher.stats["misses"] for matcher in matchers] == [2, 2]
+    assert [matcher.stats["hits"] for matcher in matchers] == [4, 4]
+    assert [tc.change_count for tc in changes._track_changes] == [1, 0] * 3
+    assert part.calls == [("audio", audio_streams[1])] * 3
@@ -0,0 +1,52 @@
+import time
+import pytest
+
+from plex_auto_languages.utils.ttl_cache import TTLCache
+
+
+def test_ttl_cache():
+    cache = TTLCache(max_size=2, ttl=60)
+    assert cache.max_size == 2
+    assert cache.ttl == 60
+    assert len(cache) == 0
+    assert "key" not in cache
+    with pytest.raises(KeyError):
+        _ = cache["key"]
+
+    cache["key1"] = "value1"
+    cache["key2"] = "value2"
+    assert cache["key1"] == "value1"
+    assert cache.get("key3", None) is None
+    assert set(cache) == {"key1", "key2"}
+
+    # The least recently used entry is evicted
+    cache["key3"] = "value3"
+    assert "key2" not in cache
+    assert "key1" in cache and "key3" in cache
+
+    del cache["key1"]
+    assert len(cache) == 1
+    cache.clear()
+    assert len(cache) == 0
+
+    stats = cache.stats
+    assert stats["size"] == 0
+    assert stats["max_size"] == 2
+    assert stats["hits"] == 1
+    assert stats["misses"] == 2
+    assert stats["evictions"] == 1
+
+
+def test_ttl_cache_expiration():
+    cache = TTLCache(max_size=10, ttl=0.5)
+    cache["key1"] = "value1"
+    cache["key2"] = "value2"
+    assert "key1" in cache
+    time.sleep(0.6)
+    assert "key1" not in cache
+    assert len(cache) == 0
+    assert cache.stats["expirations"] == 2
+
+    cache["key1"] = "value1"
+    cache.setdefault("key1", "other_value")
+    assert cache["key1"] == "value1"
@@ -0,0 +1,33 @@
+from plex_auto_languages.utils.user_registry import UserRegistry
+
+
+class FakeUser():
+
+    def __init__(self, user_id, name):
+        self.id = user_id
+        self.name = name
+
+
+def test_user_registry():
+    registry = UserRegistry()
+    assert len(registry) == 0
+    assert registry.users == []
+    assert registry.get_by_id(1) is None
+
+    users = [FakeUser(1, "user1"), FakeUser(2, "user2")]
+    registry = UserRegistry(users)
+    assert len(registry) == 2
+    assert registry.ids == [1, 2]
+    assert registry.get_by_id(1) is users[0]
+    assert registry.get_by_id("2") is users[1]
+    assert registry.get_by_name("user2") is users[1]
+    assert registry.get_by_name("user3") is None
+    assert "1" in registry
+    assert 3 not in registry
+    assert list(registry) == users
+
+    # The registry is not affected by changes to the original list
+    users.append(FakeUser(3, "user3"))
+    assert len(registry) == 2
+    registry.users.clear()
+    assert len(registry.users) == 2
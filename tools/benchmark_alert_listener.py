@@ -0,0 +1,82 @@
+import sys
+import json
+import timeit
+import argparse
+from unittest.mock import MagicMock, patch
+
+sys.path.append(".")
+from plex_auto_languages.plex_alert_listener import PlexAlertListener, json_loads  # noqa: E402
+
+
+SAMPLE_NOTIFICATIONS = [
+    {"type": "transcodeSession.update", "size": 1, "TranscodeSession": [
+        {"key": "/transcode/sessions/abcdef", "throttled": False, "complete": False, "progress": 42.5, "size": -22,
+         "speed": 1.5, "duration": 2520000, "remaining": 12, "context": "streaming", "sourceVideoCodec": "h264",
+         "sourceAudioCodec": "aac", "videoDecision": "copy", "audioDecision": "transcode", "protocol": "dash",
+         "container": "mp4", "videoCodec": "h264", "audioCodec": "aac", "audioChannels": 2}]},
+    {"type": "activity", "size": 1, "ActivityNotification": [
+        {"event": "updated", "uuid": "c9f1b4e0", "Activity": {
+            "uuid": "c9f1b4e0", "type": "media.generate.bif", "cancellable": False, "userID": 1,
+            "title": "Generating video preview thumbnails", "subtitle": "Episode 1", "progress": 10}}]},
+    {"type": "backgroundProcessingQueue", "size": 1, "BackgroundProcessingQueueEventNotification": [
+        {"queueID": 1, "event": "queueRegenerated"}]},
+    {"type": "progress", "size": 1, "ProgressNotification": [{"message": "Scanning the library"}]},
+    {"type": "timeline", "size": 1, "TimelineEntry": [
+        {"identifier": "com.plexapp.plugins.library", "sectionID": "2", "itemID": "12345", "type": 4, "title": "Episode",
+         "state": 5, "updatedAt": 1672531200}]},
+    {"type": "playing", "size": 1, "PlaySessionStateNotification": [
+        {"sessionKey": "1", "clientIdentifier": "abcdef", "guid": "", "ratingKey": "12345",
+         "url": "", "key": "/library/metadata/12345", "viewOffset": 10000, "playQueueItemID": 1, "state": "playing"}]}
+]
+
+
+def load_frames(path: str):
+    # Recorded with tools/plex_alert_listener.py, one notification per line
+    with open(path, "r", encoding="utf-8") as stream:
+        notifications = [json.loads(line) for line in stream if line.strip() != ""]
+    return [json.dumps({"NotificationContainer": notification}) for notification in notifications]
+
+
+def full_decode(frames, filters, loads):
+    for frame in frames:
+        data = loads(frame)["NotificationContainer"]
+        if data["type"] not in filters:
+            continue
+
+
+def listener_decode(listener, frames):
+    for frame in frames:
+        listener._onMessage(None, frame)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--frames", type=str, default=None, help="File of notifications recorded by plex_alert_listener.py")
+    parser.add_argument("--filters", type=str, default="playing,activity,timeline,status", help="Wanted notification types")
+    parser.add_argument("--repeat", type=int, default=1000, help="Number of passes over the frames")
+    args = parser.parse_args()
+
+    if args.frames:
+        frames = load_frames(args.frames)
+    else:
+        frames = [json.dumps({"NotificationContainer": notification}) for notification in SAMPLE_NOTIFICATIONS]
+    filters = args.filters.split(",")
+    listener = PlexAlertListener(MagicMock(), lambda data: None, filters=filters)
+
+    # Both paths are measured with the same decoder, the effect of the decoder itself is reported separately
+    decoders = {"json": json.loads}
+    if json_loads is not json.loads:
+        decoders[json_loads.__module__] = json_loads
+    count = len(frames) * args.repeat
+    full_durations = {}
+    for name, loads in decoders.items():
+        full_durations[name] = timeit.timeit(lambda: full_decode(frames, filters, loads), number=args.repeat)
+        with patch("plex_auto_languages.plex_alert_listener.json_loads", loads):
+            listened = timeit.timeit(lambda: listener_decode(listener, frames), number=args.repeat)
+        print(f"Decoder: {name}")
+        print(f"  Full decode:      {full_durations[name] / count * 1e6:.2f} us/frame")
+        # The listener only peeks at the notification type with the standard library decoder
+        label = "Peek and decode:" if loads is json.loads else "Listener decode:"
+        print(f"  {label:<18}{listened / count * 1e6:.2f} us/frame ({full_durations[name] / listened:.2f}x)")
+    for name in [n for n in decoders if n != "json"]:
+        print(f"Decoder effect on full decode ({name} over json): {full_durations['json'] / full_durations[name]:.2f}x")
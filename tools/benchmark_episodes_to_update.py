@@ -0,0 +1,108 @@
+import sys
+import time
+import argparse
+from urllib.parse import urlparse, parse_qs
+from xml.etree import ElementTree
+
+sys.path.append(".")
+from plexapi.video import Episode  # noqa: E402
+from plex_auto_languages.constants import EventType  # noqa: E402
+from plex_auto_languages.track_changes import TrackChanges  # noqa: E402
+
+
+SHOW_KEY = "/library/metadata/1"
+
+
+def make_episode_xml(season_index: int, episode_index: int):
+    rating_key = 1000 + season_index * 1000 + episode_index
+    return (
+        f'<Video ratingKey="{rating_key}" key="/library/metadata/{rating_key}" parentRatingKey="{100 + season_index}" '
+        f'grandparentRatingKey="1" type="episode" title="Episode {episode_index}" grandparentKey="{SHOW_KEY}" '
+        f'parentKey="/library/metadata/{100 + season_index}" grandparentTitle="Long Running Show" '
+        f'parentTitle="Season {season_index}" summary="{"Lorem ipsum dolor sit amet. " * 8}" index="{episode_index}" '
+        f'parentIndex="{season_index}" librarySectionID="1" duration="1440000" originallyAvailableAt="2020-01-01" '
+        f'addedAt="1577836800" updatedAt="1577836800">'
+        f'<Media id="{rating_key}" duration="1440000" videoCodec="h264" audioCodec="aac" container="mkv">'
+        f'<Part id="{rating_key}" key="/library/parts/{rating_key}/file.mkv" duration="1440000" '
+        f'file="/data/shows/Long Running Show/Season {season_index:02}/Episode {episode_index:04}.mkv" size="350000000"/>'
+        f'</Media></Video>'
+    )
+
+
+class FakeServer():
+
+    def __init__(self, season_count: int, episodes_per_season: int, latency: float):
+        self._latency = latency
+        self._seasons = {
+            100 + season_index: [make_episode_xml(season_index, episode_index)
+                                 for episode_index in range(1, episodes_per_season + 1)]
+            for season_index in range(1, season_count + 1)
+        }
+        self._episodes = {
+            f"/library/metadata/{ElementTree.fromstring(episode).attrib['ratingKey']}": episode
+            for episodes in self._seasons.values() for episode in episodes
+        }
+        self.requests = 0
+        self.payload_size = 0
+
+    def query(self, key: str, headers: dict = None, **kwargs):
+        # Only the endpoints used by the episode selection are simulated, containers are paged like Plex does
+        path = key.split("?")[0]
+        if path == "/library/sections/1/all":
+            parameters = parse_qs(urlparse(key).query)
+            min_season_index = int(parameters.get("season.index>>", [-1])[0])
+            items = [episode for rating_key, episodes in self._seasons.items() for episode in episodes
+                     if rating_key - 100 > min_season_index]
+        elif path == SHOW_KEY:
+            items = [f'<Directory ratingKey="1" key="{SHOW_KEY}/children" type="show" title="Long Running Show" '
+                     f'childCount="{len(self._seasons)}"/>']
+        elif path == f"{SHOW_KEY}/allLeaves":
+            items = [episode for episodes in self._seasons.values() for episode in episodes]
+        elif path == f"{SHOW_KEY}/children":
+            items = [f'<Directory ratingKey="{rating_key}" key="/library/metadata/{rating_key}/children" type="season" '
+                     f'title="Season {rating_key - 100}" parentKey="{SHOW_KEY}" index="{rating_key - 100}" '
+                     f'leafCount="{len(episodes)}"/>'
+                     for rating_key, episodes in self._seasons.items()]
+        elif path in self._episodes:
+            items = [self._episodes[path]]
+        else:
+            items = self._seasons[int(path.split("/")[3])]
+        headers = headers or {}
+        start = int(headers.get("X-Plex-Container-Start", 0))
+        size = int(headers.get("X-Plex-Container-Size", len(items)))
+        payload = f'<MediaContainer size="{len(items[start:start + size])}" totalSize="{len(items)}">' \
+                  f'{"".join(items[start:start + size])}</MediaContainer>'
+        self.requests += 1
+        self.payload_size += len(payload)
+        time.sleep(self._latency)
+        return ElementTree.fromstring(payload)
+
+
+def measure(server: FakeServer, reference: Episode, legacy: bool):
+    server.requests = server.payload_size = 0
+    changes = TrackChanges("username", reference, EventType.PLAY_OR_ACTIVITY)
+    start = time.perf_counter()
+    if legacy:
+        episodes = [e for e in reference.show().episodes() if changes._is_episode_after(e)]
+    else:
+        episodes = changes.get_episodes_to_update("show", "next")
+    return len(episodes), server.requests, server.payload_size, time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--seasons", type=int, default=20, help="Number of seasons of the synthetic show")
+    parser.add_argument("--episodes", type=int, default=50, help="Number of episodes per season")
+    parser.add_argument("--reference-season", type=int, default=18, help="Season of the reference episode")
+    parser.add_argument("--latency", type=float, default=0.02, help="Simulated round trip of a request in seconds")
+    args = parser.parse_args()
+
+    # Single-season shows are measured as well, the section query must not cost more requests than listing the show
+    for season_count, reference_season in [(args.seasons, args.reference_season), (1, 1)]:
+        print(f"Show of {season_count} season(s) of {args.episodes} episodes, reference in season {reference_season}")
+        server = FakeServer(season_count, args.episodes, args.latency)
+        reference = Episode(server, ElementTree.fromstring(make_episode_xml(reference_season, 1)))
+        for name, legacy in [("All episodes", True), ("Section query", False)]:
+            count, requests, payload_size, duration = measure(server, reference, legacy)
+            print(f"  {name + ':':<16} {count} episodes, {requests} request(s), "
+                  f"{payload_size / 1024:.0f} KiB, {duration * 1000:.1f} ms")
@@ -0,0 +1,73 @@
+import sys
+import random
+import timeit
+import argparse
+from types import SimpleNamespace
+
+sys.path.append(".")
+from plex_auto_languages.stream_matcher import StreamMatcher  # noqa: E402
+
+
+AUDIO_LAYOUTS = [
+    [("eng", "eac3", "5.1(side)", 6, "English"), ("fra", "eac3", "5.1(side)", 6, "Français"),
+     ("jpn", "aac", "stereo", 2, None)],
+    [("eng", "truehd", "7.1", 8, "English Atmos"), ("eng", "ac3", "5.1", 6, "English"), ("fra", "ac3", "5.1", 6, None)],
+    [("eng", "aac", "stereo", 2, None), ("fra", "aac", "stereo", 2, None)]
+]
+
+SUBTITLE_LAYOUTS = [
+    [("eng", False, "srt", None), ("eng", True, "srt", "Forced"), ("fra", False, "srt", None), ("fra", True, "srt", "Forced")],
+    [("eng", False, "ass", "Full"), ("eng", False, "srt", "SDH"), ("fra", False, "ass", None)],
+    [("fra", True, "pgs", None)]
+]
+
+
+def make_audio_streams(layout):
+    return [SimpleNamespace(languageCode=language_code, codec=codec, audioChannelLayout=layout, channels=channels, title=title)
+            for language_code, codec, layout, channels, title in layout]
+
+
+def make_subtitle_streams(layout):
+    return [SimpleNamespace(languageCode=language_code, forced=forced, codec=codec, title=title)
+            for language_code, forced, codec, title in layout]
+
+
+def make_show(part_count: int, layout_count: int):
+    # Each part gets its own stream objects, parts of the same show share a handful of layouts
+    random.seed(0)
+    layouts = [(random.choice(AUDIO_LAYOUTS), random.choice(SUBTITLE_LAYOUTS)) for _ in range(layout_count)]
+    parts = []
+    for _ in range(part_count):
+        audio_layout, subtitle_layout = random.choice(layouts)
+        parts.append((make_audio_streams(audio_layout), make_subtitle_streams(subtitle_layout)))
+    return parts
+
+
+def match_parts(parts, reference_audio, reference_subtitle, memoized: bool):
+    matcher = StreamMatcher(reference_audio, reference_subtitle)
+    for audio_streams, subtitle_streams in parts:
+        if not memoized:
+            matcher = StreamMatcher(reference_audio, reference_subtitle)
+        matcher.match_audio_stream(audio_streams)
+        matcher.match_subtitle_stream(subtitle_streams)
+    return matcher
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--parts", type=int, default=10000, help="Number of parts of the synthetic show")
+    parser.add_argument("--layouts", type=int, default=3, help="Number of distinct stream layouts in the show")
+    parser.add_argument("--repeat", type=int, default=10, help="Number of passes over the show")
+    args = parser.parse_args()
+
+    parts = make_show(args.parts, args.layouts)
+    reference_audio = make_audio_streams([("eng", "ac3", "5.1", 6, "English")])[0]
+    reference_subtitle = make_subtitle_streams([("eng", False, "srt", "SDH")])[0]
+
+    baseline = timeit.timeit(lambda: match_parts(parts, reference_audio, reference_subtitle, False), number=args.repeat)
+    memoized = timeit.timeit(lambda: match_parts(parts, reference_audio, reference_subtitle, True), number=args.repeat)
+    stats = match_parts(parts, reference_audio, reference_subtitle, True).stats
+    count = args.parts * args.repeat
+    print(f"Parts: {args.parts}, layouts: {stats['layouts']}, hits: {stats['hits']}, misses: {stats['misses']}")
+    print(f"Scored per part:  {baseline / count * 1e6:.2f} us/part")
+    print(f"Memoized:         {memoized / count * 1e6:.2f} us/part ({baseline / memoized:.2f}x)")